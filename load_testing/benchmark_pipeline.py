@@ -0,0 +1,248 @@
+"""
+End-to-end benchmark of the pipeline: feeds a synthetic corpus through the five news_collection
+Lambdas and lambda_wordcloudClean (run on every final export) against the local fakes of
+run_load_test.py, at one or more article counts per run, and reports per stage:
+    - latency (mean, median, p95) and seconds per article
+    - throughput in articles per second
+    - peak resident memory of the process during the stage, and how much it grew
+    - the busy time of the calls inside the stage (feeds and article pages, summarization and
+      topic calls, image generation and upload, Redshift COPY, spaCy), to see which one dominates
+
+The articles are the stored pages of each site with the extracted text replaced by synthetic
+paragraphs, their lengths drawn from --lengths (fixed:N, uniform:MIN:MAX, lognormal:MEDIAN:SIGMA
+or choice:A,B,C words). Every article count starts from an empty Redshift table, so the export
+and word cloud stages see --runs x count rows at most.
+
+The report is written as JSON (--json). Across the article counts it shows how the seconds per
+article of every stage change against the smallest count and flags the stages whose cost per
+article grows by more than --tolerance, or that start failing; --compare checks the same counts
+against an earlier report, --compare-only compares two saved reports without running anything.
+
+Usage (from the repository root):
+    pip install -r load_testing/requirements.txt -r load_testing/requirements-wordcloud.txt
+    python load_testing/benchmark_pipeline.py --articles 5 10 20 40 --runs 3 --json before.json
+    python load_testing/benchmark_pipeline.py --lengths uniform:200:4000 --articles 10 40 --compare before.json
+    python load_testing/benchmark_pipeline.py --compare-only before.json after.json
+
+The fakes take the same --<name>-faults specs as run_load_test.py. Stage 2 is emulated where
+PyTorch isn't installed, stage 6 is reported as unavailable without spaCy and en_core_web_sm.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pipeline
+import synthetic_corpus
+from run_load_test import add_fault_arguments, fault_specs, summarize_stage
+
+def content_words(runner, results):
+    """
+    Words of every article scraped in a run, from its stage 1 file.
+    """
+    key = results[0]['key']
+    if key is None:
+        return []
+    df = runner.stage_format.decode_frame(runner.backends.s3.objects[(pipeline.BUCKET, key)], key)
+    return df['Content'].fillna('').str.split().str.len().tolist()
+
+def summarize_point(count, runs, words):
+    """
+    Per-stage figures of one article count over its runs.
+    """
+    stages = {}
+    pipeline_mean_s = statistics.mean(sum(result['seconds'] for result in results) for results in runs)
+    for index, stage in enumerate(runs[0]):
+        stage_results = [results[index] for results in runs]
+        summary = summarize_stage(stage_results)
+        completed = [result for result in stage_results if result['status'] in ('ok', 'emulated')]
+        if completed:
+            mean_articles = statistics.mean(result['articles'] for result in completed)
+            summary['s_per_article'] = round(summary['mean_s'] / mean_articles, 4) if mean_articles else None
+            summary['share'] = round(summary['mean_s'] / pipeline_mean_s, 3) if pipeline_mean_s else None
+            if 'peak_rss_mb' in completed[0]:
+                summary['peak_rss_mb'] = round(max(result['peak_rss_mb'] for result in completed), 1)
+                summary['rss_growth_mb'] = round(max(result['rss_growth_mb'] for result in completed), 1)
+            labels = sorted({label for result in completed for label in result.get('breakdown', {})})
+            summary['breakdown'] = {
+                label: {
+                    'calls': round(statistics.mean(result['breakdown'].get(label, {}).get('calls', 0) for result in completed), 1),
+                    'busy_s': round(statistics.mean(result['breakdown'].get(label, {}).get('busy_s', 0.0) for result in completed), 3)
+                }
+                for label in labels
+            }
+        stages[str(stage['stage'])] = summary
+    return {
+        'articles': count,
+        'mean_words': round(statistics.mean(words), 1) if words else None,
+        'pipeline_mean_s': round(pipeline_mean_s, 3),
+        'stages': stages
+    }
+
+def scaling(points, tolerance):
+    """
+    Seconds per article of every stage at each article count relative to the smallest count, and
+    the findings: stages whose cost per article grows by more than tolerance, or that fail.
+    """
+    base_point = min(points, key=lambda point: point['articles'])
+    ratios = {}
+    findings = []
+    for stage, base in base_point['stages'].items():
+        ratios[stage] = {}
+        for point in sorted(points, key=lambda point: point['articles']):
+            summary = point['stages'][stage]
+            if summary['completed'] < summary['runs'] and 'unavailable' not in summary['statuses']:
+                findings.append(f"{stage} {summary['name']}: {summary['runs'] - summary['completed']} of {summary['runs']} runs "
+                                f"not completed at {point['articles']} articles ({', '.join(summary.get('errors', summary['statuses']))})")
+            if not base.get('s_per_article') or not summary.get('s_per_article'):
+                continue
+            ratio = summary['s_per_article'] / base['s_per_article']
+            ratios[stage][str(point['articles'])] = round(ratio, 2)
+            if point is not base_point and ratio > 1 + tolerance:
+                findings.append(f"{stage} {summary['name']}: {base['s_per_article']:.3f} s/article at {base_point['articles']} articles, "
+                                f"{summary['s_per_article']:.3f} at {point['articles']} ({ratio:.2f}x)")
+    return {'base_articles': base_point['articles'], 's_per_article_ratio': ratios, 'findings': findings}
+
+def print_point(point):
+    print(f"\n{point['articles']} articles per run, {point['mean_words']} words per article on average, "
+          f"{point['pipeline_mean_s']:.2f}s per run")
+    print(f"{'stage':<24}{'done':>6}{'mean s':>9}{'p95 s':>8}{'s/article':>11}{'articles/s':>12}{'share':>7}{'peak MB':>9}{'+MB':>7}  busiest call")
+    for stage, summary in point['stages'].items():
+        label = f"{stage} {summary['name']}"
+        if not summary['completed']:
+            print(f"{label:<24}{0:>3}/{summary['runs']:<2}  {', '.join(summary['statuses'])}")
+            continue
+        busiest = max(summary['breakdown'].items(), key=lambda item: item[1]['busy_s'], default=None)
+        busiest_text = f"{busiest[0]} {busiest[1]['busy_s']:.2f}s/{busiest[1]['calls']:g} calls" if busiest else ""
+        print(f"{label:<24}{summary['completed']:>3}/{summary['runs']:<2}{summary['mean_s']:>9.2f}{summary['p95_s']:>8.2f}"
+              f"{summary['s_per_article'] or 0:>11.3f}{summary['articles_per_s'] or 0:>12.2f}{summary['share'] or 0:>7.0%}"
+              f"{summary.get('peak_rss_mb', 0):>9.0f}{summary.get('rss_growth_mb', 0):>7.1f}  {busiest_text}")
+
+def print_scaling(report):
+    scaling_report = report['scaling']
+    counts = [str(point['articles']) for point in report['points']]
+    print(f"\nSeconds per article relative to {scaling_report['base_articles']} articles per run:")
+    print(f"{'stage':<24}" + "".join(f"{count:>8}" for count in counts))
+    for stage, ratios in scaling_report['s_per_article_ratio'].items():
+        name = report['points'][0]['stages'][stage]['name']
+        print(f"{stage + ' ' + name:<24}" + "".join(f"{ratios[count]:>8.2f}" if count in ratios else f"{'-':>8}" for count in counts))
+    if scaling_report['findings']:
+        print("\nScaling findings:")
+        for finding in scaling_report['findings']:
+            print(f"  {finding}")
+    else:
+        print("\nNo stage slows down per article as the article count grows.")
+
+def compare_reports(before, after):
+    """
+    Print the mean latency and peak memory of every stage at the article counts both reports have.
+    """
+    before_points = {point['articles']: point for point in before['points']}
+    print(f"\n{'articles':>8}  {'stage':<24}{'before s':>10}{'after s':>10}{'change':>9}{'before MB':>11}{'after MB':>10}")
+    for point in after['points']:
+        previous = before_points.get(point['articles'])
+        if previous is None:
+            continue
+        for stage, summary in point['stages'].items():
+            old = previous['stages'].get(stage)
+            if not old or not old.get('mean_s') or not summary.get('mean_s'):
+                continue
+            print(f"{point['articles']:>8}  {stage + ' ' + summary['name']:<24}{old['mean_s']:>10.2f}{summary['mean_s']:>10.2f}"
+                  f"{summary['mean_s'] / old['mean_s'] - 1:>+9.0%}{old.get('peak_rss_mb', 0):>11.0f}{summary.get('peak_rss_mb', 0):>10.0f}")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--articles', type=int, nargs='+', default=[5, 10, 20, 40], help="articles per run to benchmark")
+    arg_parser.add_argument('--runs', type=int, default=3, help="timed runs per article count")
+    arg_parser.add_argument('--warmup', type=int, default=1, help="untimed runs first (cold start of every Lambda)")
+    arg_parser.add_argument('--lengths', default='lognormal:700:0.6', help="distribution of the article lengths in words")
+    arg_parser.add_argument('--stage-format', choices=['parquet', 'csv'], default='parquet', help="STAGE_FORMAT of the stage files")
+    arg_parser.add_argument('--summarizer', choices=['fake', 'model'], default='fake', help="stand-in or bart-large-cnn")
+    arg_parser.add_argument('--no-wordcloud', action='store_true', help="leave out lambda_wordcloudClean")
+    arg_parser.add_argument('--tolerance', type=float, default=0.25, help="growth of the seconds per article reported as a finding")
+    arg_parser.add_argument('--seed', type=int, default=0, help="seed of the corpus and of the injected jitter and errors")
+    arg_parser.add_argument('--log', help="write the output of the Lambdas to this file (default: discard it)")
+    arg_parser.add_argument('--json', help="write the report to this file")
+    arg_parser.add_argument('--compare', help="compare with an earlier report")
+    arg_parser.add_argument('--compare-only', nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two reports and exit")
+    add_fault_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    if args.compare_only:
+        reports = []
+        for path in args.compare_only:
+            with open(path) as f:
+                reports.append(json.load(f))
+        compare_reports(*reports)
+        return
+
+    synthetic_corpus.parse_distribution(args.lengths)  # Fail on a bad spec before starting anything
+    counts = sorted(set(args.articles))
+    os.environ['MAX_ARTICLES'] = str(counts[0])
+    os.environ['STAGE_FORMAT'] = args.stage_format
+    os.environ['RESULT_CACHE_PREFIX'] = ''
+    os.environ['IMAGE_CACHE_PREFIX'] = ''
+
+    stages = pipeline.STAGES if args.no_wordcloud else pipeline.STAGES + [6]
+    corpus = synthetic_corpus.SyntheticCorpus(pipeline.load_page_fixtures(), {}, args.lengths, seed=args.seed)
+    backends = pipeline.FakeBackends(fault_specs(args), seed=args.seed)
+    points = []
+    try:
+        with pipeline.captured_output(args.log):
+            runner = pipeline.Pipeline(backends, items_per_feed=counts[0], summarizer=args.summarizer, pages=corpus.page,
+                                       stages=stages, measure_memory=True)
+        corpus.compiled_rules = runner.modules[1].COMPILED_EXTRACTION_RULES
+        for stage, reason in runner.unavailable.items():
+            print(f"Stage {stage} can't be imported ({reason}); " + ("its output is emulated." if stage == 2 else "it is left out."))
+
+        for _ in range(args.warmup):
+            with pipeline.captured_output(args.log):
+                runner.run()
+        for count in counts:
+            runner.set_articles(count)
+            backends.redshift.tables.clear()
+            runs = []
+            words = []
+            for run in range(args.runs):
+                start = time.perf_counter()
+                with pipeline.captured_output(args.log):
+                    results = runner.run()
+                runs.append(results)
+                words.extend(content_words(runner, results))
+                print(f"{count} articles, run {run + 1}: {time.perf_counter() - start:.2f}s  " +
+                      "  ".join(f"{result['stage']}:{result['status']} {result['seconds']:.2f}s" for result in results))
+            point = summarize_point(count, runs, words)
+            point['runs'] = runs
+            points.append(point)
+    finally:
+        backends.stop()
+
+    report = {
+        'settings': {key: value for key, value in vars(args).items() if key not in ('log', 'json', 'compare', 'compare_only')},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+        'load_seconds': {str(stage): round(seconds, 3) for stage, seconds in runner.load_seconds.items()},
+        'unavailable': {str(stage): reason for stage, reason in runner.unavailable.items()},
+        'points': points,
+        'scaling': scaling(points, args.tolerance),
+        'backends': backends.stats()
+    }
+
+    for point in points:
+        print_point(point)
+    print_scaling(report)
+    if args.compare:
+        with open(args.compare) as f:
+            compare_reports(json.load(f), report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved the report to {args.json}")
+
+if __name__ == '__main__':
+    main()
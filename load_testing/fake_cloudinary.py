@@ -0,0 +1,79 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from faults import FaultInjector
+
+# Format of an uploaded image from its first bytes
+IMAGE_SIGNATURES = [(b'\x89PNG', 'png'), (b'\xff\xd8\xff', 'jpg'), (b'RIFF', 'webp')]
+
+def image_format(data):
+    for signature, name in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return name
+    return 'bin'
+
+class FakeCloudinaryHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API; the injector, lock and counters live on the server (see FakeCloudinary)
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        match = re.match(r'^/v1_1/([^/]+)/image/upload$', self.path)
+        if not match:
+            self.send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+            return
+        if self.server.faults():
+            self.send_json(500, {'error': {'message': "Upload failed (injected)"}})
+            return
+
+        fields = dict(re.findall(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n', body))
+        file_data = re.search(rb'name="file"[^\r]*\r\n(?:[^\r]+\r\n)*\r\n', body)
+        data = body[file_data.end():body.rfind(b'\r\n--')] if file_data else b''
+        public_id = fields.get(b'public_id', b'upload').decode('utf-8')
+        folder = fields.get(b'folder', b'').decode('utf-8').strip('/')
+        full_id = f"{folder}/{public_id}" if folder else public_id
+        extension = image_format(data)
+
+        with self.server.lock:
+            self.server.uploads += 1
+            self.server.bytes_uploaded += len(data)
+        url = f"http://localhost:{self.server.server_port}/{match.group(1)}/image/upload/v1/{full_id}.{extension}"
+        self.send_json(200, {'public_id': full_id, 'format': extension, 'bytes': len(data), 'url': url, 'secure_url': url})
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeCloudinary:
+    """
+    Cloudinary upload API on localhost, for CLOUDINARY_UPLOAD_PREFIX. Every upload goes through
+    the FaultInjector; injected failures are answered with a 500 error.
+    """
+
+    def __init__(self, port=0, faults=None):
+        self.server = ThreadingHTTPServer(('localhost', port), FakeCloudinaryHandler)
+        self.server.daemon_threads = True
+        self.server.faults = faults or FaultInjector()
+        self.server.lock = threading.Lock()
+        self.server.uploads = 0
+        self.server.bytes_uploaded = 0
+        self.upload_prefix = f"http://localhost:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        return {'uploads': self.server.uploads, 'bytes_uploaded': self.server.bytes_uploaded, **self.server.faults.stats()}
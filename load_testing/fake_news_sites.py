@@ -0,0 +1,146 @@
+import email.utils
+import itertools
+import random
+import threading
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+from requests.adapters import HTTPAdapter
+from faults import FaultInjector
+
+TITLE_WORDS = [
+    "climate", "emissions", "ocean", "wildlife", "drought", "flood", "solar", "wind", "methane", "forest",
+    "carbon", "policy", "species", "habitat", "energy", "coal", "warming", "glacier", "river", "farmers"
+]
+
+def render_feed(domain, items):
+    """
+    RSS 2.0 document with the given (link, title, published) items.
+    """
+    entries = "".join(
+        f"<item><title>{escape(title)}</title><link>{escape(link)}</link><guid isPermaLink=\"true\">{escape(link)}</guid>"
+        f"<pubDate>{published}</pubDate></item>\n"
+        for link, title, published in items
+    )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel><title>{domain}</title>'
+        f"<link>https://{domain}/</link><description>Load test feed</description>\n{entries}</channel></rss>"
+    ).encode('utf-8')
+
+class FakeNewsSitesHandler(BaseHTTPRequestHandler):
+    # Requests arrive as /<original host>/<original path> (see RedirectingAdapter)
+    protocol_version = 'HTTP/1.1'
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        sites = self.server.sites
+        url = "https:/" + self.path
+        if sites.faults():
+            self.send_body(503, b"Service unavailable (injected)", 'text/plain')
+            return
+        if url in sites.feeds:
+            self.send_body(200, sites.next_feed(url), 'application/rss+xml; charset=utf-8')
+            return
+        page = sites.page(url)
+        if page is None:
+            self.send_body(404, b"Not found", 'text/plain')
+            return
+        self.send_body(200, page, 'text/html; charset=utf-8')
+
+    def log_message(self, format, *args):
+        pass
+
+class RedirectingAdapter(HTTPAdapter):
+    """
+    Transport adapter sending every request of a session to the fake sites on localhost, keeping the
+    retry policy of the adapter it replaces, so retries and backoff behave as against the real sites.
+    """
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if not request.url.startswith(self.base_url):
+            parts = urllib.parse.urlsplit(request.url)
+            request.url = f"{self.base_url}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+class FakeNewsSites:
+    """
+    The RSS feeds and article pages of the news sites, served from localhost. feeds maps every feed
+    URL to the domain of its articles; each fetch of a feed lists items_per_feed articles that were
+    never listed before, so every run has new articles to scrape. Links are numbered per feed and
+    titles are drawn from the seed and the link, so runs with the same seed list the same articles.
+    pages maps a domain to the HTML of its article pages, or is a function (domain, url) -> HTML.
+    Every request goes through the FaultInjector; injected failures are answered with 503.
+    """
+
+    def __init__(self, feeds, pages, items_per_feed=10, port=0, faults=None, seed=0):
+        self.feeds = dict(feeds)
+        self.pages = pages
+        self.items_per_feed = items_per_feed
+        self.faults = faults or FaultInjector()
+        self.feeds_served = 0
+        self.pages_served = 0
+        self.seed = seed
+        self._counters = {feed_url: itertools.count() for feed_url in self.feeds}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('localhost', port), FakeNewsSitesHandler)
+        self.server.daemon_threads = True
+        self.server.sites = self
+        self.base_url = f"http://localhost:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def mount(self, session):
+        """
+        Route every request of a requests session (e.g. the scraper's shared session) to the fake sites.
+        """
+        original = session.get_adapter('https://')
+        adapter = RedirectingAdapter(
+            self.base_url,
+            pool_connections=1,
+            pool_maxsize=max(getattr(original, '_pool_maxsize', 10) * len(self.feeds), 10),
+            max_retries=original.max_retries
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    def next_feed(self, feed_url):
+        domain = self.feeds[feed_url]
+        now = datetime.now(timezone.utc)
+        items = []
+        with self._lock:
+            self.feeds_served += 1
+            numbers = [next(self._counters[feed_url]) for _ in range(self.items_per_feed)]
+        for number in numbers:
+            link = f"https://{domain}/load-test/article-{number}"
+            rng = random.Random(f"{self.seed}:{link}")
+            title = " ".join(rng.choice(TITLE_WORDS) for _ in range(7)).capitalize() + f" {domain} {number}"
+            items.append((link, title, email.utils.format_datetime(now - timedelta(minutes=number % 600))))
+        return render_feed(domain, items)
+
+    def page(self, url):
+        domain = urllib.parse.urlsplit(url).netloc
+        page = self.pages(domain, url) if callable(self.pages) else self.pages.get(domain)
+        if page is not None:
+            with self._lock:
+                self.pages_served += 1
+        return page
+
+    def stats(self):
+        return {'feeds_served': self.feeds_served, 'pages_served': self.pages_served, **self.faults.stats()}
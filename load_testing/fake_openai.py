@@ -0,0 +1,97 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from faults import FaultInjector
+
+# The closed topic set of the topic prompt (lambda_2_summarizeAndGenerateTopics/topic_classifier.py)
+TOPICS = [
+    "Agriculture & Food", "Business & Innovation", "Climate Change", "Crisis & Disasters", "Energy",
+    "Fossil Fuels", "Pollution", "Politics & Law", "Public Health & Environment", "Society & Culture",
+    "Sustainability", "Technology & Science", "Urban & Infrastructure", "Water & Oceans", "Wildlife & Conservation"
+]
+
+def topics_of(article):
+    """
+    Deterministic pair of distinct topics for an article text.
+    """
+    digest = hashlib.sha256(article.encode('utf-8')).digest()
+    topic_1 = TOPICS[digest[0] % len(TOPICS)]
+    topic_2 = TOPICS[(digest[0] + 1 + digest[1] % (len(TOPICS) - 1)) % len(TOPICS)]
+    return topic_1, topic_2
+
+def answer(request):
+    """
+    Answer a topic request: "topic1-topic2" for one article, a JSON object for a numbered batch.
+    """
+    prompt = request['messages'][-1]['content']
+    if request.get('response_format', {}).get('type') == 'json_object':
+        articles = re.split(r'\n\nArticle \d+: ', prompt.split('Article 0: ', 1)[1])
+        return json.dumps({'results': [
+            {'id': i, 'topic1': topics_of(article)[0], 'topic2': topics_of(article)[1]} for i, article in enumerate(articles)
+        ]})
+    return "-".join(topics_of(prompt.split('Article: ', 1)[-1]))
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API; the injector, lock and counter live on the server (see FakeOpenAI)
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if not self.path.endswith('/chat/completions'):
+            self.send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+            return
+        if self.server.faults():
+            self.send_json(429, {'error': {'message': "Rate limit reached (injected)", 'type': 'requests'}}, {'Retry-After': '1'})
+            return
+        with self.server.lock:
+            self.server.completions += 1
+            number = self.server.completions
+        self.send_json(200, {
+            'id': f"chatcmpl-fake-{number}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer(request)}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeOpenAI:
+    """
+    Chat completions API on localhost, for OPENAI_API_BASE. Every request goes through the
+    FaultInjector; injected failures are answered with 429 and Retry-After: 1.
+    """
+
+    def __init__(self, port=0, faults=None):
+        self.server = ThreadingHTTPServer(('localhost', port), FakeOpenAIHandler)
+        self.server.daemon_threads = True
+        self.server.faults = faults or FaultInjector()
+        self.server.lock = threading.Lock()
+        self.server.completions = 0
+        self.api_base = f"http://localhost:{self.server.server_port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        return {'completions': self.server.completions, **self.server.faults.stats()}
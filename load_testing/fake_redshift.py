@@ -0,0 +1,130 @@
+import io
+import re
+import sys
+import threading
+import types
+import pandas as pd
+from faults import FaultInjector
+
+class Error(Exception):
+    pass
+
+class OperationalError(Error):
+    pass
+
+COPY_PATTERN = re.compile(r"COPY\s+(\S+)\s*\(([^)]*)\)\s+FROM\s+'s3://([^/']+)/([^']+)'", re.IGNORECASE)
+SELECT_ALL_PATTERN = re.compile(r"SELECT\s+\*\s+FROM\s+(\S+)", re.IGNORECASE)
+
+class FakeRedshift:
+    """
+    Stand-in for the Redshift cluster behind psycopg2: tables are DataFrames in memory, COPY loads
+    a stage file (Parquet or CSV) from the fake S3 client into the listed columns by position, and
+    SELECT * returns the complete rows of a table, newest publish_date first, which is what the
+    export Lambda asks for. Connections go through the FaultInjector (injected failures raise
+    OperationalError). Transactions aren't modelled: COPY applies at once and rollback does nothing.
+    """
+
+    def __init__(self, s3_client, faults=None):
+        self.s3_client = s3_client
+        self.faults = faults or FaultInjector()
+        self.tables = {}
+        self.statements = 0
+        self._lock = threading.Lock()
+
+    def connect(self, **kwargs):
+        if self.faults():
+            raise OperationalError("could not connect to server (injected)")
+        return FakeConnection(self)
+
+    def install(self):
+        """
+        Register this instance as the psycopg2 module, so Lambdas importing psycopg2 afterwards use it.
+        """
+        module = types.ModuleType('psycopg2')
+        module.connect = self.connect
+        module.Error = Error
+        module.OperationalError = OperationalError
+        sys.modules['psycopg2'] = module
+        return module
+
+    def copy(self, table, columns, bucket, key):
+        data = self.s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+        if key.endswith('.parquet'):
+            df = pd.read_parquet(io.BytesIO(data))
+        else:
+            df = pd.read_csv(io.BytesIO(data))
+        if len(df.columns) != len(columns):
+            raise Error(f"COPY of {key}: {len(df.columns)} columns in the file, {len(columns)} in the column list")
+        df.columns = columns
+        with self._lock:
+            existing = self.tables.get(table)
+            self.tables[table] = df if existing is None else pd.concat([existing, df], ignore_index=True)
+        return len(df)
+
+    def select_all(self, table):
+        with self._lock:
+            df = self.tables.get(table)
+        if df is None:
+            raise Error(f'relation "{table}" does not exist')
+        df = df.dropna()
+        if 'publish_date' in df:
+            df = df.sort_values('publish_date', ascending=False)
+        rows = [tuple(row) for row in df.astype(object).itertuples(index=False)]
+        return list(df.columns), rows
+
+    def execute(self, sql):
+        with self._lock:
+            self.statements += 1
+        copy = COPY_PATTERN.search(sql)
+        if copy:
+            table, columns, bucket, key = copy.groups()
+            return None, [], self.copy(table, [column.strip() for column in columns.split(',')], bucket, key)
+        select = SELECT_ALL_PATTERN.search(sql)
+        if select:
+            columns, rows = self.select_all(select.group(1).rstrip(';'))
+            return columns, rows, len(rows)
+        raise Error(f"Statement not supported by the fake: {sql.strip()[:80]}")
+
+    def row_count(self, table):
+        with self._lock:
+            df = self.tables.get(table)
+        return 0 if df is None else len(df)
+
+    def stats(self):
+        return {'statements': self.statements, 'tables': {name: len(df) for name, df in self.tables.items()}, **self.faults.stats()}
+
+class FakeConnection:
+
+    def __init__(self, redshift):
+        self.redshift = redshift
+
+    def cursor(self):
+        return FakeCursor(self.redshift)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+class FakeCursor:
+
+    def __init__(self, redshift):
+        self.redshift = redshift
+        self.description = None
+        self.rowcount = -1
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        columns, self._rows, self.rowcount = self.redshift.execute(sql)
+        self.description = [(name, None, None, None, None, None, None) for name in columns] if columns else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
@@ -0,0 +1,151 @@
+import io
+import threading
+from collections import Counter
+from types import SimpleNamespace
+from botocore.exceptions import ClientError
+from faults import FaultInjector
+
+class NoSuchKey(ClientError):
+    pass
+
+def client_error(code, status, operation, message, error_class=ClientError):
+    return error_class({'Error': {'Code': code, 'Message': message}, 'ResponseMetadata': {'HTTPStatusCode': status}}, operation)
+
+class FakeS3Client:
+    """
+    In-memory stand-in for the boto3 S3 client, covering the calls the Lambdas make: objects are
+    kept in a dict per bucket, missing keys raise the same errors as S3, and every call goes through
+    a FaultInjector (injected failures raise a 503 SlowDown). Thread-safe.
+    """
+
+    def __init__(self, faults=None):
+        self.faults = faults or FaultInjector()
+        self.exceptions = SimpleNamespace(NoSuchKey=NoSuchKey, ClientError=ClientError)
+        self.objects = {}
+        self.operations = Counter()
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.writes = []  # (bucket, key) of every write, in order
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        with self._lock:
+            self.operations[operation] += 1
+        if self.faults():
+            raise client_error('SlowDown', 503, operation, "Please reduce your request rate. (injected)")
+
+    def _get(self, operation, bucket, key, missing_error=NoSuchKey):
+        with self._lock:
+            data = self.objects.get((bucket, key))
+            if data is not None:
+                self.bytes_read += len(data)
+        if data is None:
+            if missing_error is NoSuchKey:
+                raise client_error('NoSuchKey', 404, operation, "The specified key does not exist.", NoSuchKey)
+            raise client_error('404', 404, operation, "Not Found")
+        return data
+
+    def _put(self, bucket, key, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        elif not isinstance(data, bytes):
+            data = data.read()
+        with self._lock:
+            self.objects[(bucket, key)] = data
+            self.bytes_written += len(data)
+            self.writes.append((bucket, key))
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._call('GetObject')
+        data = self._get('GetObject', Bucket, Key)
+        return {'Body': io.BytesIO(data), 'ContentLength': len(data)}
+
+    def put_object(self, Bucket, Key, Body=b'', IfNoneMatch=None, **kwargs):
+        self._call('PutObject')
+        if IfNoneMatch == '*':
+            # Conditional write: the existence check and the write happen under one lock, as on S3
+            with self._lock:
+                if (Bucket, Key) in self.objects:
+                    raise client_error('PreconditionFailed', 412, 'PutObject', "At least one of the pre-conditions you specified did not hold")
+                self.objects[(Bucket, Key)] = b''
+        self._put(Bucket, Key, Body)
+        return {}
+
+    def download_fileobj(self, Bucket, Key, Fileobj, ExtraArgs=None, Callback=None, Config=None):
+        # Like the transfer manager, a missing object surfaces as a plain 404 ClientError from HeadObject
+        self._call('GetObject')
+        Fileobj.write(self._get('HeadObject', Bucket, Key, missing_error=ClientError))
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self._call('PutObject')
+        self._put(Bucket, Key, Fileobj.read())
+
+    def copy_object(self, Bucket, CopySource, Key, **kwargs):
+        self._call('CopyObject')
+        self._put(Bucket, Key, self._get('CopyObject', CopySource['Bucket'], CopySource['Key']))
+        return {}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._call('DeleteObject')
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self._call('DeleteObjects')
+        with self._lock:
+            for obj in Delete['Objects']:
+                self.objects.pop((Bucket, obj['Key']), None)
+        return {}
+
+    def keys_written_since(self, position, bucket, prefix=''):
+        """
+        Keys under prefix written after the first `position` writes, in order (a key rewritten counts again).
+        """
+        with self._lock:
+            return [key for write_bucket, key in self.writes[position:] if write_bucket == bucket and key.startswith(prefix)]
+
+    def list_keys(self, bucket, prefix=''):
+        with self._lock:
+            return sorted(key for object_bucket, key in self.objects if object_bucket == bucket and key.startswith(prefix))
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self._call('ListObjectsV2')
+        keys = self.list_keys(Bucket, Prefix)
+        start = int(ContinuationToken or 0)
+        page_keys = keys[start:start + MaxKeys]
+        with self._lock:
+            contents = [{'Key': key, 'Size': len(self.objects.get((Bucket, key), b''))} for key in page_keys]
+        page = {'KeyCount': len(contents), 'IsTruncated': start + MaxKeys < len(keys)}
+        if contents:
+            page['Contents'] = contents
+        if page['IsTruncated']:
+            page['NextContinuationToken'] = str(start + MaxKeys)
+        return page
+
+    def get_paginator(self, operation_name):
+        if operation_name != 'list_objects_v2':
+            raise NotImplementedError(operation_name)
+        return FakeListObjectsPaginator(self)
+
+    def stats(self):
+        return {
+            'operations': dict(self.operations),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            **self.faults.stats()
+        }
+
+class FakeListObjectsPaginator:
+
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix='', **kwargs):
+        token = None
+        while True:
+            page = self.client.list_objects_v2(Bucket=Bucket, Prefix=Prefix, ContinuationToken=token)
+            yield page
+            if not page['IsTruncated']:
+                return
+            token = page['NextContinuationToken']
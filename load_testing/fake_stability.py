@@ -0,0 +1,67 @@
+import hashlib
+import io
+import threading
+from concurrent import futures
+import grpc
+from PIL import Image
+import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
+import stability_sdk.interfaces.gooseai.generation.generation_pb2_grpc as generation_grpc
+from faults import FaultInjector
+
+def render_png(prompt, width, height):
+    """
+    Plain PNG of the requested size, colored by a hash of the prompt.
+    """
+    digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), tuple(digest[:3])).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+class FakeGenerationService(generation_grpc.GenerationServiceServicer):
+
+    def __init__(self, faults):
+        self.faults = faults
+        self.images = 0
+        self.lock = threading.Lock()
+
+    def Generate(self, request, context):
+        if self.faults():
+            context.abort(grpc.StatusCode.UNAVAILABLE, "Generation failed (injected)")
+        prompt = " ".join(p.text for p in request.prompt)
+        with self.lock:
+            self.images += 1
+            number = self.images
+        yield generation.Answer(
+            answer_id=f"fake-{number}",
+            request_id=request.request_id,
+            artifacts=[generation.Artifact(
+                id=1,
+                type=generation.ARTIFACT_IMAGE,
+                mime="image/png",
+                binary=render_png(prompt, request.image.width or 1024, request.image.height or 1024),
+                finish_reason=generation.NULL
+            )]
+        )
+
+class FakeStability:
+    """
+    Stability AI generation service on a local insecure gRPC port, for STABILITY_HOST. The latency
+    of the FaultInjector stands for the generation time; injected failures abort with UNAVAILABLE.
+    """
+
+    def __init__(self, port=0, faults=None, max_workers=32):
+        self.service = FakeGenerationService(faults or FaultInjector())
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+        generation_grpc.add_GenerationServiceServicer_to_server(self.service, self.server)
+        self.port = self.server.add_insecure_port(f"localhost:{port}")
+        self.host = f"localhost:{self.port}"
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop(0)
+
+    def stats(self):
+        return {'images': self.service.images, **self.service.faults.stats()}
@@ -0,0 +1,44 @@
+import random
+import threading
+import time
+
+class FaultInjector:
+    """
+    Latency and error injection shared by the fake backends. Every call to a fake waits
+    latency seconds (plus up to jitter seconds) and fails with probability error_rate.
+    Draws come from one seeded generator, so a run with the same seed fails the same calls.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec, seed=None):
+        """
+        Build an injector from a "latency[:jitter[:error_rate]]" string, e.g. "0.5:0.2:0.05".
+        """
+        values = [float(value) for value in spec.split(':')] if spec else []
+        return cls(*values, seed=seed)
+
+    def __call__(self):
+        """
+        Wait the injected latency and return True if this call should fail.
+        """
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if delay:
+            time.sleep(delay)
+        return fail
+
+    def stats(self):
+        return {'calls': self.calls, 'errors': self.errors}
@@ -0,0 +1,455 @@
+import contextlib
+import importlib.util
+import io
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+import pandas as pd
+from faults import FaultInjector
+from fake_cloudinary import FakeCloudinary
+from fake_news_sites import FakeNewsSites
+from fake_openai import FakeOpenAI
+from fake_redshift import FakeRedshift
+from fake_s3 import FakeS3Client
+from fake_stability import FakeStability
+
+LOAD_TESTING_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(LOAD_TESTING_DIR)
+LAMBDA_DIRS = {
+    1: os.path.join('news_collection', 'lambda_1_scrapeNewsArticles'),
+    2: os.path.join('news_collection', 'lambda_2_summarizeAndGenerateTopics'),
+    3: os.path.join('news_collection', 'lambda_3_generateImages'),
+    4: os.path.join('news_collection', 'lambda_4_insertRedshift'),
+    5: os.path.join('news_collection', 'lambda_5_finalExport'),
+    6: os.path.join('news_transformation', 'lambda_wordcloudClean')
+}
+# The news_collection pipeline; stage 6 (the word cloud data, run after the export) is opt-in
+STAGES = [1, 2, 3, 4, 5]
+STAGE_NAMES = {1: 'scrape', 2: 'summarize_and_topics', 3: 'generate_images', 4: 'redshift_copy', 5: 'final_export', 6: 'wordcloud_clean'}
+# Folder of the stage file each of the first three stages hands to the next one
+STAGE_FOLDERS = {1: '1_raw', 2: '2_summarized_with_topics', 3: '3_generated_images'}
+FIXTURES_DIR = os.path.join(REPO_DIR, LAMBDA_DIRS[1], 'benchmarks', 'fixtures')
+
+BUCKET = 'state-of-the-earth'
+REDSHIFT_TABLE = 'ingestion.news_articles'
+FINAL_KEY = '4_final/final_data_for_flask.csv'
+WORDCLOUD_KEY = 'wordcloud/wordcloud_data_cleaned.csv'
+
+# Functions timed inside each stage, as (attribute of the Lambda module, label). Calls running in
+# worker threads overlap, so their busy time can add up to more than the stage took.
+STAGE_PROBES = {
+    1: [('fetch_feeds', 'feeds'), ('scrape_articles', 'article_pages')],
+    2: [('summarize_articles', 'summarization'), ('classify_topics', 'topic_calls')],
+    3: [('generate_image', 'image_generation'), ('upload_image', 'image_upload')],
+    4: [('copy_csv_to_redshift', 'redshift_copy')],
+    6: [('nlp', 'spacy_pipeline')]
+}
+
+# Backends that take a "latency[:jitter[:error_rate]]" fault spec (see faults.py)
+BACKENDS = ('news_sites', 'summarizer', 'openai', 'stability', 'cloudinary', 's3', 'redshift')
+# Rough figures of the real services; the summarizer latency is per generate pass over up to 1024 tokens
+DEFAULT_FAULTS = {
+    'news_sites': '0.15:0.1',
+    'summarizer': '3:1',
+    'openai': '0.6:0.4',
+    'stability': '2:1',
+    'cloudinary': '0.3:0.2',
+    's3': '0.02:0.01',
+    'redshift': '0.5:0.2'
+}
+
+class FakeBackends:
+    """
+    One instance of every fake, each with its own FaultInjector built from faults[name].
+    The news sites are started by Pipeline, which knows the feeds of the scraper.
+    """
+
+    def __init__(self, faults=None, seed=None):
+        faults = faults or {}
+        self.seed = seed
+        injectors = {
+            name: FaultInjector.parse(faults.get(name, ''), seed=None if seed is None else seed + index)
+            for index, name in enumerate(BACKENDS)
+        }
+        self.injectors = injectors
+        self.s3 = FakeS3Client(injectors['s3'])
+        self.redshift = FakeRedshift(self.s3, injectors['redshift'])
+        self.openai = FakeOpenAI(faults=injectors['openai']).start()
+        self.stability = FakeStability(faults=injectors['stability']).start()
+        self.cloudinary = FakeCloudinary(faults=injectors['cloudinary']).start()
+        self.news_sites = None
+
+    def start_news_sites(self, feeds, pages, items_per_feed):
+        self.news_sites = FakeNewsSites(feeds, pages, items_per_feed, faults=self.injectors['news_sites'], seed=self.seed or 0).start()
+        return self.news_sites
+
+    def environment(self):
+        """
+        Environment variables pointing the Lambdas at the fakes.
+        """
+        return {
+            'AWS_DEFAULT_REGION': 'eu-north-1',
+            'AWS_ACCESS_KEY_ID': 'mock',
+            'AWS_SECRET_ACCESS_KEY': 'mock',
+            'OPENAI_API_KEY': 'mock',
+            'OPENAI_API_BASE': self.openai.api_base,
+            'STABILITY_API_KEY': 'mock',
+            'STABILITY_HOST': self.stability.host,
+            'CLOUDINARY_CLOUD_NAME': 'mock',
+            'CLOUDINARY_API_KEY': 'mock',
+            'CLOUDINARY_API_SECRET': 'mock',
+            'CLOUDINARY_UPLOAD_PREFIX': self.cloudinary.upload_prefix,
+            'REDSHIFT_HOST': 'localhost',
+            'REDSHIFT_PORT': '5439',
+            'REDSHIFT_DBNAME': 'mock',
+            'REDSHIFT_USER': 'mock',
+            'REDSHIFT_PASSWORD': 'mock',
+            'IAM_ROLE': 'arn:aws:iam::000000000000:role/mock'
+        }
+
+    def stop(self):
+        for server in (self.openai, self.stability, self.cloudinary, self.news_sites):
+            if server is not None:
+                server.stop()
+
+    def stats(self):
+        stats = {
+            's3': self.s3.stats(),
+            'redshift': self.redshift.stats(),
+            'openai': self.openai.stats(),
+            'stability': self.stability.stats(),
+            'cloudinary': self.cloudinary.stats(),
+            'summarizer': self.injectors['summarizer'].stats()
+        }
+        if self.news_sites is not None:
+            stats['news_sites'] = self.news_sites.stats()
+        return stats
+
+def install_fake_s3(s3):
+    """
+    Make boto3.client('s3') return the fake; other services still get a real (unused) client.
+    """
+    real_client = boto3.client
+
+    def client(service_name, *args, **kwargs):
+        if service_name == 's3':
+            return s3
+        return real_client(service_name, *args, **kwargs)
+    boto3.client = client
+
+def load_lambda(stage, module_name='lambda_function'):
+    """
+    Import a module of a stage's Lambda (lambda_function by default) as its own module, like a fresh
+    container. Every Lambda ships its own copies of s3_storage, stage_format, ..., so the copies
+    imported for the Lambda loaded before are dropped first.
+    """
+    directory = os.path.join(REPO_DIR, LAMBDA_DIRS[stage])
+    lambda_dirs = tuple(os.path.join(REPO_DIR, path) + os.sep for path in LAMBDA_DIRS.values())
+    for name, module in list(sys.modules.items()):
+        if (getattr(module, '__file__', None) or '').startswith(lambda_dirs):
+            del sys.modules[name]
+    sys.path.insert(0, directory)
+    try:
+        spec = importlib.util.spec_from_file_location(f"lambda_{stage}_{module_name}", os.path.join(directory, f"{module_name}.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(directory)
+    return module
+
+def feed_domains(feeds):
+    """
+    Map every feed URL to the domain of its articles, read from the stored copy of the feed in the fixtures.
+    """
+    domains = {}
+    for feed in feeds:
+        file_name = re.sub(r'\W+', '_', feed['name'].lower()).strip('_') + '.xml'
+        with open(os.path.join(FIXTURES_DIR, 'rss', file_name), encoding='utf-8') as f:
+            domains[feed['url']] = urllib.parse.urlsplit(re.search(r'<link>([^<]+)</link>', f.read()).group(1)).netloc
+    return domains
+
+def load_page_fixtures():
+    """
+    Map every domain to the raw HTML of its stored article page.
+    """
+    pages = {}
+    for file_name in os.listdir(os.path.join(FIXTURES_DIR, 'html')):
+        if file_name.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, 'html', file_name), 'rb') as f:
+                pages[file_name[:-len('.html')]] = f.read()
+    return pages
+
+def lead_summaries(faults, words=60, max_windows=4, tokens_per_word=1.3, window_tokens=1024, overlap=128):
+    """
+    Stand-in for summarize_articles of stage 2: the first words of every article. The latency of
+    the injector stands for one generate pass over up to window_tokens tokens, and the passes follow
+    the map_reduce mode: one per window (at most max_windows) of an article longer than window_tokens
+    plus overlap, plus the final one; a shorter article is truncated and takes a single pass.
+    An injected failure fails the whole batch.
+    """
+    def summarize_articles(texts, summarizer=None, tokenizer=None):
+        summaries = []
+        for text in texts:
+            article_words = text.split()
+            tokens = len(article_words) * tokens_per_word
+            windows = 1
+            if tokens > window_tokens + overlap:
+                windows = min(math.ceil((tokens - overlap) / (window_tokens - overlap)), max_windows)
+            for _ in range(windows + 1 if windows > 1 else 1):
+                if faults():
+                    raise RuntimeError("Summarization failed (injected)")
+            summaries.append(" ".join(article_words[:words]))
+        return summaries
+    return summarize_articles
+
+def resident_memory():
+    """
+    Resident set size of this process in bytes (the high-water mark where /proc isn't available).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class PeakMemory:
+    """
+    Highest resident set size of the process while the block runs, sampled every interval seconds
+    by a background thread; like the "Max Memory Used" of a Lambda invocation, but for the process.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, resident_memory())
+
+    def __enter__(self):
+        self.start = self.peak = resident_memory()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, resident_memory())
+
+def s3_event(bucket, key):
+    return {'Records': [{'s3': {'bucket': {'name': bucket}, 'object': {'key': key}}}]}
+
+@contextlib.contextmanager
+def captured_output(path=None):
+    """
+    Send the prints and log records of the Lambdas to path (or discard them) while running the stages.
+    """
+    with open(path or os.devnull, 'a', encoding='utf-8') as stream:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        root = logging.getLogger()
+        root.addHandler(handler)
+        try:
+            with contextlib.redirect_stdout(stream):
+                yield
+        finally:
+            root.removeHandler(handler)
+
+class Pipeline:
+    """
+    The Lambdas of the given stages (the five news_collection ones by default, 6 adds
+    lambda_wordcloudClean), each imported once (later runs hit a warm container) with boto3,
+    psycopg2 and the API endpoints pointing at the fakes, chained the way S3 events chain them:
+    every stage is invoked with the stage file written by the one before.
+
+    The summarizer of stage 2 is replaced by lead_summaries unless summarizer='model' (bart-large-cnn
+    from MODEL_PATH). Where stage 2 can't be imported (PyTorch or transformers missing), its output
+    is emulated with the same stand-in summarizer and the Lambda's own topic_classifier, and the stage
+    is reported as 'emulated'. A stage 6 without spaCy or its model is reported as 'unavailable'.
+
+    With measure_memory, every result also has the peak resident memory of the process during the stage.
+    """
+
+    def __init__(self, backends, items_per_feed=10, summarizer='fake', pages=None, stages=STAGES, measure_memory=False):
+        self.backends = backends
+        self.stages = list(stages)
+        self.measure_memory = measure_memory
+        os.environ.update(backends.environment())
+        install_fake_s3(backends.s3)
+        backends.redshift.install()
+
+        self.modules = {}
+        self.load_seconds = {}
+        self.unavailable = {}
+        self.topic_classifier = None
+        for stage in self.stages:
+            start = time.perf_counter()
+            try:
+                self.modules[stage] = load_lambda(stage)
+            except (ImportError, OSError) as e:
+                # OSError: the spaCy model of stage 6 isn't installed
+                if stage not in (2, 6):
+                    raise
+                self.unavailable[stage] = str(e)
+                if stage == 2:
+                    self.topic_classifier = load_lambda(stage, 'topic_classifier')
+                    self.topic_classifier.openai.api_key = os.environ['OPENAI_API_KEY']
+            self.load_seconds[stage] = time.perf_counter() - start
+
+        scraper = self.modules[1]
+        backends.start_news_sites(feed_domains(scraper.RSS_FEEDS), pages or load_page_fixtures(), items_per_feed)
+        backends.news_sites.mount(scraper.session)
+        self.stage_format = scraper.stage_format
+
+        self.summarize_articles = lead_summaries(backends.injectors['summarizer'])
+        if 2 in self.modules and summarizer == 'fake':
+            self.modules[2].summarize_articles = self.summarize_articles
+            self.modules[2].get_summarizer = lambda: None
+            self.modules[2].get_tokenizer = lambda: None
+
+        self._busy = {}
+        self._busy_lock = threading.Lock()
+        for stage, probes in STAGE_PROBES.items():
+            for attribute, label in probes:
+                if stage in self.modules:
+                    self.probe(self.modules[stage], attribute, label)
+        if self.topic_classifier is not None:
+            self.probe(self, 'summarize_articles', 'summarization')
+            self.probe(self.topic_classifier, 'classify_topics', 'topic_calls')
+
+    def probe(self, owner, attribute, label):
+        """
+        Replace owner.attribute with a wrapper adding the time spent in every call to the busy time of label.
+        """
+        func = getattr(owner, attribute)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._busy_lock:
+                    calls, busy = self._busy.get(label, (0, 0.0))
+                    self._busy[label] = (calls + 1, busy + time.perf_counter() - start)
+        setattr(owner, attribute, timed)
+
+    def set_articles(self, count):
+        """
+        Scrape up to count articles per run from here on: MAX_ARTICLES of the scraper and the new items of every feed.
+        """
+        self.modules[1].MAX_ARTICLES = count
+        self.backends.news_sites.items_per_feed = count
+
+    def emulate_stage_2(self, key):
+        s3 = self.backends.s3
+        df = self.stage_format.read_stage_frame(s3, BUCKET, key)
+        df = df[df['Content'].fillna('').str.strip() != ''].copy()
+        if df.empty:
+            return
+        # Like process_csv: the topic requests (to the fake chat API) run while the articles are summarized
+        contents = df['Content'].tolist()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            topics_future = executor.submit(self.topic_classifier.classify_topics, contents)
+            df['Summary'] = self.summarize_articles(contents)
+            topics = topics_future.result()
+        df['Topic_1'] = [topic_1 for topic_1, _ in topics]
+        df['Topic_2'] = [topic_2 for _, topic_2 in topics]
+        self.stage_format.write_stage_frame(s3, BUCKET, df, STAGE_FOLDERS[2])
+
+    def count_rows(self, key):
+        return len(self.stage_format.decode_frame(self.backends.s3.objects[(BUCKET, key)], key))
+
+    def count_csv_rows(self, key):
+        return len(pd.read_csv(io.BytesIO(self.backends.s3.objects[(BUCKET, key)])))
+
+    def invoke(self, stage, event):
+        if stage == 2 and stage in self.unavailable:
+            self.emulate_stage_2(event['Records'][0]['s3']['object']['key'])
+            return None
+        return self.modules[stage].lambda_handler(event, None)
+
+    def run_stage(self, stage, key):
+        """
+        Invoke one stage (with an S3 event for key) and return its result: status, seconds, articles,
+        the busy time of its probes and the stage file it wrote. A stage without output ends the chain
+        with status 'failed'.
+        """
+        result = {'stage': stage, 'name': STAGE_NAMES[stage], 'seconds': 0.0, 'articles': 0, 'key': None}
+        if stage in self.unavailable and stage != 2:
+            result.update(status='unavailable', error=self.unavailable[stage])
+            return result
+
+        s3 = self.backends.s3
+        position = len(s3.writes)
+        rows_before = self.backends.redshift.row_count(REDSHIFT_TABLE)
+        event = s3_event(BUCKET, key) if key else {}
+        with self._busy_lock:
+            self._busy.clear()
+
+        error = None
+        response = None
+        memory = PeakMemory() if self.measure_memory else contextlib.nullcontext()
+        start = time.perf_counter()
+        with memory:
+            try:
+                response = self.invoke(stage, event)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        result['seconds'] = time.perf_counter() - start
+        with self._busy_lock:
+            result['breakdown'] = {label: {'calls': calls, 'busy_s': busy} for label, (calls, busy) in self._busy.items()}
+        if self.measure_memory:
+            result['peak_rss_mb'] = memory.peak / 2 ** 20
+            result['rss_growth_mb'] = (memory.peak - memory.start) / 2 ** 20
+
+        if stage in STAGE_FOLDERS:
+            folder = STAGE_FOLDERS[stage]
+            written = s3.keys_written_since(position, BUCKET, f"{folder}/{folder}_")
+            if written:
+                result['key'] = written[-1]
+                result['articles'] = self.count_rows(written[-1])
+            else:
+                error = error or "no stage file written"
+        elif stage == 4:
+            result['articles'] = self.backends.redshift.row_count(REDSHIFT_TABLE) - rows_before
+            if (response or {}).get('statusCode') != 200:
+                error = error or (response or {}).get('body', "no response")
+        elif stage in (5, 6):
+            output_key = FINAL_KEY if stage == 5 else WORDCLOUD_KEY
+            if s3.keys_written_since(position, BUCKET, output_key):
+                result['articles'] = self.count_csv_rows(output_key)
+            else:
+                error = error or f"{output_key} not written"
+
+        if error is not None:
+            result['status'] = 'failed'
+            result['error'] = error
+        else:
+            result['status'] = 'emulated' if stage in self.unavailable else 'ok'
+        return result
+
+    def run(self):
+        """
+        Run the stages once, in order. Returns one result per stage; stages after a failed one are 'skipped'.
+        """
+        results = []
+        key = None
+        for stage in self.stages:
+            if results and results[-1]['status'] not in ('ok', 'emulated'):
+                results.append({'stage': stage, 'name': STAGE_NAMES[stage], 'status': 'skipped', 'seconds': 0.0, 'articles': 0, 'key': None})
+                continue
+            result = self.run_stage(stage, key)
+            key = result['key']
+            results.append(result)
+        return results
@@ -0,0 +1,142 @@
+"""
+Load test of the news_collection pipeline without live keys or a bucket: runs lambda_handler of
+stages 1-5 end to end, --runs times, against local fakes of the news sites, the summarizer, the
+OpenAI chat API, Stability AI, Cloudinary, S3 and Redshift, and reports per stage the latency
+(mean, median, p95) and the throughput in articles per second, plus the calls and injected errors
+of every fake.
+
+Every fake takes a --<name>-faults "latency[:jitter[:error_rate]]" spec, in seconds per call; the defaults are
+rough figures of the real services. The summarizer latency is per generate pass: one for a short
+article, one per window plus one for a long one (see pipeline.lead_summaries).
+
+Usage (from the repository root):
+    pip install -r load_testing/requirements.txt
+    python load_testing/run_load_test.py [--runs 5] [--max-articles 10]
+    python load_testing/run_load_test.py --stability-faults 6:2:0.1 --openai-faults 1:0.5:0.05 --log load_test.log
+    python load_testing/run_load_test.py --json results.json
+
+Stage 2 is driven with the stand-in summarizer (--summarizer model loads bart-large-cnn from
+MODEL_PATH instead). Without PyTorch and transformers installed it can't be imported at all;
+its output is then emulated and the stage is reported as 'emulated'.
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pipeline
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[math.ceil(len(values) * share) - 1]
+
+def summarize_stage(results):
+    """
+    Latency and throughput figures of one stage over the runs in which it completed.
+    """
+    completed = [result for result in results if result['status'] in ('ok', 'emulated')]
+    summary = {
+        'name': results[0]['name'],
+        'runs': len(results),
+        'completed': len(completed),
+        'statuses': sorted({result['status'] for result in results})
+    }
+    if completed:
+        seconds = [result['seconds'] for result in completed]
+        articles = sum(result['articles'] for result in completed)
+        summary.update({
+            'mean_s': round(statistics.mean(seconds), 3),
+            'median_s': round(statistics.median(seconds), 3),
+            'p95_s': round(percentile(seconds, 0.95), 3),
+            'articles': articles,
+            'articles_per_s': round(articles / sum(seconds), 2) if sum(seconds) else None
+        })
+    errors = sorted({result['error'] for result in results if result.get('error')})
+    if errors:
+        summary['errors'] = errors
+    return summary
+
+def add_fault_arguments(arg_parser):
+    for name in pipeline.BACKENDS:
+        default = pipeline.DEFAULT_FAULTS[name]
+        arg_parser.add_argument(f"--{name.replace('_', '-')}-faults", dest=f"{name}_faults", default=default, metavar='SPEC',
+                                help=f"latency[:jitter[:error_rate]] of the {name} fake (default {default})")
+
+def fault_specs(args):
+    return {name: getattr(args, f"{name}_faults") for name in pipeline.BACKENDS}
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--runs', type=int, default=5, help="pipeline runs (the first one includes the cold start)")
+    arg_parser.add_argument('--max-articles', type=int, default=10, help="MAX_ARTICLES of the scraper")
+    arg_parser.add_argument('--items-per-feed', type=int, default=10, help="new items in every feed fetch")
+    arg_parser.add_argument('--stage-format', choices=['parquet', 'csv'], default='parquet', help="STAGE_FORMAT of the stage files")
+    arg_parser.add_argument('--summarizer', choices=['fake', 'model'], default='fake', help="stand-in or bart-large-cnn")
+    arg_parser.add_argument('--caches', action='store_true', help="keep the result and image caches of stages 2 and 3 enabled")
+    arg_parser.add_argument('--seed', type=int, default=0, help="seed of the injected jitter and errors")
+    arg_parser.add_argument('--log', help="write the output of the Lambdas to this file (default: discard it)")
+    arg_parser.add_argument('--json', help="also write the results to this file")
+    add_fault_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    # Read at import by the Lambdas, so set before the pipeline loads them
+    os.environ['MAX_ARTICLES'] = str(args.max_articles)
+    os.environ['STAGE_FORMAT'] = args.stage_format
+    if not args.caches:
+        os.environ['RESULT_CACHE_PREFIX'] = ''
+        os.environ['IMAGE_CACHE_PREFIX'] = ''
+
+    backends = pipeline.FakeBackends(fault_specs(args), seed=args.seed)
+    try:
+        with pipeline.captured_output(args.log):
+            runner = pipeline.Pipeline(backends, items_per_feed=args.items_per_feed, summarizer=args.summarizer)
+        for stage, reason in runner.unavailable.items():
+            print(f"Stage {stage} can't be imported ({reason}); its output is emulated.")
+
+        runs = []
+        for run in range(args.runs):
+            start = time.perf_counter()
+            with pipeline.captured_output(args.log):
+                results = runner.run()
+            total = time.perf_counter() - start
+            runs.append({'seconds': total, 'stages': results})
+            line = "  ".join(f"{result['stage']}:{result['status']} {result['seconds']:.2f}s/{result['articles']}" for result in results)
+            print(f"run {run + 1}: {total:.2f}s  {line}")
+    finally:
+        backends.stop()
+
+    stages = {stage: summarize_stage([run['stages'][index] for run in runs]) for index, stage in enumerate(pipeline.STAGES)}
+    report = {
+        'settings': {key: value for key, value in vars(args).items() if key not in ('log', 'json')},
+        'load_seconds': {stage: round(seconds, 3) for stage, seconds in runner.load_seconds.items()},
+        'stages': stages,
+        'pipeline_mean_s': round(statistics.mean(run['seconds'] for run in runs), 3),
+        'backends': backends.stats()
+    }
+
+    print(f"\n{'stage':<26}{'done':>6}{'mean s':>9}{'median s':>10}{'p95 s':>9}{'articles':>10}{'articles/s':>12}")
+    for stage, summary in stages.items():
+        label = f"{stage} {summary['name']}"
+        if summary['completed']:
+            print(f"{label:<26}{summary['completed']:>3}/{summary['runs']:<2}{summary['mean_s']:>9.2f}{summary['median_s']:>10.2f}"
+                  f"{summary['p95_s']:>9.2f}{summary['articles']:>10}{summary['articles_per_s'] or 0:>12.2f}")
+        else:
+            print(f"{label:<26}{0:>3}/{summary['runs']:<2}  {', '.join(summary['statuses'])}")
+        for error in summary.get('errors', []):
+            print(f"    {error}")
+    print(f"\nPipeline: {report['pipeline_mean_s']:.2f}s per run on average")
+    print("\nBackends:")
+    for name, stats in report['backends'].items():
+        print(f"  {name:<12}{json.dumps(stats)}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
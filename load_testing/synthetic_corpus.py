@@ -0,0 +1,103 @@
+import copy
+import hashlib
+import random
+import lxml.html
+
+WORDS = [
+    "climate", "emissions", "ocean", "wildlife", "drought", "flood", "solar", "wind", "methane", "forest",
+    "carbon", "policy", "species", "habitat", "energy", "coal", "warming", "glacier", "river", "farmers",
+    "scientists", "government", "researchers", "communities", "report", "study", "water", "heat", "storm", "crops",
+    "the", "a", "of", "in", "and", "to", "for", "on", "with", "from", "by", "as", "that", "new", "global",
+    "local", "rising", "record", "said", "found", "warned", "announced", "could", "would", "will", "more", "than"
+]
+# Words per paragraph of a synthetic article
+PARAGRAPH_WORDS = (40, 120)
+MIN_ARTICLE_WORDS = 20
+
+def parse_distribution(spec):
+    """
+    Parse an article length distribution into a function rng -> number of words:
+        fixed:N              every article has N words
+        uniform:MIN:MAX      uniformly between MIN and MAX
+        lognormal:MEDIAN:S   log-normal around MEDIAN with shape S (long tail of long articles)
+        choice:A,B,C         one of the listed lengths, equally likely
+    """
+    kind, _, arguments = spec.partition(':')
+    if kind == 'fixed':
+        words = int(arguments)
+        draw = lambda rng: words
+    elif kind == 'uniform':
+        low, high = (int(value) for value in arguments.split(':'))
+        draw = lambda rng: rng.randint(low, high)
+    elif kind == 'lognormal':
+        median, sigma = (float(value) for value in arguments.split(':'))
+        draw = lambda rng: round(rng.lognormvariate(0, sigma) * median)
+    elif kind == 'choice':
+        lengths = [int(value) for value in arguments.split(',')]
+        draw = lambda rng: rng.choice(lengths)
+    else:
+        raise ValueError(f"Unknown length distribution {spec!r}, expected fixed, uniform, lognormal or choice")
+    return lambda rng: max(draw(rng), MIN_ARTICLE_WORDS)
+
+def sentences(rng, words):
+    """
+    Text of about `words` words in sentences of 8-20 words.
+    """
+    parts = []
+    while words > 0:
+        length = min(rng.randint(8, 20), words)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        parts.append(sentence[0].upper() + sentence[1:] + ".")
+        words -= length
+    return " ".join(parts)
+
+def paragraphs(rng, words):
+    texts = []
+    while words > 0:
+        length = min(rng.randint(*PARAGRAPH_WORDS), words)
+        texts.append(sentences(rng, length))
+        words -= length
+    return texts
+
+class SyntheticCorpus:
+    """
+    Article pages of a chosen length. Every page is the stored page of its domain (templates) with
+    the elements the extraction rule selects (compiled_rules, COMPILED_EXTRACTION_RULES of the
+    scraper) replaced by synthetic paragraphs, so the scraper extracts exactly the generated text.
+    Lengths are drawn from the distribution spec (see parse_distribution) with a generator seeded
+    by the seed and the URL: the same seed gives every URL the same article in every run.
+    """
+
+    def __init__(self, templates, compiled_rules, distribution='lognormal:700:0.6', seed=0):
+        self.templates = templates
+        self.compiled_rules = compiled_rules
+        self.distribution = distribution
+        self.draw_length = parse_distribution(distribution)
+        self.seed = seed
+
+    def page(self, domain, url):
+        if domain not in self.templates or domain not in self.compiled_rules:
+            return None
+        rng = random.Random(hashlib.sha256(f"{self.seed}:{url}".encode('utf-8')).digest())
+        return self.render(domain, paragraphs(rng, self.draw_length(rng)))
+
+    def render(self, domain, texts):
+        compiled_rule = self.compiled_rules[domain]
+        root = lxml.html.document_fromstring(self.templates[domain])
+        scope = compiled_rule['scope'](root)[0] if 'scope' in compiled_rule else root
+        selected = compiled_rule['select'](scope)
+        template = selected[0]
+        for element in selected[1:]:
+            element.drop_tree()
+
+        parent = template.getparent()
+        position = parent.index(template)
+        for offset, text in enumerate(texts):
+            element = copy.deepcopy(template)
+            attributes = dict(element.attrib)
+            element.clear()
+            element.attrib.update(attributes)
+            element.text = text
+            parent.insert(position + offset, element)
+        template.drop_tree()
+        return lxml.html.tostring(root, encoding='utf-8', doctype='<!DOCTYPE html>')
@@ -0,0 +1,62 @@
+"""
+Compare the rule-driven extraction engine with the former BeautifulSoup parsers
+on the saved article pages in fixtures/html (one <domain>.html per site), and on the
+pages in fixtures/html_no_charset, which declare no charset and contain non-ASCII UTF-8 text.
+
+Usage (from the Lambda folder):
+    pip install -r requirements.txt -r benchmarks/requirements.txt
+    python benchmarks/bench_extraction.py [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-north-1')
+
+import lambda_function
+from legacy_parsers import LEGACY_PARSERS
+
+HTML_FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures', 'html')
+NO_CHARSET_FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures', 'html_no_charset')
+
+def load_html_fixtures(fixtures_dir=HTML_FIXTURES_DIR):
+    """
+    Return a dict mapping each domain to the raw HTML of its saved article page.
+    """
+    fixtures = {}
+    for file_name in sorted(os.listdir(fixtures_dir)):
+        if file_name.endswith('.html'):
+            with open(os.path.join(fixtures_dir, file_name), 'rb') as f:
+                fixtures[file_name[:-len('.html')]] = f.read()
+    return fixtures
+
+def time_per_call(func, arg, repeat):
+    """
+    Return the mean wall-clock time of func(arg) in milliseconds, and its last result.
+    """
+    result = func(arg)  # Warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(arg)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--repeat', type=int, default=20, help="timed runs per site")
+    args = arg_parser.parse_args()
+
+    print(f"{'site':<28}{'legacy ms':>12}{'rules ms':>12}{'speedup':>10}  parity")
+    cases = [(domain, domain, html) for domain, html in load_html_fixtures().items()]
+    cases += [(f"{domain} (no charset)", domain, html) for domain, html in load_html_fixtures(NO_CHARSET_FIXTURES_DIR).items()]
+    for name, domain, html in cases:
+        compiled_rule = lambda_function.COMPILED_EXTRACTION_RULES[domain]
+        legacy_ms, legacy_text = time_per_call(LEGACY_PARSERS[domain], html, args.repeat)
+        rules_ms, rules_text = time_per_call(lambda page: lambda_function.extract_content(compiled_rule, page), html, args.repeat)
+        parity = "same" if legacy_text == rules_text else "DIFFERENT"
+        print(f"{name:<28}{legacy_ms:>12.2f}{rules_ms:>12.2f}{legacy_ms / rules_ms:>9.1f}x  {parity}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Offline benchmark suite for the scraper. Replays the stored RSS feeds (fixtures/rss) and
+article pages (fixtures/html) through parse_feed, get_content_parser and the extraction
+rule of every site without any network traffic, and reports per case:
+    - mean, median and p95 latency
+    - throughput in articles per second
+    - peak Python memory allocated (tracemalloc)
+
+Results are compared with benchmarks/baseline.json and the run fails (exit code 1) when a
+case's median latency or peak memory exceeds the baseline by more than the tolerance.
+Latencies are normalised with a fixed calibration workload so a baseline recorded on one
+machine stays usable on another, and differences under --min-delta-ms are ignored as noise.
+
+Usage (from the Lambda folder):
+    pip install -r requirements.txt -r benchmarks/requirements.txt
+    python benchmarks/bench_scraper.py                   # compare with the baseline
+    python benchmarks/bench_scraper.py --save-baseline   # record a new baseline
+    python benchmarks/bench_scraper.py --json results.json --tolerance 0.5
+"""
+import argparse
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+import urllib.parse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-north-1')
+
+import lambda_function
+from bench_extraction import load_html_fixtures
+
+RSS_FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures', 'rss')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# Articles taken from every feed in the parse_feed cases
+FEED_ARTICLES = 10
+
+def feed_fixture_name(feed_name):
+    return re.sub(r'\W+', '_', feed_name.lower()).strip('_') + '.xml'
+
+def load_rss_fixtures():
+    """
+    Return a dict mapping each feed URL in RSS_FEEDS to the raw XML of its stored copy.
+    """
+    fixtures = {}
+    for feed in lambda_function.RSS_FEEDS:
+        with open(os.path.join(RSS_FIXTURES_DIR, feed_fixture_name(feed['name'])), 'rb') as f:
+            fixtures[feed['url']] = f.read()
+    return fixtures
+
+def replay_fetch_content(rss_fixtures, html_fixtures):
+    """
+    Build a stand-in for fetch_content that answers from the fixtures: feed URLs get their stored
+    XML and every article URL gets the stored page of its domain.
+    """
+    def fetch_content(url, validator=None):
+        if url in rss_fixtures:
+            return rss_fixtures[url]
+        return html_fixtures.get(urllib.parse.urlparse(url).netloc)
+    return fetch_content
+
+def replay_fetch_page(html_fixtures):
+    """
+    Build a stand-in for fetch_page that answers every article URL with the stored page of its domain.
+    """
+    def fetch_page(url):
+        return html_fixtures.get(urllib.parse.urlparse(url).netloc), None
+    return fetch_page
+
+def calibrate(repeat=10):
+    """
+    Time a fixed pure-Python workload (in ms) as a measure of the speed of this machine.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sum(i * i for i in range(300000))
+        " ".join(str(i) for i in range(100000)).split()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def measure(func, articles_per_call, repeat):
+    """
+    Run func repeatedly and return its latency, throughput and peak memory figures.
+    """
+    func()  # Warm-up
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Memory is measured in a separate run, tracing slows the code down
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mean_ms = statistics.mean(timings)
+    return {
+        'mean_ms': round(mean_ms, 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(sorted(timings)[math.ceil(len(timings) * 0.95) - 1], 3),
+        'articles_per_s': round(articles_per_call / mean_ms * 1000, 1),
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+def build_cases(rss_fixtures, html_fixtures):
+    """
+    Return the benchmark cases as (name, function, articles per call) tuples.
+    """
+    cases = []
+    for feed in lambda_function.RSS_FEEDS:
+        cases.append((
+            f"parse_feed:{feed['name']}",
+            lambda feed=feed: lambda_function.parse_feed(feed['name'], feed['url'], set(), max_articles=FEED_ARTICLES),
+            FEED_ARTICLES
+        ))
+    for domain in sorted(html_fixtures):
+        url = f"https://{domain}/benchmark-article"
+        cases.append((
+            f"get_content_parser:{domain}",
+            lambda domain=domain, url=url: lambda_function.get_content_parser(domain)(url),
+            1
+        ))
+        cases.append((
+            f"extract_content:{domain}",
+            lambda domain=domain: lambda_function.extract_content(lambda_function.COMPILED_EXTRACTION_RULES[domain], html_fixtures[domain]),
+            1
+        ))
+    return cases
+
+def find_regressions(results, baseline, tolerance, min_delta_ms):
+    """
+    Compare the results with the baseline and return a list of regression messages.
+    Latencies are scaled by the ratio of the calibration timings before comparing.
+    """
+    speed_ratio = baseline['calibration_ms'] / results['calibration_ms']
+    regressions = []
+    for name, expected in baseline['cases'].items():
+        actual = results['cases'].get(name)
+        if actual is None:
+            regressions.append(f"{name}: missing from this run")
+            continue
+        normalised_ms = actual['median_ms'] * speed_ratio
+        if normalised_ms - expected['median_ms'] > max(expected['median_ms'] * tolerance, min_delta_ms):
+            regressions.append(f"{name}: median latency {normalised_ms:.2f} ms (normalised) > baseline {expected['median_ms']:.2f} ms")
+        if actual['peak_kb'] > expected['peak_kb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {actual['peak_kb']:.0f} KB > baseline {expected['peak_kb']:.0f} KB")
+    return regressions
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--repeat', type=int, default=50, help="timed runs per case")
+    arg_parser.add_argument('--tolerance', type=float, default=0.3, help="allowed slowdown / memory growth (0.3 = 30%%)")
+    arg_parser.add_argument('--min-delta-ms', type=float, default=0.5, help="latency differences below this are ignored")
+    arg_parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline file to compare with or to write")
+    arg_parser.add_argument('--save-baseline', action='store_true', help="write the results as the new baseline")
+    arg_parser.add_argument('--json', help="also write the results to this file")
+    args = arg_parser.parse_args()
+
+    rss_fixtures = load_rss_fixtures()
+    html_fixtures = load_html_fixtures()
+    lambda_function.fetch_content = replay_fetch_content(rss_fixtures, html_fixtures)
+    lambda_function.fetch_page = replay_fetch_page(html_fixtures)
+    lambda_function.CACHE_RAW_HTML = False  # Nothing is written to S3
+
+    results = {'calibration_ms': round(calibrate(), 3), 'cases': {}}
+    print(f"{'case':<52}{'mean ms':>10}{'median ms':>11}{'p95 ms':>10}{'articles/s':>12}{'peak KB':>10}")
+    for name, func, articles_per_call in build_cases(rss_fixtures, html_fixtures):
+        stats = measure(func, articles_per_call, args.repeat)
+        results['cases'][name] = stats
+        print(f"{name:<52}{stats['mean_ms']:>10.2f}{stats['median_ms']:>11.2f}{stats['p95_ms']:>10.2f}{stats['articles_per_s']:>12.1f}{stats['peak_kb']:>10.0f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found, run with --save-baseline to record one.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print("\nNo regressions against the baseline.")
+
+if __name__ == '__main__':
+    main()
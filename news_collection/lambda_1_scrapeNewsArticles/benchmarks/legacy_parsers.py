@@ -0,0 +1,134 @@
+"""
+BeautifulSoup parsers as they were before the rule-driven extraction engine.
+They take the raw page HTML instead of the URL and serve as the reference for
+output parity and speed in the benchmarks.
+"""
+from bs4 import BeautifulSoup
+
+def parse_paragraphs(soup, parent_tag, child_tag='p', child_class=None, child_id=None, data_component=None):
+    """
+    Extract paragraphs from all matching parent HTML tags (e.g., 'div', 'article').
+    This function collects all <p> tags within each matching parent and returns them as a single string.
+    Only immediate child <p> tags are included (ignoring nested <p> tags).
+    Optionally, it can filter by class, id, or data-component attribute.
+    """
+    # Find all parent tags based on the filters provided
+    if child_id:
+        parents = soup.find_all(parent_tag, id=child_id)
+    elif child_class:
+        parents = soup.find_all(parent_tag, class_=child_class)
+    elif data_component:
+        parents = soup.find_all(parent_tag, attrs={'data-component': data_component})
+    else:
+        parents = soup.find_all(parent_tag)
+
+    if not parents:
+        return ""  # Return an empty string if no parent tags are found
+
+    # Collect paragraphs from all matching parent tags
+    all_paragraphs = []
+    for parent in parents:
+        # Find all child <p> tags that are immediate children of the parent tag
+        paragraphs = parent.find_all(child_tag, recursive=False)
+        # Add the text content of the paragraphs to the list
+        all_paragraphs.extend(p.get_text(" ", strip=True) for p in paragraphs)
+
+    # Join the text content of all paragraphs and return as a single string
+    return " ".join(all_paragraphs)
+
+# Individual content parsers for each website (based on domain)
+
+def parse_guardian(content):
+    """
+    Extract content from The Guardian article page.
+    """
+    if not content: return ""
+    soup = BeautifulSoup(content, 'html.parser')
+    # Find the main content div by id
+    main_content = soup.find('div', id='maincontent')
+    if not main_content:
+        return ""
+    return parse_paragraphs(main_content, 'div', 'p')
+
+def parse_bbc(content):
+    """
+    Extract content from BBC News article page.
+    """
+    if not content: return ""
+    
+    soup = BeautifulSoup(content, 'html.parser')
+    main_content = soup.find('article')
+    if not main_content:
+        return ""
+    return parse_paragraphs(soup, 'div', data_component='text-block')
+
+def parse_grist(content):
+    """
+    Extract content from Grist article page.
+    """
+    if not content: return ""
+    
+    soup = BeautifulSoup(content, 'html.parser')
+    return parse_paragraphs(soup, 'div', child_class='article-body')
+
+def parse_earth911(content):
+    """
+    Extract content from Earth911 article page.
+    """
+    if not content: return ""
+    
+    soup = BeautifulSoup(content, 'html.parser')
+    return parse_paragraphs(soup, 'article')
+
+def parse_columbia_climate(content):
+    """
+    Extract content from Columbia Climate School article page.
+    """
+    if not content: return ""
+    soup = BeautifulSoup(content, 'html.parser')
+    main_content = soup.find('main')
+    if not main_content:
+        return ""
+    
+    return parse_paragraphs(main_content, 'div', 'p', child_class='entry-content')
+
+def parse_independent(content):
+    """
+    Extract content from The Independent article page.
+    """
+    if not content: return ""
+    
+    soup = BeautifulSoup(content, 'html.parser')
+    return parse_paragraphs(soup, 'div', child_id='main')
+
+def parse_yale_environment(content):
+    """
+    Extract content from Yale Environment 360 article page.
+    """
+    if not content: return ""
+    
+    soup = BeautifulSoup(content, 'html.parser')
+    return parse_paragraphs(soup, 'section', 'div', child_class='article__body')
+
+def parse_greenpeace(content):
+    """
+    Extract content from Greenpeace article page.
+    """
+    if not content: return ""
+    soup = BeautifulSoup(content, 'html.parser')
+    main_content = soup.find('div', id='content')
+    if not main_content:
+        return ""
+    return parse_paragraphs(main_content, 'article', 'p')
+
+# Mapping domains to specific parsers
+LEGACY_PARSERS = {
+    'www.bbc.com': parse_bbc,
+    'grist.org': parse_grist,
+    'earth911.com': parse_earth911,
+    'news.climate.columbia.edu': parse_columbia_climate,
+    'www.independent.co.uk': parse_independent,
+    'www.greenpeace.org': parse_greenpeace,
+    'www.theguardian.com': parse_guardian,
+    'e360.yale.edu': parse_yale_environment
+}
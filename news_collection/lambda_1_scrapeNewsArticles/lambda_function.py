@@ -1,13 +1,32 @@
 import os
+import re
+import json
 import requests
 import pandas as pd
-from bs4 import BeautifulSoup
+from lxml import etree
+import lxml.html
+from cssselect import HTMLTranslator
+import functools
+import itertools
+import io
+import gzip
+import hashlib
+import argparse
 import urllib.parse
+import email.message
 from datetime import datetime
 import pytz
 import boto3
 import logging
-import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import math
+from collections import namedtuple
+import scraped_url_ledger
+import http_session
+import s3_storage
+import stage_format
 
 # Configure logging
 logger = logging.getLogger()
@@ -27,198 +46,277 @@ RSS_FEEDS = [
 
 # AWS S3 Bucket information
 S3_BUCKET_NAME = "state-of-the-earth"
-S3_SCRAPED_URLS_FILE = "scraped_urls.txt"
-# CSV filename will be dynamically generated
-CSV_FILE = None
+# HTTP validators (ETag / Last-Modified) of the RSS feeds, used for conditional requests
+S3_FEED_VALIDATORS_KEY = "1_raw/feed_validators.json"
+# Compressed raw HTML of every scraped article page, keyed by the SHA-256 of its URL; kept with the other
+# caches outside "1_raw", whose new objects start the next stage
+S3_RAW_HTML_CACHE_PREFIX = "cache/html/"
+# Output folder of re-extraction runs (kept out of "1_raw" so they don't enter the pipeline on their own)
+S3_REEXTRACTED_PREFIX = "1_raw_reextracted/"
+CACHE_RAW_HTML = os.environ.get('CACHE_RAW_HTML', 'true').lower() == 'true'
+# Cached pages re-extracted (and held in memory) at a time; each chunk is written as its own CSV
+REEXTRACT_CHUNK_SIZE = int(os.environ.get('REEXTRACT_CHUNK_SIZE', 500))
 
 # Headers to mimic a browser request (helps with some websites)
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# Concurrency limits for outgoing HTTP requests: a global cap (size of the worker pool)
+# and a per-host cap so a single outlet is never hit with more than a few parallel requests
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 16))
+MAX_REQUESTS_PER_HOST = int(os.environ.get('MAX_REQUESTS_PER_HOST', 4))
+
+# Total number of new articles to scrape per invocation (across all feeds)
+MAX_ARTICLES = int(os.environ.get('MAX_ARTICLES', 10))
+
+# Fair scheduling across sources: each source gets an equal share of MAX_ARTICLES (unless SOURCE_QUOTA is set),
+# and a feed that hasn't been downloaded within SOURCE_TIME_BUDGET seconds is skipped for this run
+SOURCE_QUOTA = int(os.environ['SOURCE_QUOTA']) if os.environ.get('SOURCE_QUOTA') else None
+SOURCE_TIME_BUDGET = float(os.environ.get('SOURCE_TIME_BUDGET', 20))
+# Deadline of a whole scrape, in seconds: no new article page is fetched after it. In the Lambda it is also kept
+# SCRAPE_TIME_MARGIN seconds short of the invocation timeout, leaving time to save the ledger and upload the articles
+SCRAPE_TIME_BUDGET = float(os.environ.get('SCRAPE_TIME_BUDGET', 240))
+SCRAPE_TIME_MARGIN = float(os.environ.get('SCRAPE_TIME_MARGIN', 30))
+
+# One semaphore per host, created on first use
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+# Shared HTTP session: keep-alive connection pools per host and retries with backoff.
+# Created at import so warm invocations reuse open connections.
+session = http_session.create_session(HEADERS, pool_connections=len(RSS_FEEDS) * 2, pool_maxsize=MAX_REQUESTS_PER_HOST)
+
 # S3 client initialization
 s3_client = boto3.client('s3')
 
 def load_scraped_urls():
     """
     Load previously scraped URLs from S3 to avoid re-scraping the same articles.
-    Returns a set of URLs. The file is located in the '1_raw' subfolder.
+    Returns an index supporting `url in scraped_urls`; only recent URLs and a bloom filter
+    over the older history are downloaded. The ledger is located in the '1_raw' subfolder.
+    """
+    return scraped_url_ledger.load_scraped_urls(s3_client, S3_BUCKET_NAME)
+
+def save_scraped_urls(urls):
+    """
+    Record all URLs scraped in this invocation with a single write to the ledger,
+    and compact the ledger once enough segments have accumulated.
+    """
+    segment_key = scraped_url_ledger.save_scraped_urls(s3_client, S3_BUCKET_NAME, urls)
+    if segment_key:
+        print(f"Saved {len(urls)} scraped URLs to {segment_key}.")
+
+    merged = scraped_url_ledger.compact_scraped_urls(
+        s3_client, S3_BUCKET_NAME,
+        threshold=int(os.environ.get('LEDGER_COMPACTION_THRESHOLD', scraped_url_ledger.COMPACTION_THRESHOLD)),
+        false_positive_rate=float(os.environ.get('BLOOM_FALSE_POSITIVE_RATE', scraped_url_ledger.BLOOM_FALSE_POSITIVE_RATE))
+    )
+    if merged:
+        print(f"Compacted {merged} ledger segments into {scraped_url_ledger.RECENT_KEY}.")
+
+def get_host_semaphore(url):
+    """
+    Return the semaphore limiting concurrent requests to the host of the given URL.
+    """
+    host = urllib.parse.urlparse(url).netloc
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+        return _host_semaphores[host]
+
+def load_feed_validators():
+    """
+    Load the stored HTTP validators of the RSS feeds from S3.
+    Returns a dict mapping each feed URL to its {'etag', 'last_modified'} validator.
     """
     try:
-        # Get the object from S3 with the "1_raw" subfolder path
-        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=f"1_raw/{S3_SCRAPED_URLS_FILE}")
-        scraped_urls = response['Body'].read().decode('utf-8').splitlines()
-        return set(scraped_urls)
+        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=S3_FEED_VALIDATORS_KEY)
+        return json.loads(response['Body'].read().decode('utf-8'))
     except s3_client.exceptions.NoSuchKey:
-        return set()  # If the file doesn't exist, return an empty set
+        return {}  # If the file doesn't exist, every feed is fetched unconditionally
 
-def save_scraped_url(url):
+def save_feed_validators(validators):
     """
-    Append a newly scraped URL to the S3 file to avoid duplicate scraping in the future.
-    The file is located in the '1_raw' subfolder.
+    Store the HTTP validators of the RSS feeds in S3 for the next invocation.
     """
-    # Load existing scraped URLs from S3
-    scraped_urls = load_scraped_urls()
-    # Add the new URL
-    scraped_urls.add(url)
+    s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=S3_FEED_VALIDATORS_KEY, Body=json.dumps(validators, indent=2))
 
-    # Convert back to string and upload to S3 (in the "1_raw" subfolder)
-    scraped_urls_data = "\n".join(scraped_urls)
-    s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=f"1_raw/{S3_SCRAPED_URLS_FILE}", Body=scraped_urls_data)
-
-def fetch_content(url):
+def fetch_response(url, validator=None):
     """
-    Fetch the HTML content from a given URL using requests.
-    Returns the content if successful, otherwise returns None and prints an error.
+    Fetch a URL using the shared session.
+    Returns the response if successful (after retries), otherwise returns None and prints an error.
+    At most MAX_REQUESTS_PER_HOST requests run against the same host at a time.
+    If a validator dict is given, the request is conditional: None is returned when the server
+    answers 304 Not Modified, and otherwise the validator is updated from the response headers.
     """
+    headers = {}
+    if validator:
+        if validator.get('etag'):
+            headers['If-None-Match'] = validator['etag']
+        if validator.get('last_modified'):
+            headers['If-Modified-Since'] = validator['last_modified']
+
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        with get_host_semaphore(url):
+            response = session.get(url, headers=headers, timeout=10)
+        if response.status_code == 304:
+            print(f"Not modified since last run: {url}")
+            return None
         response.raise_for_status()  # Check for HTTP errors
-        return response.content  # Return HTML content
+        if validator is not None:
+            validator.clear()
+            if response.headers.get('ETag'):
+                validator['etag'] = response.headers['ETag']
+            if response.headers.get('Last-Modified'):
+                validator['last_modified'] = response.headers['Last-Modified']
+        return response
     except requests.exceptions.RequestException as e:
         print(f"Error fetching URL: {e}")
         return None  # Return None if there's an error
 
-def parse_paragraphs(soup, parent_tag, child_tag='p', child_class=None, child_id=None, data_component=None):
+def fetch_content(url, validator=None):
     """
-    Extract paragraphs from all matching parent HTML tags (e.g., 'div', 'article').
-    This function collects all <p> tags within each matching parent and returns them as a single string.
-    Only immediate child <p> tags are included (ignoring nested <p> tags).
-    Optionally, it can filter by class, id, or data-component attribute.
+    Fetch the content of a URL (see fetch_response) as bytes, or None.
     """
-    # Find all parent tags based on the filters provided
-    if child_id:
-        parents = soup.find_all(parent_tag, id=child_id)
-    elif child_class:
-        parents = soup.find_all(parent_tag, class_=child_class)
-    elif data_component:
-        parents = soup.find_all(parent_tag, attrs={'data-component': data_component})
-    else:
-        parents = soup.find_all(parent_tag)
-
-    if not parents:
-        return ""  # Return an empty string if no parent tags are found
+    response = fetch_response(url, validator)
+    return response.content if response is not None else None
 
-    # Collect paragraphs from all matching parent tags
-    all_paragraphs = []
-    for parent in parents:
-        # Find all child <p> tags that are immediate children of the parent tag
-        paragraphs = parent.find_all(child_tag, recursive=False)
-        # Add the text content of the paragraphs to the list
-        all_paragraphs.extend(p.get_text(" ", strip=True) for p in paragraphs)
-
-    # Join the text content of all paragraphs and return as a single string
-    return " ".join(all_paragraphs)
-
-# Individual content parsers for each website (based on domain)
-
-def parse_guardian(url):
+def header_charset(response):
     """
-    Extract content from The Guardian article page.
+    Return the charset of the Content-Type header of a response, or None if it declares none.
     """
-    content = fetch_content(url)
-    if not content: return ""
-    soup = BeautifulSoup(content, 'html.parser')
-    # Find the main content div by id
-    main_content = soup.find('div', id='maincontent')
-    if not main_content:
-        return ""
-    return parse_paragraphs(main_content, 'div', 'p')
+    message = email.message.Message()
+    message['Content-Type'] = response.headers.get('Content-Type', '')
+    return message.get_content_charset()
 
-def parse_bbc(url):
+def fetch_page(url):
     """
-    Extract content from BBC News article page.
+    Fetch an article page. Returns its raw HTML and the charset of its Content-Type header
+    (None if there is none), or (None, None) if it couldn't be fetched.
     """
-    content = fetch_content(url)
-    if not content: return ""
-    
-    soup = BeautifulSoup(content, 'html.parser')
-    main_content = soup.find('article')
-    if not main_content:
-        return ""
-    return parse_paragraphs(soup, 'div', data_component='text-block')
+    response = fetch_response(url)
+    if response is None:
+        return None, None
+    return response.content, header_charset(response)
 
-def parse_grist(url):
+def run_concurrently(func, items):
     """
-    Extract content from Grist article page.
+    Apply func to every item using a bounded thread pool (MAX_CONCURRENT_REQUESTS workers).
+    Returns the results in the same order as the items.
     """
-    content = fetch_content(url)
-    if not content: return ""
-    
-    soup = BeautifulSoup(content, 'html.parser')
-    return parse_paragraphs(soup, 'div', child_class='article-body')
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(items))) as executor:
+        return list(executor.map(func, items))
 
-def parse_earth911(url):
+def run_until(func, items, deadline):
     """
-    Extract content from Earth911 article page.
+    Like run_concurrently, but only until the deadline (a time.monotonic() value): items not started by
+    then are cancelled, and items still running are left to finish in the background without waiting.
+    Returns a list with a (finished, result) pair per item, in the same order as the items.
     """
-    content = fetch_content(url)
-    if not content: return ""
-    
-    soup = BeautifulSoup(content, 'html.parser')
-    return parse_paragraphs(soup, 'article')
+    items = list(items)
+    if not items:
+        return []
+    executor = ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(items)))
+    futures = [executor.submit(func, item) for item in items]
+    wait(futures, timeout=max(deadline - time.monotonic(), 0))
+    executor.shutdown(wait=False, cancel_futures=True)
+    return [(True, future.result()) if future.done() and not future.cancelled() else (False, None) for future in futures]
 
-def parse_columbia_climate(url):
+# Extraction rules per domain, as CSS selectors evaluated on the lxml HTML tree:
+#   'scope'   - optional; only the first element matching it is searched, nothing is extracted without one
+#   'require' - optional; nothing is extracted unless the page contains a matching element
+#   'select'  - the elements whose text makes up the article, in document order
+# Adding a source only needs a new entry here (and its feed in RSS_FEEDS).
+EXTRACTION_RULES = {
+    'www.bbc.com': {'require': 'article', 'select': 'div[data-component="text-block"] > p'},
+    'grist.org': {'select': 'div.article-body > p'},
+    'earth911.com': {'select': 'article > p'},
+    'news.climate.columbia.edu': {'scope': 'main', 'select': 'div.entry-content > p'},
+    'www.independent.co.uk': {'select': 'div#main > p'},
+    'www.greenpeace.org': {'scope': 'div#content', 'select': 'article > p'},
+    'www.theguardian.com': {'scope': 'div#maincontent', 'select': 'div > p'},
+    'e360.yale.edu': {'select': 'section.article__body > div'}
+}
+
+def compile_extraction_rule(rule):
     """
-    Extract content from Columbia Climate School article page.
+    Compile the CSS selectors of an extraction rule into XPath expressions.
+    Selectors are matched against descendants of the document (or of the scope element).
     """
-    content = fetch_content(url)
-    if not content: return ""
-    soup = BeautifulSoup(content, 'html.parser')
-    main_content = soup.find('main')
-    if not main_content:
-        return ""
-    
-    return parse_paragraphs(main_content, 'div', 'p', child_class='entry-content')
+    translator = HTMLTranslator()
+    return {
+        key: etree.XPath(translator.css_to_xpath(rule[key], prefix='descendant::'))
+        for key in ('scope', 'require', 'select') if key in rule
+    }
+
+# Compiled once at import so every invocation of a warm container reuses them
+COMPILED_EXTRACTION_RULES = {domain: compile_extraction_rule(rule) for domain, rule in EXTRACTION_RULES.items()}
 
-def parse_independent(url):
+def element_text(element):
     """
-    Extract content from The Independent article page.
+    Return the text of an element with every text fragment stripped and joined by single spaces.
     """
-    content = fetch_content(url)
-    if not content: return ""
-    
-    soup = BeautifulSoup(content, 'html.parser')
-    return parse_paragraphs(soup, 'div', child_id='main')
+    return " ".join(text.strip() for text in element.itertext() if text.strip())
+
+# A charset declared by the page itself (<meta charset> or <meta http-equiv="Content-Type">)
+DECLARED_CHARSET = re.compile(rb'<meta[^>]+charset', re.IGNORECASE)
 
-def parse_yale_environment(url):
+def html_parser(html, charset=None):
     """
-    Extract content from Yale Environment 360 article page.
+    Return an lxml HTML parser decoding the raw HTML of a page with the charset of its Content-Type header.
+    Without one libxml2 uses the charset the page declares, and falls back to Latin-1 if it declares none;
+    such pages are decoded as UTF-8 instead, like BeautifulSoup's detection did.
     """
-    content = fetch_content(url)
-    if not content: return ""
-    
-    soup = BeautifulSoup(content, 'html.parser')
-    return parse_paragraphs(soup, 'section', 'div', child_class='article__body')
+    if charset is None and isinstance(html, bytes) and not DECLARED_CHARSET.search(html[:4096]):
+        charset = 'utf-8'
+    try:
+        return lxml.html.HTMLParser(encoding=charset)
+    except LookupError:
+        return lxml.html.HTMLParser(encoding='utf-8')  # A charset Python doesn't know
 
-def parse_greenpeace(url):
+def extract_content(compiled_rule, html, charset=None):
     """
-    Extract content from Greenpeace article page.
+    Extract the article text from the raw HTML of a page with a compiled extraction rule.
+    charset is the one of the page's Content-Type header, if any.
+    Returns the text of all selected elements joined into a single string, or an empty string.
     """
-    content = fetch_content(url)
-    if not content: return ""
-    soup = BeautifulSoup(content, 'html.parser')
-    main_content = soup.find('div', id='content')
-    if not main_content:
+    if not html:
+        return ""
+    try:
+        root = lxml.html.document_fromstring(html, parser=html_parser(html, charset))
+    except (etree.ParserError, ValueError):
         return ""
-    return parse_paragraphs(main_content, 'article', 'p')
+
+    if 'require' in compiled_rule and not compiled_rule['require'](root):
+        return ""
+    if 'scope' in compiled_rule:
+        scopes = compiled_rule['scope'](root)
+        if not scopes:
+            return ""
+        root = scopes[0]
+
+    return " ".join(element_text(element) for element in compiled_rule['select'](root))
+
+def parse_article(compiled_rule, url):
+    """
+    Fetch an article page and extract its content with the compiled extraction rule of its domain.
+    """
+    return extract_content(compiled_rule, *fetch_page(url))
 
 # Mapping domains to specific parsers
 def get_content_parser(domain):
     """
     Return the appropriate parser function for the given domain.
+    The parser takes the article URL and returns its text, or None if the domain has no extraction rule.
     """
-    parsers = {
-        'www.bbc.com': parse_bbc,
-        'grist.org': parse_grist,
-        'earth911.com': parse_earth911,
-        'news.climate.columbia.edu': parse_columbia_climate,
-        'www.independent.co.uk': parse_independent,
-        'www.greenpeace.org': parse_greenpeace,
-        'www.theguardian.com': parse_guardian,
-        'e360.yale.edu': parse_yale_environment
-    }
-    return parsers.get(domain, None)
+    compiled_rule = COMPILED_EXTRACTION_RULES.get(domain)
+    if compiled_rule is None:
+        return None
+    return functools.partial(parse_article, compiled_rule)
 
 def convert_to_berlin_time(published_str):
     """
@@ -251,108 +349,383 @@ def convert_to_berlin_time(published_str):
         except:
             return published_str  # If formatting fails, return the original string
 
-# Parsing the RSS feed and extracting articles
-def parse_feed(feed_name, feed_url, scraped_urls, max_articles=10):
+# Lightweight record for one <item> of an RSS feed
+FeedItem = namedtuple('FeedItem', ['link', 'title', 'published'])
+
+def iter_feed_items(feed_content):
     """
-    Parse an RSS feed and extract articles, limiting the result to a maximum number of articles per invocation.
+    Stream the <item> elements of an RSS feed without building the whole document tree.
+    Yields a FeedItem per item; every element is discarded once read, and parsing stops
+    as soon as the caller stops iterating.
     """
-    articles = []
-    response = fetch_content(feed_url)
-    if not response:
-        return articles
+    for _, element in etree.iterparse(io.BytesIO(feed_content), events=('end',), tag='{*}item', recover=True):
+        link = (element.findtext('{*}link') or '').strip()
+        title = (element.findtext('{*}title') or '').strip()
+        published = (element.findtext('{*}pubDate') or '').strip()
 
-    soup = BeautifulSoup(response, 'xml')
-    count = 0  # Counter to ensure only max_articles are processed
+        # Free the item and everything parsed before it
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
 
-    for item in soup.find_all('item'):
-        if count >= max_articles:
-            break
+        if link:
+            yield FeedItem(link, title, published)
+
+# Selecting new articles from an RSS feed
+def select_new_items(feed_name, feed_content, scraped_urls, max_articles=10):
+    """
+    Extract up to max_articles items that have not been scraped yet from the RSS feed content.
+    Returns a list of article dicts without the 'Content' field; no article pages are fetched here.
+    The feed is read incrementally and the rest of it is left unparsed once enough new items are found.
+    """
+    items = []
+    if not feed_content or max_articles <= 0:
+        return items
 
-        link = item.find('link').text.strip()
-        if link in scraped_urls:
+    for feed_item in iter_feed_items(feed_content):
+        if feed_item.link in scraped_urls:
             continue  # Skip already scraped articles
 
-        title = item.find('title').text.strip() if item.find('title') else ''
-        published = item.find('pubDate').text.strip() if item.find('pubDate') else ''
-        published = convert_to_berlin_time(published)
+        published = convert_to_berlin_time(feed_item.published)
+        items.append({'Source': feed_name, 'Published': published, 'Title': feed_item.title, 'Link': feed_item.link})
 
-        domain = urllib.parse.urlparse(link).netloc
-        parser = get_content_parser(domain)
-        content = parser(link) if parser else "Content parsing not supported."
+        if len(items) >= max_articles:
+            break
 
-        articles.append({'Source': feed_name, 'Published': published, 'Title': title, 'Link': link, 'Content': content})
-        save_scraped_url(link)  # Save the URL after parsing
-        count += 1  # Increment the counter to limit the number of articles
+    return items
 
-    return articles
+def raw_html_cache_key(url):
+    """
+    Return the S3 key under which the raw HTML of an article page is cached.
+    """
+    return f"{S3_RAW_HTML_CACHE_PREFIX}{hashlib.sha256(url.encode('utf-8')).hexdigest()}.html.gz"
 
-def upload_to_s3(CSV_FILE):
+def encode_cached_page(item, html, charset=None):
     """
-    Upload the CSV file to the specified S3 bucket within the "1_raw" subfolder.
+    Pack the feed metadata and the charset of the page's Content-Type header (as a JSON first line) and
+    the raw HTML of a page into one gzip blob, so cached pages can be re-extracted from S3 or from a local
+    copy alike.
+    """
+    metadata = {key: item[key] for key in ('Source', 'Published', 'Title', 'Link')}
+    if charset:
+        metadata['Charset'] = charset
+    return gzip.compress(json.dumps(metadata).encode('utf-8') + b"\n" + html)
+
+def decode_cached_page(data):
+    """
+    Unpack a cached page into its metadata dict (with 'Charset' if the page had one) and raw HTML bytes.
+    """
+    metadata, html = gzip.decompress(data).split(b"\n", 1)
+    return json.loads(metadata), html
+
+def save_raw_html(item, html, charset=None):
+    """
+    Store the raw HTML of an article page in the S3 cache. Errors are reported but never fail the scrape.
     """
-    if CSV_FILE is None:
-        raise ValueError("CSV_FILE is None, cannot upload to S3")
-    
-    # Modify the filename to include "1_raw" subfolder and timestamp
-    file_name = os.path.basename(CSV_FILE)  # Extract the filename from the full path
-    s3_key = f"1_raw/{file_name}"  # Upload to the "1_raw" subfolder in the bucket
-    
     try:
-        s3_client.upload_file(CSV_FILE, S3_BUCKET_NAME, s3_key)
-        print(f"Uploaded {file_name} to S3 bucket {S3_BUCKET_NAME} in folder '1_raw'.")
+        s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=raw_html_cache_key(item['Link']), Body=encode_cached_page(item, html, charset))
     except Exception as e:
-        print(f"Error uploading {file_name} to S3: {e}")
+        print(f"Error caching raw HTML of {item['Link']}: {e}")
+
+def extract_item_content(item, html, charset=None):
+    """
+    Extract the content of a feed item's article page with the extraction rule of its domain.
+    """
+    domain = urllib.parse.urlparse(item['Link']).netloc
+    compiled_rule = COMPILED_EXTRACTION_RULES.get(domain)
+    if compiled_rule is None:
+        return "Content parsing not supported."
+    return extract_content(compiled_rule, html, charset)
+
+def scrape_article(item):
+    """
+    Fetch and parse the article page of a single feed item with the extraction rule matching its domain.
+    The raw page is cached in S3 so it can be re-extracted later without fetching it again.
+    Returns the item completed with the 'Content' field.
+    """
+    if urllib.parse.urlparse(item['Link']).netloc not in COMPILED_EXTRACTION_RULES:
+        return {**item, 'Content': "Content parsing not supported."}
+
+    html, charset = fetch_page(item['Link'])
+    if html and CACHE_RAW_HTML:
+        save_raw_html(item, html, charset)
+    return {**item, 'Content': extract_item_content(item, html, charset)}
+
+def scrape_articles(items, deadline=None):
+    """
+    Fetch and parse the article pages of the given feed items concurrently.
+    With a deadline (a time.monotonic() value) the articles not scraped by then are dropped; they stay
+    out of the ledger, so the next run picks them up again.
+    The scraped URLs are not saved here; the caller records them in one batch with save_scraped_urls.
+    """
+    if deadline is None:
+        return run_concurrently(scrape_article, items)
+
+    articles = []
+    for item, (finished, article) in zip(items, run_until(scrape_article, items, deadline)):
+        if finished:
+            articles.append(article)
+        else:
+            print(f"Skipping {item['Link']}: not scraped before the deadline.")
+    return articles
+
+# Parsing the RSS feed and extracting articles
+def parse_feed(feed_name, feed_url, scraped_urls, max_articles=10):
+    """
+    Parse an RSS feed and extract articles, limiting the result to a maximum number of articles per invocation.
+    """
+    feed_content = fetch_content(feed_url)
+    items = select_new_items(feed_name, feed_content, scraped_urls, max_articles=max_articles)
+    return scrape_articles(items)
 
-def main():
+def upload_to_s3(df):
+    """
+    Upload the articles to the specified S3 bucket within the "1_raw" subfolder, in the stage
+    interchange format (Parquet unless STAGE_FORMAT=csv). The file is written straight from memory.
+    """
+    try:
+        s3_key = stage_format.write_stage_frame(s3_client, S3_BUCKET_NAME, df, '1_raw')
+        print(f"Uploaded {os.path.basename(s3_key)} to S3 bucket {S3_BUCKET_NAME} in folder '1_raw'.")
+    except Exception as e:
+        print(f"Error uploading the articles to S3: {e}")
+
+def fetch_feeds(feeds, feed_validators, time_budget, deadline=None):
+    """
+    Download the RSS feeds concurrently with conditional requests.
+    Returns a list with the content of each feed, or None if it is unchanged (304), failed,
+    or wasn't downloaded within time_budget seconds (or by the deadline of the scrape, if that comes
+    first), so one slow feed never holds up the others.
+    """
+    feeds_deadline = time.monotonic() + time_budget
+    if deadline is not None:
+        feeds_deadline = min(feeds_deadline, deadline)
+    results = run_until(lambda feed: fetch_content(feed['url'], feed_validators[feed['url']]), feeds, feeds_deadline)
+
+    feed_contents = []
+    for feed, (finished, feed_content) in zip(feeds, results):
+        if not finished:
+            print(f"Skipping {feed['name']}: feed not downloaded within {time_budget:.0f}s.")
+        feed_contents.append(feed_content)
+    return feed_contents
+
+def schedule_round_robin(candidates_by_source, max_articles, quota, start=0):
+    """
+    Choose up to max_articles items from the per-source candidate lists.
+    Sources take turns (starting with the source at index `start`), first until every source has
+    its quota, then the leftover budget is filled in turns from the sources that still have items.
+    Returns the chosen items and the number of items taken from each source.
+    """
+    order = list(range(start, len(candidates_by_source))) + list(range(start))
+    taken = [0] * len(candidates_by_source)
+    scheduled = []
+    seen_links = set()
+
+    for cap in (quota, math.inf):
+        progress = True
+        while progress and len(scheduled) < max_articles:
+            progress = False
+            for index in order:
+                candidates = candidates_by_source[index]
+                if len(scheduled) >= max_articles or taken[index] >= min(cap, len(candidates)):
+                    continue
+                item = candidates[taken[index]]
+                taken[index] += 1
+                progress = True
+                if item['Link'] not in seen_links:  # The same story can appear in two feeds
+                    seen_links.add(item['Link'])
+                    scheduled.append(item)
+    return scheduled, taken
+
+def main(time_budget=SCRAPE_TIME_BUDGET):
+    # Feeds and article pages are only fetched until the deadline; the rest of the run is S3 writes
+    deadline = time.monotonic() + time_budget
     scraped_urls = load_scraped_urls()  # Load already scraped URLs
-    all_articles = []
-    max_articles = 10  # Define the total limit for articles across all feeds
-    total_count = 0  # Track the total number of articles gathered
-
-    # Loop through each RSS feed and scrape new articles, but stop once max_articles is reached
-    for feed in RSS_FEEDS:
-        if total_count >= max_articles:
-            break  # Stop if we've reached the max limit
-        
+    max_articles = MAX_ARTICLES  # Define the total limit for articles across all feeds
+    quota = SOURCE_QUOTA or math.ceil(max_articles / len(RSS_FEEDS))
+
+    # Download all RSS feeds concurrently; feeds unchanged since the last run answer 304 and come back as None
+    stored_validators = load_feed_validators()
+    feed_validators = {feed['url']: dict(stored_validators.get(feed['url'], {})) for feed in RSS_FEEDS}
+    feed_contents = fetch_feeds(RSS_FEEDS, feed_validators, SOURCE_TIME_BUDGET, deadline=deadline)
+
+    # Collect the new items of every feed, then share the article budget between the sources
+    candidates_by_source = []
+    for feed, feed_content in zip(RSS_FEEDS, feed_contents):
         print(f"Processing feed from {feed['name']}...")
+        candidates_by_source.append(select_new_items(feed['name'], feed_content, scraped_urls, max_articles=max_articles))
 
-        # Calculate how many more articles we can scrape
-        remaining_articles = max_articles - total_count
-        articles = parse_feed(feed['name'], feed['url'], scraped_urls, max_articles=remaining_articles)
+    # Rotate the source that goes first every hour so no feed is consistently favoured
+    start = datetime.now().hour % len(RSS_FEEDS)
+    selected_items, taken = schedule_round_robin(candidates_by_source, max_articles, quota, start=start)
 
-        # Add the scraped articles to the global list
-        all_articles.extend(articles)
-        total_count += len(articles)  # Update the total count
+    for feed, candidates, count in zip(RSS_FEEDS, candidates_by_source, taken):
+        if candidates:
+            print(f"{feed['name']}: scheduled {count} of {len(candidates)} new articles.")
 
-    # Generate a timestamped filename for the CSV in the format "1_raw_*timestamp*.csv"
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    CSV_FILE = f"/tmp/1_raw_{timestamp}.csv"  # Use /tmp directory
+    # Fetch and parse all selected article pages concurrently
+    all_articles = scrape_articles(selected_items, deadline=deadline)
+    scraped_links = {article['Link'] for article in all_articles}
+
+    # Only remember the new validator once every new item of the feed has been taken and scraped;
+    # otherwise the next run would get a 304 and never see the items left behind
+    updated_validators = dict(stored_validators)
+    for feed, feed_content, candidates, count in zip(RSS_FEEDS, feed_contents, candidates_by_source, taken):
+        if feed_content and count == len(candidates) < max_articles and all(item['Link'] in scraped_links for item in candidates):
+            updated_validators[feed['url']] = feed_validators[feed['url']]
 
-    # If new articles are found, save them to a CSV file
+    if updated_validators != stored_validators:
+        save_feed_validators(updated_validators)
+
+    print(f"Scraped URL index lookups: {scraped_urls.stats}")
+
+    # Save the URLs after parsing, in one write for the whole run
+    save_scraped_urls([article['Link'] for article in all_articles])
+
+    # If new articles are found, hand them to the next stage as "1_raw/1_raw_*timestamp*.parquet"
     if all_articles:
         df = pd.DataFrame(all_articles)
-        df.to_csv(CSV_FILE, index=False, encoding='utf-8')
-        print(f"Saved {len(all_articles)} new articles to {CSV_FILE}.")
+        print(f"Saving {len(all_articles)} new articles.")
+        upload_to_s3(df)
+    else:
+        print("No new articles to save.")
 
-        # Upload the CSV file to the S3 subfolder "1_raw"
-        upload_to_s3(CSV_FILE)
+def iter_cached_page_keys(urls=None):
+    """
+    Yield the S3 keys of the cached pages of the given URLs, or of every cached page, one listing page at a time.
+    """
+    if urls:
+        yield from (raw_html_cache_key(url) for url in urls)
+        return
 
-        # Delete the file from /tmp after uploading
-        try:
-            os.remove(CSV_FILE)
-            print(f"Deleted temporary file {CSV_FILE} from /tmp.")
-        except Exception as e:
-            print(f"Error deleting file {CSV_FILE}: {e}")
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=S3_RAW_HTML_CACHE_PREFIX):
+        yield from (obj['Key'] for obj in page.get('Contents', []))
+
+def iter_local_cached_page_paths(cache_dir, urls=None):
+    """
+    Yield the paths of the cached pages in a local copy of the cache folder.
+    """
+    if urls:
+        paths = (os.path.join(cache_dir, os.path.basename(raw_html_cache_key(url))) for url in urls)
+        yield from (path for path in paths if os.path.exists(path))
+        return
+
+    with os.scandir(cache_dir) as entries:
+        yield from (entry.path for entry in entries if entry.name.endswith('.html.gz'))
+
+def reextract_page(data):
+    """
+    Run the current extraction rules over one cached page and return its article row.
+    """
+    item, html = decode_cached_page(data)
+    charset = item.pop('Charset', None)
+    return {**item, 'Content': extract_item_content(item, html, charset)}
+
+def read_cached_page(key):
+    """
+    Download one cached page from S3, or return None if it isn't cached.
+    """
+    try:
+        return s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=key)['Body'].read()
+    except s3_client.exceptions.NoSuchKey:
+        print(f"No cached page at {key}")
+        return None
+
+def read_local_cached_page(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def reextract_cached_pages(urls=None, cache_dir=None, chunk_size=REEXTRACT_CHUNK_SIZE):
+    """
+    Re-run the current extraction rules over cached raw pages, without any HTTP traffic to the news sites.
+    Pages are read from the S3 cache, or from cache_dir if given (e.g. a local `aws s3 sync` of the cache folder).
+    Yields DataFrames of at most chunk_size rows, in the same columns as a scrape, so only one chunk of
+    pages is held in memory at a time however large the cache is.
+    """
+    if cache_dir:
+        read_page, sources = read_local_cached_page, iter_local_cached_page_paths(cache_dir, urls)
     else:
-        print("No new articles to save.")
+        read_page, sources = read_cached_page, iter_cached_page_keys(urls)
+
+    while True:
+        chunk = list(itertools.islice(sources, chunk_size))
+        if not chunk:
+            return
+        pages = [page for page in run_concurrently(read_page, chunk) if page]
+        print(f"Re-extracting {len(pages)} cached pages...")
+        yield pd.DataFrame([reextract_page(page) for page in pages], columns=['Source', 'Published', 'Title', 'Link', 'Content'])
+
+def run_reextraction(urls=None, cache_dir=None):
+    """
+    Re-extract cached pages and upload the result to the re-extraction folder in S3, as one CSV per chunk.
+    Returns the S3 keys of the CSVs (empty if no cached pages were found).
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    s3_keys = []
+    for df in reextract_cached_pages(urls, cache_dir=cache_dir):
+        if df.empty:
+            continue
+        s3_key = f"{S3_REEXTRACTED_PREFIX}1_raw_reextracted_{timestamp}_{len(s3_keys):04d}.csv"
+        s3_storage.write_bytes(s3_client, S3_BUCKET_NAME, s3_key, df.to_csv(index=False, encoding='utf-8'), content_type='text/csv')
+        print(f"Uploaded {len(df)} re-extracted articles to {s3_key}.")
+        s3_keys.append(s3_key)
+
+    if not s3_keys:
+        print("No cached pages to re-extract.")
+    return s3_keys
+
+def save_reextraction(output, urls=None, cache_dir=None):
+    """
+    Re-extract cached pages into a local CSV, appending chunk by chunk.
+    """
+    rows = 0
+    with open(output, 'w', encoding='utf-8', newline='') as f:
+        for df in reextract_cached_pages(urls, cache_dir=cache_dir):
+            if not df.empty:
+                df.to_csv(f, index=False, header=rows == 0)
+                rows += len(df)
+    print(f"Saved {rows} re-extracted articles to {output}.")
 
 def lambda_handler(event, context):
     logger.info("Lambda function started")
+
+    # Stage files are no longer written to /tmp; clear any left there by earlier runs of this container
+    removed = s3_storage.remove_stale_tmp_files()
+    if removed:
+        logger.info(f"Removed {removed} stale files from /tmp")
     
     try:
-        main()  # Call the main processing function
+        # {"mode": "reextract", "urls": [...]} re-runs the extraction rules over cached pages (all of them without "urls")
+        if (event or {}).get('mode') == 'reextract':
+            s3_keys = run_reextraction(event.get('urls'))
+            logger.info("Re-extraction completed successfully")
+            return {"statusCode": 200, "body": f"Success: {', '.join(s3_keys) or None}"}
+
+        time_budget = SCRAPE_TIME_BUDGET
+        if context is not None:
+            time_budget = min(time_budget, context.get_remaining_time_in_millis() / 1000 - SCRAPE_TIME_MARGIN)
+        main(time_budget)  # Call the main processing function
         logger.info("Lambda function completed successfully")
         return {"statusCode": 200, "body": "Success"}
     except Exception as e:
         logger.error(f"Error occurred: {e}", exc_info=True)
-        return {"statusCode": 500, "body": f"Error: {str(e)}"}
\ No newline at end of file
+        return {"statusCode": 500, "body": f"Error: {str(e)}"}
+
+if __name__ == '__main__':
+    # Local runs: python lambda_function.py scrape
+    #             python lambda_function.py reextract [--cache-dir DIR] [--urls URL ...] [--output FILE]
+    arg_parser = argparse.ArgumentParser(description="Run the scraper locally or re-extract article content from cached raw pages.")
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('scrape', help="run one scrape, as the Lambda does")
+    reextract_parser = subparsers.add_parser('reextract', help="re-extract article content from cached raw pages")
+    reextract_parser.add_argument('--cache-dir', help="local copy of the cache folder (default: read from S3)")
+    reextract_parser.add_argument('--urls', nargs='*', help="only re-extract these article URLs")
+    reextract_parser.add_argument('--output', help="write the CSV locally instead of uploading it to S3")
+    args = arg_parser.parse_args()
+
+    if args.command == 'scrape':
+        main()
+    elif args.output:
+        save_reextraction(args.output, args.urls, cache_dir=args.cache_dir)
+    else:
+        run_reextraction(args.urls, cache_dir=args.cache_dir)
@@ -0,0 +1,343 @@
+import hashlib
+import math
+import struct
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Ledger written before the archive existed (one URL per line); merged into the archive on the next compaction
+LEDGER_KEY = "1_raw/scraped_urls.txt"
+# Every run appends its new URLs as a separate, immutable segment under this prefix
+SEGMENTS_PREFIX = "1_raw/scraped_urls/segments/"
+# URLs of the recent window merged from the segments, one "<segment timestamp>\t<url>" per line
+RECENT_KEY = "1_raw/scraped_urls/recent.txt"
+# Compacted history, split into shards by URL hash so a single URL can be checked exactly without loading everything
+ARCHIVE_PREFIX = "1_raw/scraped_urls/archive/"
+ARCHIVE_SHARDS = 256
+# Bloom filter over every URL in the archive, stored next to it
+BLOOM_KEY = "1_raw/scraped_urls/archive.bloom"
+BLOOM_FALSE_POSITIVE_RATE = 0.001
+# Number of segments after which they are merged into the recent file, so loading never reads more than this many
+COMPACTION_THRESHOLD = 24
+# URLs younger than this stay exact and are always loaded; RSS feeds rarely list older items
+RECENT_WINDOW_DAYS = 14
+# Held while compacting so overlapping runs don't rewrite the same files; taken over once older than the timeout
+LOCK_KEY = "1_raw/scraped_urls/compaction.lock"
+LOCK_TIMEOUT_MINUTES = 15
+# Parallel S3 requests when reading or writing several ledger files
+IO_WORKERS = 16
+
+_BLOOM_HEADER = struct.Struct('>4sBQQIQ')  # magic, version, capacity, num_bits, num_hashes, count
+_BLOOM_MAGIC = b'SOEB'
+
+class BloomFilter:
+    """
+    Compact membership filter with a configurable false-positive rate.
+    A negative answer is always correct; a positive answer has to be confirmed against the exact ledger.
+    """
+
+    def __init__(self, capacity, false_positive_rate=BLOOM_FALSE_POSITIVE_RATE, num_bits=None, num_hashes=None, bits=None, count=0):
+        self.capacity = max(int(capacity), 1)
+        if num_bits is None:
+            num_bits = math.ceil(-self.capacity * math.log(false_positive_rate) / (math.log(2) ** 2))
+        if num_hashes is None:
+            num_hashes = max(1, round(num_bits / self.capacity * math.log(2)))
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, url):
+        # Double hashing: derive all bit positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, url):
+        for position in self._positions(url):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, url):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(url))
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def to_bytes(self):
+        header = _BLOOM_HEADER.pack(_BLOOM_MAGIC, 1, self.capacity, self.num_bits, self.num_hashes, self.count)
+        return header + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, capacity, num_bits, num_hashes, count = _BLOOM_HEADER.unpack_from(data)
+        if magic != _BLOOM_MAGIC or version != 1:
+            raise ValueError("Not a scraped URL bloom filter")
+        bits = bytearray(data[_BLOOM_HEADER.size:])
+        return cls(capacity, num_bits=num_bits, num_hashes=num_hashes, bits=bits, count=count)
+
+class ScrapedUrlIndex:
+    """
+    Answers "has this URL been scraped?" without loading the full history.
+    Recent URLs are held exactly in memory, older ones are screened by the bloom filter,
+    and only possible hits are confirmed against the single archive shard the URL belongs to.
+    """
+
+    def __init__(self, s3_client, bucket_name, recent_urls, bloom):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.recent_urls = recent_urls
+        self.bloom = bloom
+        self._shards = {}
+        self.stats = {'recent_hits': 0, 'bloom_negatives': 0, 'exact_checks': 0, 'false_positives': 0}
+
+    def __contains__(self, url):
+        if url in self.recent_urls:
+            self.stats['recent_hits'] += 1
+            return True
+        if self.bloom is None or url not in self.bloom:
+            self.stats['bloom_negatives'] += 1
+            return False
+
+        # Possible hit: confirm against the exact archive shard
+        self.stats['exact_checks'] += 1
+        shard = shard_of(url)
+        if shard not in self._shards:
+            self._shards[shard] = set(read_url_file(self.s3_client, self.bucket_name, shard_key(shard)))
+        if url in self._shards[shard]:
+            return True
+        self.stats['false_positives'] += 1
+        return False
+
+def shard_of(url):
+    return int(hashlib.sha256(url.encode('utf-8')).hexdigest()[:8], 16) % ARCHIVE_SHARDS
+
+def shard_key(shard):
+    return f"{ARCHIVE_PREFIX}{shard:03d}.txt"
+
+def read_url_file(s3_client, bucket_name, key):
+    """
+    Read a newline separated URL file from S3 and return its URLs as a list.
+    Returns an empty list if the file doesn't exist.
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=key)
+    except s3_client.exceptions.NoSuchKey:
+        return []
+    return [url for url in response['Body'].read().decode('utf-8').splitlines() if url]
+
+def read_url_files(s3_client, bucket_name, keys):
+    """
+    Read several URL files concurrently and return their URL lists, in the order of the keys.
+    """
+    if not keys:
+        return []
+    with ThreadPoolExecutor(max_workers=min(IO_WORKERS, len(keys))) as executor:
+        return list(executor.map(lambda key: read_url_file(s3_client, bucket_name, key), keys))
+
+def read_recent(s3_client, bucket_name):
+    """
+    Read the recent file and return a dict of URL -> timestamp of the segment it was recorded in.
+    """
+    recent = {}
+    for line in read_url_file(s3_client, bucket_name, RECENT_KEY):
+        timestamp, _, url = line.partition('\t')
+        if url:
+            recent[url] = timestamp
+    return recent
+
+def list_keys(s3_client, bucket_name, prefix):
+    """
+    List the keys of all objects under the prefix, in lexical order.
+    """
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []))
+    return sorted(keys)
+
+def list_segment_keys(s3_client, bucket_name):
+    """
+    List the keys of all ledger segments, oldest first.
+    """
+    return list_keys(s3_client, bucket_name, SEGMENTS_PREFIX)
+
+def segment_timestamp(key):
+    """
+    Return the creation time encoded in a segment key ("<YYYYmmdd_HHMMSS>_<id>.txt") as its "YYYYmmdd_HHMMSS" string,
+    which sorts like the time itself.
+    """
+    return key[len(SEGMENTS_PREFIX):][:15]
+
+def load_bloom(s3_client, bucket_name):
+    """
+    Load the archive bloom filter from S3, or return None if the archive hasn't been built yet.
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=BLOOM_KEY)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return BloomFilter.from_bytes(response['Body'].read())
+
+def load_scraped_urls(s3_client, bucket_name):
+    """
+    Load previously scraped URLs from S3 to avoid re-scraping the same articles.
+    Only the recent file, the segments written since the last compaction (at most about COMPACTION_THRESHOLD)
+    and the bloom filter are downloaded, all concurrently, so the cost stays flat as the history grows.
+    Returns a ScrapedUrlIndex supporting `url in index`.
+    """
+    # Segments are listed first: compaction writes the recent file before deleting the segments it merged
+    segment_keys = list_segment_keys(s3_client, bucket_name)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        bloom = executor.submit(load_bloom, s3_client, bucket_name)
+        recent = executor.submit(read_recent, s3_client, bucket_name)
+        # The legacy ledger is empty once migrated to the archive
+        url_lists = read_url_files(s3_client, bucket_name, [LEDGER_KEY] + segment_keys)
+        recent_urls = set(recent.result())
+        bloom = bloom.result()
+    for urls in url_lists:
+        recent_urls.update(urls)
+    return ScrapedUrlIndex(s3_client, bucket_name, recent_urls, bloom)
+
+def save_scraped_urls(s3_client, bucket_name, urls):
+    """
+    Record newly scraped URLs by writing them as one new segment.
+    Existing ledger files are never rewritten here, so the cost does not grow with the history.
+    Returns the key of the written segment, or None if there was nothing to save.
+    """
+    urls = sorted(set(urls))
+    if not urls:
+        return None
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    key = f"{SEGMENTS_PREFIX}{timestamp}_{uuid.uuid4().hex[:8]}.txt"
+    s3_client.put_object(Bucket=bucket_name, Key=key, Body="\n".join(urls))
+    return key
+
+def rebuild_bloom(s3_client, bucket_name, false_positive_rate):
+    """
+    Build a new bloom filter over the whole archive, sized for twice its current number of URLs.
+    """
+    shards = read_url_files(s3_client, bucket_name, list_keys(s3_client, bucket_name, ARCHIVE_PREFIX))
+    total = sum(len(urls) for urls in shards)
+    bloom = BloomFilter(max(2 * total, 100000), false_positive_rate)
+    for urls in shards:
+        for url in urls:
+            bloom.add(url)
+    return bloom
+
+def delete_keys(s3_client, bucket_name, keys):
+    # At most 1000 keys per request
+    for i in range(0, len(keys), 1000):
+        batch = keys[i:i + 1000]
+        s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+
+def acquire_compaction_lock(s3_client, bucket_name, timeout_minutes=LOCK_TIMEOUT_MINUTES):
+    """
+    Take the compaction lock with a conditional write, so only one run compacts at a time.
+    A lock older than the timeout is left over from a crashed run and is taken over.
+    Returns the token to release it with, or None if another run holds it.
+    """
+    token = uuid.uuid4().hex
+    for _ in range(2):
+        try:
+            s3_client.put_object(Bucket=bucket_name, Key=LOCK_KEY, IfNoneMatch='*',
+                                 Body=f"{datetime.now().strftime('%Y%m%d_%H%M%S')} {token}")
+            return token
+        except s3_client.exceptions.ClientError as e:
+            if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise
+        held = read_url_file(s3_client, bucket_name, LOCK_KEY)
+        if held:
+            taken_at = datetime.strptime(held[0][:15], '%Y%m%d_%H%M%S')
+            if datetime.now() - taken_at < timedelta(minutes=timeout_minutes):
+                return None
+            s3_client.delete_object(Bucket=bucket_name, Key=LOCK_KEY)
+    return None
+
+def release_compaction_lock(s3_client, bucket_name, token):
+    """
+    Release the compaction lock if it is still the one taken with this token.
+    """
+    held = read_url_file(s3_client, bucket_name, LOCK_KEY)
+    if held and held[0].endswith(f" {token}"):
+        s3_client.delete_object(Bucket=bucket_name, Key=LOCK_KEY)
+
+def archive_urls(s3_client, bucket_name, urls, false_positive_rate):
+    """
+    Add URLs to the hash-sharded archive and its bloom filter. Only the shards that receive new URLs are rewritten.
+    """
+    urls_by_shard = defaultdict(set)
+    for url in urls:
+        urls_by_shard[shard_of(url)].add(url)
+
+    def merge_shard(shard, shard_urls):
+        existing = set(read_url_file(s3_client, bucket_name, shard_key(shard)))
+        new_urls = shard_urls - existing
+        if new_urls:
+            s3_client.put_object(Bucket=bucket_name, Key=shard_key(shard), Body="\n".join(sorted(existing | new_urls)))
+        return new_urls
+
+    added_urls = []
+    if urls_by_shard:
+        with ThreadPoolExecutor(max_workers=min(IO_WORKERS, len(urls_by_shard))) as executor:
+            for new_urls in executor.map(merge_shard, urls_by_shard.keys(), urls_by_shard.values()):
+                added_urls.extend(new_urls)
+
+    # Extend the bloom filter in place while it has capacity left, otherwise rebuild it larger
+    bloom = load_bloom(s3_client, bucket_name)
+    if bloom is None or bloom.count + len(added_urls) > bloom.capacity:
+        bloom = rebuild_bloom(s3_client, bucket_name, false_positive_rate)
+    else:
+        for url in added_urls:
+            bloom.add(url)
+    s3_client.put_object(Bucket=bucket_name, Key=BLOOM_KEY, Body=bloom.to_bytes())
+
+def compact_scraped_urls(s3_client, bucket_name, threshold=COMPACTION_THRESHOLD, recent_window_days=RECENT_WINDOW_DAYS,
+                         false_positive_rate=BLOOM_FALSE_POSITIVE_RATE, lock_timeout_minutes=LOCK_TIMEOUT_MINUTES):
+    """
+    Merge the segments into the recent file once there are at least `threshold` of them, and move URLs older
+    than the recent window from there into the hash-sharded archive and its bloom filter. The pre-archive
+    ledger file is migrated on the first compaction. Runs under the compaction lock and skips if another run
+    holds it; only the segments listed under the lock are deleted, after the files they went into are written.
+    Returns the number of merged segments.
+    """
+    if len(list_segment_keys(s3_client, bucket_name)) < threshold and not read_url_file(s3_client, bucket_name, LEDGER_KEY):
+        return 0
+    token = acquire_compaction_lock(s3_client, bucket_name, lock_timeout_minutes)
+    if token is None:
+        return 0
+
+    try:
+        # Listed again under the lock, in case another run compacted in the meantime
+        segment_keys = list_segment_keys(s3_client, bucket_name)
+        legacy_urls = read_url_file(s3_client, bucket_name, LEDGER_KEY)
+        if len(segment_keys) < threshold and not legacy_urls:
+            return 0
+
+        recent = read_recent(s3_client, bucket_name)
+        for key, urls in zip(segment_keys, read_url_files(s3_client, bucket_name, segment_keys)):
+            timestamp = segment_timestamp(key)
+            for url in urls:
+                recent[url] = max(recent.get(url, timestamp), timestamp)
+
+        cutoff = (datetime.now() - timedelta(days=recent_window_days)).strftime('%Y%m%d_%H%M%S')
+        aged_urls = {url for url, timestamp in recent.items() if timestamp < cutoff}
+        if aged_urls or legacy_urls:
+            archive_urls(s3_client, bucket_name, aged_urls | set(legacy_urls), false_positive_rate)
+        s3_client.put_object(
+            Bucket=bucket_name, Key=RECENT_KEY,
+            Body="\n".join(f"{timestamp}\t{url}" for url, timestamp in sorted(recent.items()) if url not in aged_urls)
+        )
+
+        # The recent file, the archive and the filter are written, so the merged inputs can go
+        delete_keys(s3_client, bucket_name, segment_keys)
+        if legacy_urls:
+            s3_client.delete_object(Bucket=bucket_name, Key=LEDGER_KEY)
+        return len(segment_keys)
+    finally:
+        release_compaction_lock(s3_client, bucket_name, token)
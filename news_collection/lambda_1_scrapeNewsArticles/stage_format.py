@@ -0,0 +1,163 @@
+import io
+import logging
+import os
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import s3_storage
+
+logger = logging.getLogger(__name__)
+
+# Format of the files handed from one pipeline stage to the next:
+# 'parquet' (default) or 'csv' to keep producing the previous files.
+# A stage file starts the next stage through the S3 event notification of its folder ("1_raw/" -> stage 2,
+# "2_summarized_with_topics/" -> stage 3, "3_generated_images/" -> stage 4). Notifications filtering on the
+# ".csv" suffix never fire for ".parquet" files: add a ".parquet" suffix rule to each of them before switching,
+# or set STAGE_FORMAT=csv until they have one. Don't drop the suffix filter, "1_raw/" also holds state files.
+STAGE_FORMAT = os.environ.get('STAGE_FORMAT', 'parquet').lower()
+
+FILE_EXTENSIONS = {'parquet': '.parquet', 'csv': '.csv'}
+
+# Explicit schema of the articles at the end of every stage
+_RAW_FIELDS = [
+    pa.field('Source', pa.string()),
+    pa.field('Published', pa.timestamp('us')),
+    pa.field('Title', pa.string()),
+    pa.field('Link', pa.string()),
+    pa.field('Content', pa.string())
+]
+_SUMMARIZED_FIELDS = _RAW_FIELDS + [
+    pa.field('Summary', pa.string()),
+    pa.field('Topic_1', pa.string()),
+    pa.field('Topic_2', pa.string())
+]
+STAGE_SCHEMAS = {
+    '1_raw': pa.schema(_RAW_FIELDS),
+    '2_summarized_with_topics': pa.schema(_SUMMARIZED_FIELDS),
+    '3_generated_images': pa.schema(_SUMMARIZED_FIELDS + [pa.field('Image_URL', pa.string())])
+}
+
+# Formats of the Published column: what convert_to_berlin_time of the scraper returns, and what its fallback
+# leaves of an RFC 822 date whose zone it couldn't parse (e.g. "EDT"), with the zone cut off
+PUBLISHED_FORMATS = ('%Y-%m-%d %H:%M:%S', '%a, %d %b %Y %H:%M:%S', '%d %b %Y %H:%M:%S')
+PUBLISHED_TIMEZONE = 'Europe/Berlin'
+
+# The last stage is loaded into Redshift with COPY ... FORMAT AS PARQUET, which can't truncate
+# like TRUNCATECOLUMNS does for CSV, so its text is cut to the VARCHAR(MAX) limit here
+REDSHIFT_STAGE = '3_generated_images'
+REDSHIFT_MAX_VARCHAR_BYTES = 65535
+
+def stage_key(stage, fmt=STAGE_FORMAT, timestamp=None):
+    """
+    Return the S3 key of a new stage file, e.g. "1_raw/1_raw_20241014_120000.parquet".
+    """
+    timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"{stage}/{stage}_{timestamp}{FILE_EXTENSIONS[fmt]}"
+
+def format_of(key):
+    """
+    Return the interchange format of a stage file from its extension.
+    """
+    for fmt, extension in FILE_EXTENSIONS.items():
+        if key.endswith(extension):
+            return fmt
+    raise ValueError(f"Unsupported stage file format: {key}")
+
+def blank_to_none(text):
+    """
+    Return None for an empty or whitespace-only string, like pd.read_csv and the EMPTYASNULL/BLANKSASNULL
+    options of the CSV COPY did, so a failed extraction stays NULL in Parquet too.
+    """
+    if isinstance(text, str) and not text.strip():
+        return None
+    return text
+
+def truncate_utf8(text, max_bytes):
+    if not isinstance(text, str) or len(text) * 4 <= max_bytes:
+        return text
+    return text.encode('utf-8')[:max_bytes].decode('utf-8', errors='ignore')
+
+def parse_timestamp(value):
+    """
+    Parse a date string in any other format pandas recognises, as naive Berlin time; a trailing zone
+    pandas doesn't know is cut off, like the scraper's fallback does. Returns NaT if it can't be parsed.
+    """
+    for text in (value, " ".join(value.split()[:-1])):
+        try:
+            timestamp = pd.Timestamp(text)
+        except ValueError:
+            continue
+        if timestamp is not pd.NaT and timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert(PUBLISHED_TIMEZONE).tz_localize(None)
+        return timestamp
+    return pd.NaT
+
+def parse_published(values):
+    """
+    Parse the Published column into naive timestamps. The known formats (PUBLISHED_FORMATS) are tried
+    explicitly, then parse_timestamp; values that still can't be parsed end up as NULL and are logged.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[us]')
+    for fmt in PUBLISHED_FORMATS:
+        missing = parsed.isna() & values.notna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(values[missing], errors='coerce', format=fmt)
+    for index in parsed.index[parsed.isna() & values.notna()]:
+        parsed[index] = parse_timestamp(str(values[index]))
+
+    failed = values[parsed.isna() & values.notna() & (values.astype(str).str.strip() != '')]
+    if len(failed):
+        logger.warning(f"Unparseable Published dates in {len(failed)} rows, stored as NULL: {sorted(set(failed.astype(str)))[:5]}")
+    return parsed
+
+def to_table(df, stage):
+    """
+    Convert the DataFrame of a stage to an Arrow table with the stage's explicit schema; blank strings become NULL.
+    """
+    schema = STAGE_SCHEMAS[stage]
+    df = df[schema.names].copy()
+    df['Published'] = parse_published(df['Published'])
+    for field in schema:
+        if pa.types.is_string(field.type):
+            df[field.name] = df[field.name].map(blank_to_none)
+            if stage == REDSHIFT_STAGE:
+                df[field.name] = df[field.name].map(lambda text: truncate_utf8(text, REDSHIFT_MAX_VARCHAR_BYTES))
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+def encode_frame(df, stage, fmt=STAGE_FORMAT):
+    """
+    Serialise the DataFrame of a stage into the bytes of a stage file.
+    """
+    buffer = io.BytesIO()
+    if fmt == 'parquet':
+        pq.write_table(to_table(df, stage), buffer, compression='snappy')
+    else:
+        df.to_csv(buffer, index=False, encoding='utf-8')
+    return buffer.getvalue()
+
+def decode_frame(data, key):
+    """
+    Load the bytes of a stage file into a DataFrame; the format is taken from the key's extension.
+    """
+    if format_of(key) == 'parquet':
+        return pq.read_table(io.BytesIO(data)).to_pandas()
+    return pd.read_csv(io.BytesIO(data))
+
+def read_stage_frame(s3_client, bucket_name, key):
+    """
+    Read a stage file from S3 straight into a DataFrame, without going through /tmp.
+    """
+    return decode_frame(s3_storage.read_bytes(s3_client, bucket_name, key), key)
+
+def write_stage_frame(s3_client, bucket_name, df, stage, fmt=STAGE_FORMAT):
+    """
+    Write the DataFrame of a stage to a new, timestamped stage file in S3, without going through /tmp.
+    Returns the S3 key of the file.
+    """
+    key = stage_key(stage, fmt)
+    s3_storage.write_bytes(s3_client, bucket_name, key, encode_frame(df, stage, fmt))
+    return key
@@ -0,0 +1,101 @@
+"""
+Compare the former text round-trip summarization path (tokenize, decode the truncated ids,
+let the pipeline tokenize the text again) with the id-level path of generate_summary
+on the long articles in fixtures/articles (one <domain>.txt per site).
+
+Reports per article, in milliseconds:
+    - preprocessing: everything before generation (tokenization, truncation, decoding)
+    - end to end: the full summary of a single article
+and whether both paths produce the same summary.
+
+Usage (from the Lambda folder, with the model files in ./bart-large-cnn or --model):
+    pip install -r requirements.txt
+    python benchmarks/bench_summarization.py [--model PATH] [--repeat 3] [--strategy head|head_tail]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, LAMBDA_DIR)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-north-1')
+os.environ.setdefault('OPENAI_API_KEY', 'unused')
+
+ARTICLE_FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures', 'articles')
+
+def load_article_fixtures():
+    """
+    Return a dict mapping each domain to the text of its saved article.
+    """
+    fixtures = {}
+    for file_name in sorted(os.listdir(ARTICLE_FIXTURES_DIR)):
+        if file_name.endswith('.txt'):
+            with open(os.path.join(ARTICLE_FIXTURES_DIR, file_name), encoding='utf-8') as f:
+                fixtures[file_name[:-len('.txt')]] = f.read()
+    return fixtures
+
+def legacy_preprocess(text, tokenizer, max_length=1024):
+    """
+    The former preprocessing: truncate by tokenizing and decoding, then tokenize again like the pipeline does.
+    """
+    inputs = tokenizer(text, max_length=max_length, truncation=True)
+    truncated_text = tokenizer.decode(inputs['input_ids'], skip_special_tokens=True)
+    return tokenizer(truncated_text, max_length=max_length, truncation=True, return_tensors='pt')
+
+def legacy_summary(text, tokenizer, summarization_pipeline, max_length=1024):
+    """
+    The former generate_summary.
+    """
+    inputs = tokenizer(text, max_length=max_length, truncation=True)
+    truncated_text = tokenizer.decode(inputs['input_ids'], skip_special_tokens=True)
+    return summarization_pipeline(truncated_text, min_length=100, max_length=200, truncation=True)[0]['summary_text']
+
+def median_ms(func, repeat):
+    """
+    Return the median wall-clock time of func() in milliseconds, and its last result.
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--model', default=os.path.join(LAMBDA_DIR, 'bart-large-cnn'), help="path or Hub id of bart-large-cnn")
+    arg_parser.add_argument('--repeat', type=int, default=3, help="timed runs per article")
+    arg_parser.add_argument('--strategy', default='head', choices=['head', 'head_tail'], help="truncation of the id-level path")
+    args = arg_parser.parse_args()
+
+    os.environ['MODEL_PATH'] = args.model
+    os.environ['TRUNCATION_STRATEGY'] = args.strategy
+    os.environ['SUMMARIZER_BACKEND'] = 'pytorch'  # Both paths run the same full-precision model
+    os.environ['SUMMARY_MODE'] = 'truncate'  # The former path truncated every article
+    import lambda_function
+    from transformers import pipeline
+
+    summarizer = lambda_function.get_summarizer()
+    tokenizer = lambda_function.get_tokenizer()
+    summarization_pipeline = pipeline("summarization", model=summarizer, tokenizer=tokenizer)
+    articles = load_article_fixtures()
+
+    # Warm-up, the first generate call is much slower than the following ones
+    lambda_function.generate_summary(next(iter(articles.values())), summarizer, tokenizer)
+
+    print(f"{'article':<26}{'tokens':>8}{'prep legacy':>13}{'prep ids':>10}{'e2e legacy':>12}{'e2e ids':>10}{'saved':>9}  same summary")
+    for domain, text in articles.items():
+        tokens = len(tokenizer(text, add_special_tokens=False, verbose=False)['input_ids'])
+        prep_legacy_ms, _ = median_ms(lambda: legacy_preprocess(text, tokenizer), args.repeat * 10)
+        prep_ids_ms, _ = median_ms(lambda: lambda_function.encode_articles([text], tokenizer), args.repeat * 10)
+        legacy_ms, legacy_text = median_ms(lambda: legacy_summary(text, tokenizer, summarization_pipeline), args.repeat)
+        ids_ms, ids_text = median_ms(lambda: lambda_function.generate_summary(text, summarizer, tokenizer), args.repeat)
+        same = "yes" if legacy_text.strip() == ids_text else "no"
+        print(f"{domain:<26}{tokens:>8}{prep_legacy_ms:>13.1f}{prep_ids_ms:>10.1f}{legacy_ms:>12.0f}{ids_ms:>10.0f}{legacy_ms - ids_ms:>9.0f}  {same}")
+
+if __name__ == '__main__':
+    main()
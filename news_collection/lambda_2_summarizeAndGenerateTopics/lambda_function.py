@@ -3,12 +3,23 @@ import os
 os.environ['TRANSFORMERS_CACHE'] = '/tmp'
 os.environ['HF_HOME'] = '/tmp'
 
-import pandas as pd
 import boto3
 import openai
-from transformers import pipeline, AutoTokenizer
-from datetime import datetime
+import torch
+from transformers import AutoTokenizer
+import hashlib
 import logging
+import threading
+import math
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import time
+import result_cache
+import s3_storage
+import stage_format
+import summarizer_backends
+import summary_batching
+import topic_classifier
+import topic_embeddings
 
 # Configure logging
 logger = logging.getLogger()
@@ -20,116 +31,303 @@ s3_client = boto3.client('s3')
 # OpenAI API key setup
 openai.api_key = os.environ['OPENAI_API_KEY']
 
-# Summarizer setup using bart-large-cnn
+# Batches of articles summarized in one generate call: at most SUMMARY_MAX_BATCH_SIZE articles and
+# SUMMARY_MAX_BATCH_TOKENS padded input tokens, which bounds the memory of a forward pass
+SUMMARY_MAX_BATCH_SIZE = int(os.environ.get('SUMMARY_MAX_BATCH_SIZE', 8))
+SUMMARY_MAX_BATCH_TOKENS = int(os.environ.get('SUMMARY_MAX_BATCH_TOKENS', 4096))
+
+# Articles longer than the model input are either summarized in overlapping windows ('map_reduce', default)
+# or truncated ('truncate') with TRUNCATION_STRATEGY 'head' (default) or 'head_tail'
+MAX_INPUT_TOKENS = 1024
+SUMMARY_MODE = os.environ.get('SUMMARY_MODE', 'map_reduce')
+TRUNCATION_STRATEGY = os.environ.get('TRUNCATION_STRATEGY', 'head')
+TRUNCATION_TAIL_SHARE = float(os.environ.get('TRUNCATION_TAIL_SHARE', 0.25))
+
+# map_reduce: a long article is split into at most SUMMARY_MAX_WINDOWS windows overlapping by SUMMARY_WINDOW_OVERLAP
+# tokens, every window is summarized to CHUNK_SUMMARY_MIN_LENGTH-CHUNK_SUMMARY_MAX_LENGTH tokens, and the joined
+# partial summaries are summarized once more. Beyond SUMMARY_MAX_WINDOWS the windows are spread evenly over the
+# article, which keeps the latency of very long articles bounded. An article that overflows the input by no more
+# than SUMMARY_WINDOW_OVERLAP tokens is truncated instead: its windows would almost coincide, and one generate
+# pass over the truncated article beats two window passes plus the reduce pass.
+SUMMARY_MAX_WINDOWS = int(os.environ.get('SUMMARY_MAX_WINDOWS', 4))
+SUMMARY_WINDOW_OVERLAP = int(os.environ.get('SUMMARY_WINDOW_OVERLAP', 128))
+CHUNK_SUMMARY_MIN_LENGTH = int(os.environ.get('CHUNK_SUMMARY_MIN_LENGTH', 40))
+CHUNK_SUMMARY_MAX_LENGTH = int(os.environ.get('CHUNK_SUMMARY_MAX_LENGTH', 120))
+SUMMARY_MIN_LENGTH = 100
+SUMMARY_MAX_LENGTH = 200
+
+# Intra-op threads of PyTorch; by default one per available core (Lambda's vCPUs grow with its memory size)
+TORCH_NUM_THREADS = int(os.environ.get('TORCH_NUM_THREADS', os.cpu_count() or 1))
+torch.set_num_threads(TORCH_NUM_THREADS)
+
+# Inference backend of the summarizer: 'pytorch' (default), 'pytorch-int8' or 'onnx', see summarizer_backends.py.
+# Each backend loads the model and its tokenizer from its own folder baked into the image;
+# the int8 and ONNX folders are built with scripts/export_summarizer.py.
+SUMMARIZER_BACKEND = os.environ.get('SUMMARIZER_BACKEND', 'pytorch')
+MODEL_PATH = os.environ.get('MODEL_PATH', "/var/task/bart-large-cnn")
+INT8_MODEL_PATH = os.environ.get('INT8_MODEL_PATH', "/var/task/bart-large-cnn-int8")
+ONNX_MODEL_PATH = os.environ.get('ONNX_MODEL_PATH', "/var/task/bart-large-cnn-onnx")
+BACKEND_MODEL_PATHS = {
+    'pytorch': MODEL_PATH,
+    'pytorch-int8': INT8_MODEL_PATH,
+    'onnx': ONNX_MODEL_PATH
+}
+
+# Topic classification backend: 'llm' (gpt-4o-mini, see topic_classifier.py) or 'embedding'
+# (in-process nearest-centroid classifier, see topic_embeddings.py and scripts/train_topic_classifier.py)
+TOPIC_BACKEND = os.environ.get('TOPIC_BACKEND', 'llm')
+EMBEDDING_MODEL_PATH = os.environ.get('EMBEDDING_MODEL_PATH', "/var/task/all-MiniLM-L6-v2")
+TOPIC_CENTROIDS_PATH = os.environ.get('TOPIC_CENTROIDS_PATH', "/var/task/topic_centroids.npz")
+
+# Summaries and topics are memoized per article content (see result_cache.S3ResultCache) as one small object per
+# article under RESULT_CACHE_PREFIX in the bucket, so an invocation only reads the entries of its own articles and
+# writes the new ones. An empty RESULT_CACHE_PREFIX disables the cache; changing RESULT_CACHE_VERSION invalidates
+# every entry. Old entries are expired by a lifecycle rule on the prefix.
+RESULT_CACHE_PREFIX = os.environ.get('RESULT_CACHE_PREFIX', "cache/results/")
+RESULT_CACHE_VERSION = os.environ.get('RESULT_CACHE_VERSION', '1')
+# Everything a summary depends on; a different model or setting never reuses an old summary
+SUMMARY_CACHE_VERSION = result_cache.version_of(
+    RESULT_CACHE_VERSION, SUMMARIZER_BACKEND, BACKEND_MODEL_PATHS.get(SUMMARIZER_BACKEND), SUMMARY_MODE, MAX_INPUT_TOKENS,
+    TRUNCATION_STRATEGY, TRUNCATION_TAIL_SHARE, SUMMARY_MAX_WINDOWS, SUMMARY_WINDOW_OVERLAP,
+    CHUNK_SUMMARY_MIN_LENGTH, CHUNK_SUMMARY_MAX_LENGTH, SUMMARY_MIN_LENGTH, SUMMARY_MAX_LENGTH
+)
+# The result cache of the current invocation, None while it is disabled
+_result_cache = None
+_topic_cache_version = None
+
+# Models loaded by this container, created on first use and reused by every warm invocation
+_models = {}
+_models_lock = threading.Lock()
+# Seconds it took to load each model in this container
+MODEL_LOAD_TIMINGS = {}
+
+# Return the model registered under name, loading it with loader the first time it is needed
+def get_model(name, loader):
+    with _models_lock:
+        if name not in _models:
+            start = time.perf_counter()
+            _models[name] = loader()
+            MODEL_LOAD_TIMINGS[name] = round(time.perf_counter() - start, 3)
+            logger.info(f"Loaded {name} in {MODEL_LOAD_TIMINGS[name]} s")
+        return _models[name]
+
+# Summarizer setup using bart-large-cnn with the configured inference backend
 def setup_summarizer():
-    model_path = "/var/task/bart-large-cnn"
-    summarizer = pipeline("summarization", model=model_path, tokenizer=model_path)
-    return summarizer
+    logger.info(f"Loading the summarizer with the {SUMMARIZER_BACKEND} backend")
+    return summarizer_backends.load_summarizer(SUMMARIZER_BACKEND, BACKEND_MODEL_PATHS.get(SUMMARIZER_BACKEND))
 
-# Tokenizer setup for bart-large-cnn
+# Tokenizer setup for bart-large-cnn, read from the local files of the backend
 def setup_tokenizer():
-    tokenizer = AutoTokenizer.from_pretrained("facebook/bart-large-cnn")
-    return tokenizer
-
-# Fetch CSV from S3 and load it into a DataFrame
-def fetch_csv_from_s3(bucket_name, csv_key):
-    local_csv_path = f"/tmp/{os.path.basename(csv_key)}"
-    s3_client.download_file(bucket_name, csv_key, local_csv_path)
-    df = pd.read_csv(local_csv_path)
-    return df
-
-# Tokenize and truncate the content before summarization
-def tokenize_and_truncate(text, tokenizer, max_length=1024):
-    inputs = tokenizer(text, max_length=max_length, truncation=True)
-    truncated_text = tokenizer.decode(inputs['input_ids'], skip_special_tokens=True)
-    return truncated_text
+    return AutoTokenizer.from_pretrained(BACKEND_MODEL_PATHS.get(SUMMARIZER_BACKEND, MODEL_PATH))
+
+def get_summarizer():
+    return get_model('summarizer', setup_summarizer)
+
+def get_tokenizer():
+    return get_model('tokenizer', setup_tokenizer)
+
+# Local topic classifier (embedding model and topic centroids baked into the image)
+def setup_topic_classifier():
+    return topic_embeddings.EmbeddingTopicClassifier(EMBEDDING_MODEL_PATH, TOPIC_CENTROIDS_PATH)
+
+def get_topic_classifier():
+    return get_model('topic_classifier', setup_topic_classifier)
+
+# Open the result cache of the bucket for this invocation; nothing is downloaded until articles are looked up
+def open_result_cache(bucket_name):
+    global _result_cache
+    if not RESULT_CACHE_PREFIX:
+        return None
+    _result_cache = result_cache.S3ResultCache(s3_client, bucket_name, RESULT_CACHE_PREFIX)
+    return _result_cache
+
+# Log the hits and misses of the invocation; new entries were already written when they were computed
+def close_result_cache(bucket_name):
+    global _result_cache
+    if _result_cache is None:
+        return
+    cache, _result_cache = _result_cache, None
+    logger.info(f"Result cache: {cache.summary() or 'not used'}")
+    cache.close()
+
+# Return compute(texts), answering from the result cache where possible; compute only gets the texts it misses
+def cached_results(namespace, version, texts, compute):
+    if _result_cache is None:
+        return compute(list(texts))
+    return _result_cache.map(namespace, version, texts, compute)
+
+# Fetch the stage file (Parquet or CSV) from S3 and load it into a DataFrame in memory
+def fetch_frame_from_s3(bucket_name, key):
+    return stage_format.read_stage_frame(s3_client, bucket_name, key)
+
+# Cut the token ids of an article (without special tokens) to fit max_tokens, see summary_batching.truncate_ids
+def truncate_ids(ids, max_tokens):
+    return summary_batching.truncate_ids(ids, max_tokens, TRUNCATION_STRATEGY, TRUNCATION_TAIL_SHARE)
+
+# Split the token ids of a long article into windows of window_size tokens overlapping by at least overlap tokens.
+# The first window starts at the beginning and the last one ends at the end of the article; if more than
+# max_windows would be needed, max_windows windows are spread evenly (leaving gaps between them).
+def split_windows(ids, window_size, overlap=SUMMARY_WINDOW_OVERLAP, max_windows=SUMMARY_MAX_WINDOWS):
+    if len(ids) <= window_size:
+        return [ids]
+    stride = max(window_size - overlap, 1)
+    count = min(math.ceil((len(ids) - overlap) / stride), max(max_windows, 1))
+    if count == 1:
+        return [ids[:window_size]]
+    last_start = len(ids) - window_size
+    return [ids[start:start + window_size] for start in (round(k * last_start / (count - 1)) for k in range(count))]
+
+# Tokenize every article once; returns the token ids of each article without special tokens
+def tokenize_articles(texts, tokenizer):
+    return tokenizer(list(texts), add_special_tokens=False, verbose=False)['input_ids']
+
+# Tokenize every article once and truncate at the id level; returns the model input ids of each article
+def encode_articles(texts, tokenizer, max_length=MAX_INPUT_TOKENS):
+    budget = max_length - tokenizer.num_special_tokens_to_add()
+    return [tokenizer.build_inputs_with_special_tokens(truncate_ids(ids, budget)) for ids in tokenize_articles(texts, tokenizer)]
+
+# Group article indices into length-bucketed batches, see summary_batching.make_length_batches
+def make_length_batches(lengths):
+    return summary_batching.make_length_batches(lengths, SUMMARY_MAX_BATCH_SIZE, SUMMARY_MAX_BATCH_TOKENS)
+
+# Run generate over model inputs with one call per length-bucketed batch; the outputs keep the order of input_ids
+def generate_batched(input_ids, summarizer, tokenizer, min_length, max_length):
+    outputs = [None] * len(input_ids)
+    for batch in make_length_batches([len(ids) for ids in input_ids]):
+        features = tokenizer.pad({'input_ids': [input_ids[index] for index in batch]}, return_tensors='pt')
+        with torch.inference_mode():
+            output_ids = summarizer.generate(**features, min_length=min_length, max_length=max_length)
+        for index, summary in zip(batch, tokenizer.batch_decode(output_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)):
+            outputs[index] = summary.strip()
+    return outputs
+
+# Summarize many articles; summaries keep the order of texts. Each article is tokenized once and its token ids
+# go straight to the model. In map_reduce mode the windows of all long articles are summarized together in one
+# batched pass, and their joined partial summaries go through the final pass with the short articles.
+def summarize_articles(texts, summarizer, tokenizer):
+    budget = MAX_INPUT_TOKENS - tokenizer.num_special_tokens_to_add()
+    content_ids = tokenize_articles(texts, tokenizer)
+
+    final_inputs = [None] * len(content_ids)
+    window_inputs = []
+    window_owners = []
+    for index, ids in enumerate(content_ids):
+        if SUMMARY_MODE == 'map_reduce' and len(ids) > budget + SUMMARY_WINDOW_OVERLAP:
+            for window in split_windows(ids, budget):
+                window_inputs.append(tokenizer.build_inputs_with_special_tokens(window))
+                window_owners.append(index)
+        else:
+            final_inputs[index] = tokenizer.build_inputs_with_special_tokens(truncate_ids(ids, budget))
+
+    if window_inputs:
+        # Map: summarize every window, then join the partial summaries of each article in reading order
+        partial_summaries = generate_batched(window_inputs, summarizer, tokenizer, CHUNK_SUMMARY_MIN_LENGTH, CHUNK_SUMMARY_MAX_LENGTH)
+        joined = {}
+        for index, partial_summary in zip(window_owners, partial_summaries):
+            joined.setdefault(index, []).append(partial_summary)
+        for index, ids in zip(joined, tokenize_articles([" ".join(parts) for parts in joined.values()], tokenizer)):
+            final_inputs[index] = tokenizer.build_inputs_with_special_tokens(truncate_ids(ids, budget))
+        logger.info(f"Summarized {len(joined)} long articles from {len(window_inputs)} windows")
+
+    # Reduce (and the short articles): one final summary per article
+    return generate_batched(final_inputs, summarizer, tokenizer, SUMMARY_MIN_LENGTH, SUMMARY_MAX_LENGTH)
+
+# Summarize many articles, checking the result cache first. The summarizer (bart-large-cnn) is only loaded
+# when some article isn't cached, so reprocessing a file doesn't even load the model.
+def generate_summaries(texts, summarizer=None, tokenizer=None):
+    def summarize(missing_texts):
+        return summarize_articles(missing_texts, summarizer or get_summarizer(), tokenizer or get_tokenizer())
+    return cached_results('summaries', SUMMARY_CACHE_VERSION, texts, summarize)
 
 # Generate the summary using the bart-large-cnn model
-def generate_summary(text, summarizer, tokenizer):
-    # Tokenize and truncate content
-    truncated_text = tokenize_and_truncate(text, tokenizer)
-    # Generate the summary with the truncated content
-    summary = summarizer(truncated_text, min_length=100, max_length=200, truncation=True)[0]['summary_text']
-    return summary
-
-# Generate topics using OpenAI
+def generate_summary(text, summarizer=None, tokenizer=None):
+    return generate_summaries([text], summarizer, tokenizer)[0]
+
+# Generate the topics of a single article
 def generate_topics(article):
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",  
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert on categorizing articles based on provided topics."
-            },
-            {
-                "role": "user",
-                "content": f"""Determine the 2 topics that best fit the news article below from the following list of topics only: 
-                “Agriculture & Food”, “Business & Innovation”, “Climate Change”, “Crisis & Disasters”, “Energy”, “Fossil Fuels”, “Pollution”, “Politics & Law”, “Public Health & Environment”, “Society & Culture”, “Sustainability”, “Technology & Science”, “Urban & Infrastructure”, “Water & Oceans”, “Wildlife & Conservation”.
-                Topic1 is the best fitting topic, and Topic2 is the second best fitting. Return your answer in the following format: topic1-topic2
-                Article: {article}"""
-            }
-        ]
-    )
-    topics = response['choices'][0]['message']['content']
-    return topics.split('-')
-
-# Save updated DataFrame with new columns to S3
-def save_csv_to_s3(df, bucket_name):
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    csv_filename = f"2_summarized_with_topics_{timestamp}.csv"
-    local_csv_path = f"/tmp/{csv_filename}"
-    
-    # Save the DataFrame to a local CSV
-    df.to_csv(local_csv_path, index=False)
-    
-    # Upload the new CSV to the "2_summarized_with_topics" folder in S3
-    s3_key = f"2_summarized_with_topics/{csv_filename}"
-    s3_client.upload_file(local_csv_path, bucket_name, s3_key)
-    logger.info(f"Uploaded updated CSV with summaries and topics to S3: {s3_key}")
+    return classify_topics([article])[0]
+
+# Version of the topics of the configured backend: its prompt and model, or its trained centroids
+def topic_cache_version():
+    global _topic_cache_version
+    if _topic_cache_version is None:
+        if TOPIC_BACKEND == 'embedding':
+            with open(TOPIC_CENTROIDS_PATH, 'rb') as f:
+                backend_version = hashlib.sha256(f.read()).hexdigest()
+        else:
+            backend_version = topic_classifier.prompt_version()
+        _topic_cache_version = result_cache.version_of(RESULT_CACHE_VERSION, TOPIC_BACKEND, backend_version)
+    return _topic_cache_version
+
+# Classify the topics of the articles with the configured backend, checking the result cache first.
+# Returns a list of (topic_1, topic_2) tuples.
+def classify_topics(contents):
+    def classify(missing_contents):
+        if TOPIC_BACKEND == 'embedding':
+            return get_topic_classifier().classify(missing_contents)
+        return topic_classifier.classify_topics(missing_contents)
+    return [tuple(topics) for topics in cached_results('topics', topic_cache_version(), contents, classify)]
+
+# Start classifying the topics of the articles. Returns a future resolving to the result of classify_topics:
+# LLM requests run in a background thread, the local classifier answers right away.
+def start_topic_classification(contents):
+    if TOPIC_BACKEND == 'embedding':
+        future = Future()
+        future.set_result(classify_topics(contents))
+        return future
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(classify_topics, list(contents))
+    executor.shutdown(wait=False)
+    return future
+
+# Save updated DataFrame with new columns to S3 as a new "2_summarized_with_topics" stage file
+def save_frame_to_s3(df, bucket_name):
+    s3_key = stage_format.write_stage_frame(s3_client, bucket_name, df, '2_summarized_with_topics')
+    logger.info(f"Uploaded updated file with summaries and topics to S3: {s3_key}")
 
 def process_csv(bucket_name, csv_key):
-    # Step 1: Fetch the uploaded CSV from S3
-    df = fetch_csv_from_s3(bucket_name, csv_key)
+    # Step 1: Fetch the uploaded stage file from S3
+    df = fetch_frame_from_s3(bucket_name, csv_key)
 
-    # Step 2: Remove rows where 'Content' is empty or NaN
-    df = df[df['Content'].notna()]
+    # Step 2: Remove rows where 'Content' is empty, blank or NaN
+    df = df[df['Content'].fillna('').str.strip() != '']
 
     if df.empty:
         logger.info("No valid content found in the CSV.")
         return
 
-    # Step 3: Set up the summarizer (bart-large-cnn)
-    summarizer = setup_summarizer()
-    tokenizer = setup_tokenizer()
+    # Step 3: Start classifying the topics of all articles; LLM requests run concurrently in the background
+    contents = df['Content'].tolist()
+    topics_future = start_topic_classification(contents)
 
-    # Step 4: Iterate through the DataFrame and summarize articles and generate topics
-    summaries = []
-    topics_1 = []
-    topics_2 = []
-    
-    for _, row in df.iterrows():
-        content = row['Content']
-        
-        # Generate the summary
-        summary = generate_summary(content, summarizer, tokenizer)
-        summaries.append(summary)
-        
-        # Generate the topics
-        topic_1, topic_2 = generate_topics(content)
-        topics_1.append(topic_1.strip())
-        topics_2.append(topic_2.strip())
+    # Step 4: Summarize the articles missing from the result cache in length-bucketed batches with the summarizer
+    # (bart-large-cnn), which is loaded only on the first invocation of this container, then collect the topics
+    try:
+        summaries = generate_summaries(contents)
+    except Exception:
+        # The topic thread uses the result cache, which is closed once this returns; let it finish first
+        wait([topics_future])
+        raise
+    topics = topics_future.result()
+    topics_1 = [topic_1 for topic_1, _ in topics]
+    topics_2 = [topic_2 for _, topic_2 in topics]
 
     # Step 5: Add the new columns to the DataFrame
     df['Summary'] = summaries
     df['Topic_1'] = topics_1
     df['Topic_2'] = topics_2
 
-    # Step 6: Save the updated DataFrame as a new CSV and upload it to S3
-    save_csv_to_s3(df, bucket_name)
+    # Step 6: Save the updated DataFrame as a new stage file in S3
+    save_frame_to_s3(df, bucket_name)
 
 # Lambda function handler
 def lambda_handler(event, context):
     logger.info("Lambda function started")
+
+    # Stage files are no longer written to /tmp; clear any left there by earlier runs of this container
+    removed = s3_storage.remove_stale_tmp_files()
+    if removed:
+        logger.info(f"Removed {removed} stale files from /tmp")
     
     # Get bucket and object information from the S3 event trigger
     bucket_name = event['Records'][0]['s3']['bucket']['name']
@@ -137,8 +335,13 @@ def lambda_handler(event, context):
     
     try:
         # Process the CSV by summarizing and generating topics
-        process_csv(bucket_name, csv_key)
+        open_result_cache(bucket_name)
+        try:
+            process_csv(bucket_name, csv_key)
+        finally:
+            close_result_cache(bucket_name)
         logger.info(f"Successfully processed and updated CSV from {csv_key}.")
+        logger.info(f"Model load timings of this container (s): {MODEL_LOAD_TIMINGS}")
         return {"statusCode": 200, "body": "Success"}
     except Exception as e:
         logger.error(f"Error processing CSV: {e}", exc_info=True)
@@ -0,0 +1,121 @@
+"""
+Compare a summarizer backend with the full-precision PyTorch baseline on the same articles.
+Each backend runs in its own process so the peak memory figures don't mix. Reported:
+    - load time, mean latency per summary and peak resident memory of each backend
+    - ROUGE-1/2/L F1 of the candidate's summaries against the baseline's summaries
+
+Articles are read from the text fixtures (benchmarks/fixtures/articles) or from a stage file
+("Content" column) given with --stage-file, e.g. a downloaded 1_raw/*.parquet.
+
+Usage (from the Lambda folder):
+    pip install -r requirements.txt -r scripts/requirements.txt
+    python scripts/compare_backends.py --backend pytorch-int8
+    python scripts/compare_backends.py --backend onnx --model-dir ./bart-large-cnn-onnx --stage-file 1_raw.parquet --limit 20
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.dirname(SCRIPTS_DIR)
+sys.path.insert(0, LAMBDA_DIR)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-north-1')
+os.environ.setdefault('OPENAI_API_KEY', 'unused')
+
+ARTICLE_FIXTURES_DIR = os.path.join(LAMBDA_DIR, 'benchmarks', 'fixtures', 'articles')
+DEFAULT_MODEL_DIRS = {
+    'pytorch': os.path.join(LAMBDA_DIR, 'bart-large-cnn'),
+    'pytorch-int8': os.path.join(LAMBDA_DIR, 'bart-large-cnn-int8'),
+    'onnx': os.path.join(LAMBDA_DIR, 'bart-large-cnn-onnx')
+}
+# Environment variable holding the model folder of each backend in lambda_function.py
+MODEL_DIR_VARIABLES = {'pytorch': 'MODEL_PATH', 'pytorch-int8': 'INT8_MODEL_PATH', 'onnx': 'ONNX_MODEL_PATH'}
+
+def load_articles(stage_file, limit):
+    if stage_file:
+        import stage_format
+        with open(stage_file, 'rb') as f:
+            df = stage_format.decode_frame(f.read(), stage_file)
+        articles = df['Content'].dropna().tolist()
+    else:
+        articles = []
+        for file_name in sorted(os.listdir(ARTICLE_FIXTURES_DIR)):
+            with open(os.path.join(ARTICLE_FIXTURES_DIR, file_name), encoding='utf-8') as f:
+                articles.append(f.read())
+    return articles[:limit] if limit else articles
+
+def run_worker(backend, model_dir, stage_file, limit):
+    """
+    Summarize the articles one by one with a single backend and print the results as JSON.
+    """
+    os.environ['SUMMARIZER_BACKEND'] = backend
+    os.environ[MODEL_DIR_VARIABLES[backend]] = model_dir
+    import lambda_function
+
+    articles = load_articles(stage_file, limit)
+    summarizer = lambda_function.get_summarizer()
+    tokenizer = lambda_function.get_tokenizer()
+
+    summaries = []
+    timings = []
+    for text in articles:
+        start = time.perf_counter()
+        summaries.append(lambda_function.generate_summary(text, summarizer, tokenizer))
+        timings.append((time.perf_counter() - start) * 1000)
+
+    print(json.dumps({
+        'backend': backend,
+        'load_s': sum(lambda_function.MODEL_LOAD_TIMINGS.values()),
+        'mean_ms': statistics.mean(timings),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KB on Linux
+        'summaries': summaries
+    }))
+
+def run_backend(backend, model_dir, args):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--backend', backend, '--model-dir', model_dir]
+    if args.stage_file:
+        command += ['--stage-file', args.stage_file]
+    if args.limit:
+        command += ['--limit', str(args.limit)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def rouge_f1(references, candidates):
+    from rouge_score import rouge_scorer
+    scorer = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
+    scores = [scorer.score(reference, candidate) for reference, candidate in zip(references, candidates)]
+    return {name: statistics.mean(score[name].fmeasure for score in scores) for name in ['rouge1', 'rouge2', 'rougeL']}
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--backend', required=True, choices=sorted(MODEL_DIR_VARIABLES))
+    arg_parser.add_argument('--model-dir', help="artifact folder of the backend")
+    arg_parser.add_argument('--baseline-dir', default=DEFAULT_MODEL_DIRS['pytorch'], help="full-precision model folder")
+    arg_parser.add_argument('--stage-file', help="Parquet or CSV stage file to take the articles from")
+    arg_parser.add_argument('--limit', type=int, help="summarize at most this many articles")
+    arg_parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    model_dir = args.model_dir or DEFAULT_MODEL_DIRS[args.backend]
+    if args.worker:
+        run_worker(args.backend, model_dir, args.stage_file, args.limit)
+        return
+
+    baseline = run_backend('pytorch', args.baseline_dir, args)
+    candidate = run_backend(args.backend, model_dir, args)
+
+    print(f"{'backend':<16}{'load s':>9}{'ms/summary':>12}{'peak MB':>10}")
+    for result in (baseline, candidate):
+        print(f"{result['backend']:<16}{result['load_s']:>9.1f}{result['mean_ms']:>12.0f}{result['peak_rss_mb']:>10.0f}")
+
+    scores = rouge_f1(baseline['summaries'], candidate['summaries'])
+    print(f"\nROUGE F1 of {args.backend} against pytorch over {len(baseline['summaries'])} articles: "
+          + ", ".join(f"{name} {value:.3f}" for name, value in scores.items()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Report how well the local topic classifier agrees with the LLM backend. The reference is the
+topic1/topic2 the LLM assigned to the articles in ingestion.news_articles (or a CSV export).
+By default it evaluates on the newest share of the articles that training held out, as recorded
+in the centroids file, so none of them were seen in training.
+
+Reported:
+    - topic_1 agreement: local topic_1 == LLM topic1
+    - topic_1 in LLM pair: local topic_1 is one of the LLM's two topics
+    - pair overlap: share of the local pair that is in the LLM pair (order ignored)
+    - per-topic topic_1 agreement
+    - time per article of the embedding and of the centroid scoring
+
+Usage (from the Lambda folder, after scripts/train_topic_classifier.py):
+    python scripts/evaluate_topic_classifier.py [--test-share 0.1] [--csv final_data_for_flask.csv]
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.dirname(SCRIPTS_DIR)
+sys.path.insert(0, LAMBDA_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+import topic_embeddings
+from train_topic_classifier import DEFAULT_TEST_SHARE, load_labelled_articles, split_train_test
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--csv', help="CSV export with content, topic1 and topic2 columns instead of Redshift")
+    arg_parser.add_argument('--model', default=os.path.join(LAMBDA_DIR, 'all-MiniLM-L6-v2'))
+    arg_parser.add_argument('--centroids', default=os.path.join(LAMBDA_DIR, 'topic_centroids.npz'))
+    arg_parser.add_argument('--test-share', type=float, help="newest share of the articles to evaluate on (default: the share training held out)")
+    args = arg_parser.parse_args()
+
+    held_out = topic_embeddings.load_test_share(args.centroids)
+    if held_out is None:
+        print(f"Warning: {args.centroids} doesn't record its training split; assuming --test-share {DEFAULT_TEST_SHARE} was held out")
+        held_out = DEFAULT_TEST_SHARE
+    test_share = held_out if args.test_share is None else args.test_share
+    if test_share > held_out:
+        print(f"Warning: evaluating on the newest {test_share:.0%} of the articles, but training only held out {held_out:.0%}; "
+              f"the agreement is inflated by articles the centroids were trained on")
+
+    _, test = split_train_test(load_labelled_articles(args.csv), test_share)
+    if test.empty:
+        print("No articles to evaluate on.")
+        return
+    classifier = topic_embeddings.EmbeddingTopicClassifier(args.model, args.centroids)
+
+    start = time.perf_counter()
+    embeddings = classifier.embed(test['content'].tolist())
+    embed_s = time.perf_counter() - start
+    start = time.perf_counter()
+    predictions = classifier.classify_embeddings(embeddings)
+    score_s = time.perf_counter() - start
+
+    first_agree = 0
+    first_in_pair = 0
+    overlap = 0
+    totals = Counter()
+    agreements = Counter()
+    for (topic_1, topic_2), llm_1, llm_2 in zip(predictions, test['topic1'], test['topic2']):
+        totals[llm_1] += 1
+        if topic_1 == llm_1:
+            first_agree += 1
+            agreements[llm_1] += 1
+        first_in_pair += topic_1 in (llm_1, llm_2)
+        overlap += len({topic_1, topic_2} & {llm_1, llm_2}) / 2
+
+    n = len(test)
+    print(f"Evaluated on the newest {n} articles")
+    print(f"topic_1 agreement     {first_agree / n:.1%}")
+    print(f"topic_1 in LLM pair   {first_in_pair / n:.1%}")
+    print(f"pair overlap          {overlap / n:.1%}")
+    print(f"embedding             {embed_s / n * 1000:.1f} ms/article")
+    print(f"centroid scoring      {score_s / n * 1e6:.1f} µs/article")
+    print("\nPer topic (LLM topic1, articles, topic_1 agreement):")
+    for topic in classifier.topics:
+        if totals[topic]:
+            print(f"  {topic:<30}{totals[topic]:>6}{agreements[topic] / totals[topic]:>8.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Build the model artifact of a summarizer backend from the full-precision bart-large-cnn files.
+The output folder is copied into the image next to lambda_function.py (Dockerfile: COPY . .)
+and selected with SUMMARIZER_BACKEND; its path defaults to what lambda_function.py expects.
+
+    pytorch-int8  ./bart-large-cnn-int8  Linear layers dynamically quantized to int8
+    onnx          ./bart-large-cnn-onnx  ONNX export plus int8-quantized graphs (--no-quantize to skip)
+
+Usage (from the Lambda folder, with the model files in ./bart-large-cnn):
+    pip install -r requirements.txt -r scripts/requirements.txt
+    python scripts/export_summarizer.py --backend pytorch-int8
+    python scripts/export_summarizer.py --backend onnx [--output DIR] [--no-quantize]
+
+Check the artifact with scripts/compare_backends.py before deploying it. An onnx image is built with
+`docker build --build-arg SUMMARIZER_BACKEND=onnx .`, which also installs requirements-onnx.txt. When a backend other than
+pytorch is deployed, ./bart-large-cnn can be added to .dockerignore to keep the image small.
+"""
+import argparse
+import os
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.dirname(SCRIPTS_DIR)
+sys.path.insert(0, LAMBDA_DIR)
+
+import summarizer_backends
+
+DEFAULT_OUTPUTS = {
+    'pytorch-int8': os.path.join(LAMBDA_DIR, 'bart-large-cnn-int8'),
+    'onnx': os.path.join(LAMBDA_DIR, 'bart-large-cnn-onnx')
+}
+
+def folder_size_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1024 / 1024
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--backend', required=True, choices=sorted(DEFAULT_OUTPUTS))
+    arg_parser.add_argument('--model', default=os.path.join(LAMBDA_DIR, 'bart-large-cnn'), help="full-precision model folder")
+    arg_parser.add_argument('--output', help="artifact folder (default: ./bart-large-cnn-int8 or ./bart-large-cnn-onnx)")
+    arg_parser.add_argument('--no-quantize', action='store_true', help="onnx: keep only the full-precision graphs")
+    args = arg_parser.parse_args()
+
+    output = args.output or DEFAULT_OUTPUTS[args.backend]
+    start = time.perf_counter()
+    if args.backend == 'pytorch-int8':
+        summarizer_backends.export_pytorch_int8(args.model, output)
+    else:
+        summarizer_backends.export_onnx(args.model, output, quantize=not args.no_quantize)
+    print(f"Wrote the {args.backend} artifact to {output} ({folder_size_mb(output):.0f} MB) in {time.perf_counter() - start:.0f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint, to exercise topic_classifier.py
+without network access or cost. Every article gets a deterministic pair of topics derived
+from a hash of its text; JSON batch requests get a JSON answer.
+
+Usage:
+    python scripts/mock_openai_server.py [--port 8080] [--latency 0.5] [--rate-limit-every 5]
+    OPENAI_API_BASE=http://localhost:8080/v1 OPENAI_API_KEY=mock python lambda_function.py ...
+
+--rate-limit-every N answers every Nth request with 429 and a Retry-After header,
+to check the retry path.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from topic_classifier import TOPICS
+
+def topics_of(article):
+    digest = hashlib.sha256(article.encode('utf-8')).digest()
+    topic_1 = TOPICS[digest[0] % len(TOPICS)]
+    topic_2 = TOPICS[(digest[0] + 1 + digest[1] % (len(TOPICS) - 1)) % len(TOPICS)]
+    return topic_1, topic_2
+
+def answer(request):
+    prompt = request['messages'][-1]['content']
+    if request.get('response_format', {}).get('type') == 'json_object':
+        articles = re.split(r'\n\nArticle \d+: ', prompt.split('Article 0: ', 1)[1])
+        results = [{'id': i, 'topic1': topics_of(a)[0], 'topic2': topics_of(a)[1]} for i, a in enumerate(articles)]
+        return json.dumps({'results': results})
+    return "-".join(topics_of(prompt.split('Article: ', 1)[1]))
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    rate_limit_every = 0
+    requests_seen = 0
+    lock = threading.Lock()
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.endswith('/chat/completions'):
+            self.send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.lock:
+            MockOpenAIHandler.requests_seen += 1
+            number = MockOpenAIHandler.requests_seen
+        if self.rate_limit_every and number % self.rate_limit_every == 0:
+            self.send_json(429, {'error': {'message': "Rate limit reached (mock)", 'type': 'requests'}}, {'Retry-After': '1'})
+            return
+
+        time.sleep(self.latency)
+        self.send_json(200, {
+            'id': f"chatcmpl-mock-{number}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer(request)}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--port', type=int, default=8080)
+    arg_parser.add_argument('--latency', type=float, default=0.5, help="seconds before every answer")
+    arg_parser.add_argument('--rate-limit-every', type=int, default=0, help="answer every Nth request with 429")
+    args = arg_parser.parse_args()
+
+    MockOpenAIHandler.latency = args.latency
+    MockOpenAIHandler.rate_limit_every = args.rate_limit_every
+    print(f"Mock OpenAI API on http://localhost:{args.port}/v1")
+    ThreadingHTTPServer(('localhost', args.port), MockOpenAIHandler).serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Train the local topic classifier (TOPIC_BACKEND=embedding) on the articles already labelled by
+the LLM in ingestion.news_articles: every article is embedded, and each topic's centroid is the
+normalised sum of the embeddings of its articles (topic2 counted at half weight).
+
+Writes, next to lambda_function.py so the Dockerfile bakes them into the image:
+    ./all-MiniLM-L6-v2       the embedding model (EMBEDDING_MODEL_PATH)
+    ./topic_centroids.npz    the topic centroids (TOPIC_CENTROIDS_PATH)
+
+Usage (from the Lambda folder):
+    pip install -r requirements.txt -r scripts/requirements.txt
+    REDSHIFT_HOST=... REDSHIFT_PORT=... REDSHIFT_DBNAME=... REDSHIFT_USER=... REDSHIFT_PASSWORD=... \\
+        python scripts/train_topic_classifier.py
+    python scripts/train_topic_classifier.py --csv final_data_for_flask.csv   # from an export instead
+
+Check the result with scripts/evaluate_topic_classifier.py before deploying it.
+"""
+import argparse
+import os
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.dirname(SCRIPTS_DIR)
+sys.path.insert(0, LAMBDA_DIR)
+
+import pandas as pd
+from transformers import AutoModel, AutoTokenizer
+import topic_embeddings
+from topic_classifier import TOPICS
+
+LABELLED_ARTICLES_QUERY = """SELECT content, topic1, topic2, publish_date
+                             FROM ingestion.news_articles
+                             WHERE content IS NOT NULL
+                             AND topic1 IS NOT NULL
+                             AND topic2 IS NOT NULL
+                             ORDER BY publish_date;"""
+
+def load_labelled_articles(csv_path=None):
+    """
+    Return the labelled articles (content, topic1, topic2 columns) oldest first, from Redshift or a CSV export.
+    """
+    if csv_path:
+        df = pd.read_csv(csv_path)
+        df = df.sort_values('publish_date') if 'publish_date' in df else df
+    else:
+        import psycopg2
+        conn = psycopg2.connect(
+            dbname=os.environ['REDSHIFT_DBNAME'],
+            user=os.environ['REDSHIFT_USER'],
+            password=os.environ['REDSHIFT_PASSWORD'],
+            host=os.environ['REDSHIFT_HOST'],
+            port=os.environ['REDSHIFT_PORT']
+        )
+        try:
+            cursor = conn.cursor()
+            cursor.execute(LABELLED_ARTICLES_QUERY)
+            df = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+        finally:
+            conn.close()
+    df = df.dropna(subset=['content', 'topic1', 'topic2'])
+    for column in ['topic1', 'topic2']:
+        df[column] = df[column].str.strip()
+    return df.reset_index(drop=True)
+
+# Newest share of the labelled articles held out of training for scripts/evaluate_topic_classifier.py
+DEFAULT_TEST_SHARE = 0.2
+
+def split_train_test(df, test_share):
+    """
+    Hold out the most recent test_share of the articles, so the evaluation sees articles newer than the training set.
+    """
+    split = int(len(df) * (1 - test_share))
+    return df.iloc[:split], df.iloc[split:]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--csv', help="CSV export with content, topic1 and topic2 columns instead of Redshift")
+    arg_parser.add_argument('--embedding-model', default=topic_embeddings.DEFAULT_EMBEDDING_MODEL, help="Hub id or path")
+    arg_parser.add_argument('--model-output', default=os.path.join(LAMBDA_DIR, 'all-MiniLM-L6-v2'))
+    arg_parser.add_argument('--output', default=os.path.join(LAMBDA_DIR, 'topic_centroids.npz'))
+    arg_parser.add_argument('--test-share', type=float, default=DEFAULT_TEST_SHARE,
+                            help=f"newest share of the articles left out of training (default {DEFAULT_TEST_SHARE}, 0 to train on all)")
+    args = arg_parser.parse_args()
+
+    df = load_labelled_articles(args.csv)
+    train, _ = split_train_test(df, args.test_share)
+    print(f"Training on {len(train)} of {len(df)} labelled articles")
+
+    tokenizer = AutoTokenizer.from_pretrained(args.embedding_model)
+    model = AutoModel.from_pretrained(args.embedding_model).eval()
+    start = time.perf_counter()
+    embeddings = topic_embeddings.embed_texts(tokenizer, model, train['content'].tolist())
+    print(f"Embedded the articles in {time.perf_counter() - start:.0f} s")
+
+    centroids = topic_embeddings.train_centroids(embeddings, train['topic1'], train['topic2'], TOPICS)
+    unseen = [topic for topic, centroid in zip(TOPICS, centroids) if not centroid.any()]
+    if unseen:
+        print(f"Warning: no training articles for {', '.join(unseen)}")
+
+    topic_embeddings.save_centroids(args.output, TOPICS, centroids, args.embedding_model, args.test_share)
+    tokenizer.save_pretrained(args.model_output)
+    model.save_pretrained(args.model_output)
+    print(f"Wrote {args.output} and {args.model_output}")
+
+if __name__ == '__main__':
+    main()
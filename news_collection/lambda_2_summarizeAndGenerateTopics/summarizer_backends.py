@@ -0,0 +1,101 @@
+import glob
+import os
+import torch
+from transformers import AutoConfig, AutoModelForSeq2SeqLM, AutoTokenizer, GenerationConfig
+
+# Inference backends of the summarizer. Every loader returns a model with a transformers-style generate():
+#   pytorch       full-precision model as published (the baseline)
+#   pytorch-int8  Linear layers dynamically quantized to int8 weights; activations are quantized on the fly
+#   onnx          model exported to ONNX and run with ONNX Runtime (int8-quantized by default)
+BACKENDS = ('pytorch', 'pytorch-int8', 'onnx')
+
+# Weights of the int8 model, saved next to its config, generation config and tokenizer
+INT8_STATE_DICT_FILE = "quantized_state_dict.pt"
+# Suffix optimum gives the quantized ONNX graphs
+ONNX_QUANTIZED_SUFFIX = "_quantized"
+
+def quantize_dynamic_int8(model):
+    """
+    Replace the Linear layers of a model with dynamically quantized int8 versions.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_pytorch(model_path):
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
+    return model.eval()
+
+def load_pytorch_int8(model_path):
+    """
+    Load an int8 model written by export_pytorch_int8. The quantized module structure is rebuilt
+    from the config and then filled with the stored weights, so the fp32 weights are never read.
+    """
+    model = AutoModelForSeq2SeqLM.from_config(AutoConfig.from_pretrained(model_path))
+    model = quantize_dynamic_int8(model.eval())
+    # Quantized Linear layers store packed parameters that the weights-only unpickler rejects;
+    # the file is an artifact we built ourselves and baked into the image
+    state_dict = torch.load(os.path.join(model_path, INT8_STATE_DICT_FILE), weights_only=False)
+    model.load_state_dict(state_dict)
+    model.generation_config = GenerationConfig.from_pretrained(model_path)
+    return model
+
+def load_onnx(model_path):
+    """
+    Load an ONNX Runtime model written by export_onnx, preferring its quantized graphs when present.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM  # Only needed by this backend
+    except ImportError as e:
+        raise ImportError("The onnx backend needs requirements-onnx.txt (docker build --build-arg SUMMARIZER_BACKEND=onnx)") from e
+
+    file_names = {}
+    for argument, name in [('encoder_file_name', 'encoder_model'), ('decoder_file_name', 'decoder_model'),
+                           ('decoder_with_past_file_name', 'decoder_with_past_model')]:
+        quantized_name = f"{name}{ONNX_QUANTIZED_SUFFIX}.onnx"
+        if os.path.exists(os.path.join(model_path, quantized_name)):
+            file_names[argument] = quantized_name
+    return ORTModelForSeq2SeqLM.from_pretrained(model_path, **file_names)
+
+LOADERS = {
+    'pytorch': load_pytorch,
+    'pytorch-int8': load_pytorch_int8,
+    'onnx': load_onnx
+}
+
+def load_summarizer(backend, model_path):
+    """
+    Load the summarization model of the given backend from its artifact folder.
+    """
+    if backend not in LOADERS:
+        raise ValueError(f"Unknown summarizer backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    return LOADERS[backend](model_path)
+
+def export_pytorch_int8(model_path, output_path):
+    """
+    Quantize the full-precision model in model_path and write the int8 artifact to output_path.
+    """
+    model = quantize_dynamic_int8(load_pytorch(model_path))
+    os.makedirs(output_path, exist_ok=True)
+    torch.save(model.state_dict(), os.path.join(output_path, INT8_STATE_DICT_FILE))
+    model.config.save_pretrained(output_path)
+    model.generation_config.save_pretrained(output_path)
+    AutoTokenizer.from_pretrained(model_path).save_pretrained(output_path)
+
+def export_onnx(model_path, output_path, quantize=True):
+    """
+    Export the model in model_path to ONNX (encoder, decoder and decoder with past key values)
+    and, unless quantize is False, add dynamically int8-quantized copies of the graphs.
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_path, export=True)
+    model.save_pretrained(output_path)
+    AutoTokenizer.from_pretrained(model_path).save_pretrained(output_path)
+
+    if quantize:
+        # AVX2 kernels run on every x86 Lambda host; weights int8, activations quantized at run time
+        quantization_config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        for onnx_file in sorted(glob.glob(os.path.join(output_path, '*.onnx'))):
+            if not onnx_file.endswith(f"{ONNX_QUANTIZED_SUFFIX}.onnx"):
+                quantizer = ORTQuantizer.from_pretrained(output_path, file_name=os.path.basename(onnx_file))
+                quantizer.quantize(save_dir=output_path, quantization_config=quantization_config)
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import openai
+
+logger = logging.getLogger()
+
+# The closed set of topics an article is classified into
+TOPICS = [
+    "Agriculture & Food", "Business & Innovation", "Climate Change", "Crisis & Disasters", "Energy",
+    "Fossil Fuels", "Pollution", "Politics & Law", "Public Health & Environment", "Society & Culture",
+    "Sustainability", "Technology & Science", "Urban & Infrastructure", "Water & Oceans", "Wildlife & Conservation"
+]
+
+TOPIC_MODEL = "gpt-4o-mini"
+# Requests to the API in flight at the same time
+TOPIC_MAX_CONCURRENCY = int(os.environ.get('TOPIC_MAX_CONCURRENCY', 4))
+# Articles classified per request: 1 uses the plain "topic1-topic2" prompt, more use one JSON answer for the batch
+TOPIC_BATCH_SIZE = int(os.environ.get('TOPIC_BATCH_SIZE', 1))
+# Retries of rate-limited or failed requests, with exponential backoff and jitter (or the server's Retry-After)
+TOPIC_MAX_RETRIES = int(os.environ.get('TOPIC_MAX_RETRIES', 5))
+TOPIC_BACKOFF_BASE = float(os.environ.get('TOPIC_BACKOFF_BASE', 1.0))
+TOPIC_BACKOFF_MAX = float(os.environ.get('TOPIC_BACKOFF_MAX', 30.0))
+TOPIC_REQUEST_TIMEOUT = float(os.environ.get('TOPIC_REQUEST_TIMEOUT', 60))
+
+# Point the client at another server, e.g. scripts/mock_openai_server.py ("http://localhost:8080/v1")
+if os.environ.get('OPENAI_API_BASE'):
+    openai.api_base = os.environ['OPENAI_API_BASE']
+
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout
+)
+
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are an expert on categorizing articles based on provided topics."
+}
+TOPIC_LIST = ", ".join(f"“{topic}”" for topic in TOPICS)
+
+def topic_messages(article):
+    return [
+        SYSTEM_MESSAGE,
+        {
+            "role": "user",
+            "content": f"""Determine the 2 topics that best fit the news article below from the following list of topics only: 
+                {TOPIC_LIST}.
+                Topic1 is the best fitting topic, and Topic2 is the second best fitting. Return your answer in the following format: topic1-topic2
+                Article: {article}"""
+        }
+    ]
+
+def batch_topic_messages(articles):
+    numbered_articles = "\n\n".join(f"Article {i}: {article}" for i, article in enumerate(articles))
+    return [
+        SYSTEM_MESSAGE,
+        {
+            "role": "user",
+            "content": f"""Determine the 2 topics that best fit each of the news articles below from the following list of topics only:
+                {TOPIC_LIST}.
+                topic1 is the best fitting topic, and topic2 is the second best fitting. Return a JSON object in the following format:
+                {{"results": [{{"id": <article number>, "topic1": "<topic>", "topic2": "<topic>"}}, ...]}}
+                {numbered_articles}"""
+        }
+    ]
+
+def prompt_version(batch_size=TOPIC_BATCH_SIZE):
+    """
+    Hash of the model and the prompt the articles are classified with; changes whenever either does.
+    """
+    messages = topic_messages("") if batch_size <= 1 else batch_topic_messages([""])
+    return hashlib.sha256(json.dumps([TOPIC_MODEL, messages]).encode('utf-8')).hexdigest()
+
+def parse_topics(answer):
+    """
+    Parse a "topic1-topic2" answer into a (topic_1, topic_2) tuple.
+    """
+    topic_1, topic_2 = answer.split('-')
+    return topic_1.strip(), topic_2.strip()
+
+def parse_batch_topics(answer, count):
+    """
+    Parse a JSON batch answer into a list of (topic_1, topic_2) tuples, None for articles missing from it.
+    """
+    topics = [None] * count
+    for result in json.loads(answer).get('results', []):
+        if isinstance(result.get('id'), int) and 0 <= result['id'] < count and result.get('topic1') and result.get('topic2'):
+            topics[result['id']] = (result['topic1'].strip(), result['topic2'].strip())
+    return topics
+
+def retry_delay(error, attempt):
+    """
+    Seconds to wait before the next attempt: the server's Retry-After if it sent one,
+    otherwise exponential backoff with full jitter.
+    """
+    retry_after = (getattr(error, 'headers', None) or {}).get('retry-after')
+    if retry_after:
+        try:
+            return min(float(retry_after), TOPIC_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(TOPIC_BACKOFF_MAX, TOPIC_BACKOFF_BASE * 2 ** attempt))
+
+async def request_topics(messages, semaphore, **kwargs):
+    """
+    Send one chat completion request, at most TOPIC_MAX_CONCURRENCY at a time, retrying
+    rate-limited and transient failures. Returns the content of the answer.
+    """
+    for attempt in range(TOPIC_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                response = await openai.ChatCompletion.acreate(
+                    model=TOPIC_MODEL, messages=messages, request_timeout=TOPIC_REQUEST_TIMEOUT, **kwargs
+                )
+            return response['choices'][0]['message']['content']
+        except RETRYABLE_ERRORS as e:
+            if attempt == TOPIC_MAX_RETRIES:
+                raise
+            delay = retry_delay(e, attempt)
+            logger.warning(f"Topic request failed ({type(e).__name__}), retrying in {delay:.1f} s")
+            await asyncio.sleep(delay)
+
+async def classify_article(article, semaphore):
+    return parse_topics(await request_topics(topic_messages(article), semaphore))
+
+async def classify_batch(articles, semaphore):
+    """
+    Classify several articles with one JSON request; articles the answer leaves out are classified one by one,
+    and so are all of them if the answer isn't the expected JSON object.
+    """
+    answer = await request_topics(batch_topic_messages(articles), semaphore, response_format={"type": "json_object"})
+    try:
+        topics = parse_batch_topics(answer, len(articles))
+    except (ValueError, AttributeError, TypeError) as e:
+        logger.warning(f"Unusable batch topic answer ({type(e).__name__}: {e}), classifying {len(articles)} articles one by one")
+        topics = [None] * len(articles)
+    for i, article in enumerate(articles):
+        if topics[i] is None:
+            topics[i] = await classify_article(article, semaphore)
+    return topics
+
+async def classify_topics_async(articles, batch_size=TOPIC_BATCH_SIZE):
+    semaphore = asyncio.Semaphore(TOPIC_MAX_CONCURRENCY)
+    if batch_size <= 1:
+        return list(await asyncio.gather(*(classify_article(article, semaphore) for article in articles)))
+
+    batches = [articles[i:i + batch_size] for i in range(0, len(articles), batch_size)]
+    results = await asyncio.gather(*(classify_batch(batch, semaphore) for batch in batches))
+    return [topics for batch_topics in results for topics in batch_topics]
+
+def classify_topics(articles, batch_size=TOPIC_BATCH_SIZE):
+    """
+    Classify the articles concurrently. Returns a list of (topic_1, topic_2) tuples in the order of the articles.
+    """
+    return asyncio.run(classify_topics_async(list(articles), batch_size))
@@ -0,0 +1,86 @@
+import numpy as np
+import torch
+from transformers import AutoModel, AutoTokenizer
+
+# Sentence embedding model; the centroids only fit the model they were trained with
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Tokens of an article that go into its embedding (title and lead carry most of the topic)
+EMBEDDING_MAX_TOKENS = 256
+EMBEDDING_BATCH_SIZE = 32
+# Weight of an article's second topic when the centroids are trained (the first one counts 1)
+SECONDARY_TOPIC_WEIGHT = 0.5
+
+class EmbeddingTopicClassifier:
+    """
+    Classifies articles into the closed topic set without any network call: each article is embedded
+    and its two most similar topic centroids (cosine similarity) are its topic_1 and topic_2.
+    """
+
+    def __init__(self, model_path, centroids_path):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.model = AutoModel.from_pretrained(model_path).eval()
+        data = np.load(centroids_path)
+        self.topics = [str(topic) for topic in data['topics']]
+        self.centroids = normalize(data['centroids'].astype(np.float32))
+
+    def embed(self, texts):
+        """
+        Return the L2-normalised mean-pooled embeddings of the texts as a (len(texts), dim) array.
+        """
+        return embed_texts(self.tokenizer, self.model, texts)
+
+    def classify_embeddings(self, embeddings):
+        """
+        Return the (topic_1, topic_2) of every embedding, scoring the whole batch in one matrix product.
+        """
+        scores = embeddings @ self.centroids.T
+        top_two = np.argsort(-scores, axis=1)[:, :2]
+        return [(self.topics[first], self.topics[second]) for first, second in top_two]
+
+    def classify(self, texts):
+        return self.classify_embeddings(self.embed(list(texts)))
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def embed_texts(tokenizer, model, texts, max_tokens=EMBEDDING_MAX_TOKENS, batch_size=EMBEDDING_BATCH_SIZE):
+    embeddings = []
+    for i in range(0, len(texts), batch_size):
+        features = tokenizer(texts[i:i + batch_size], max_length=max_tokens, truncation=True, padding=True, return_tensors='pt')
+        with torch.inference_mode():
+            token_embeddings = model(**features).last_hidden_state
+        # Mean over the real tokens of each text, ignoring padding
+        mask = features['attention_mask'].unsqueeze(-1).to(token_embeddings.dtype)
+        pooled = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        embeddings.append(pooled.numpy())
+    if not embeddings:
+        return np.zeros((0, model.config.hidden_size), dtype=np.float32)
+    return normalize(np.concatenate(embeddings).astype(np.float32))
+
+def train_centroids(embeddings, topics_1, topics_2, topics, secondary_weight=SECONDARY_TOPIC_WEIGHT):
+    """
+    Compute one normalised centroid per topic from labelled article embeddings. Labels outside
+    the topic set are ignored; a topic without any article gets a zero centroid and never wins.
+    """
+    index = {topic: i for i, topic in enumerate(topics)}
+    sums = np.zeros((len(topics), embeddings.shape[1]), dtype=np.float64)
+    for embedding, topic_1, topic_2 in zip(embeddings, topics_1, topics_2):
+        if topic_1 in index:
+            sums[index[topic_1]] += embedding
+        if topic_2 in index:
+            sums[index[topic_2]] += secondary_weight * embedding
+    return normalize(sums).astype(np.float32)
+
+def save_centroids(path, topics, centroids, model_name, test_share):
+    """
+    Save the centroids with the model they fit and the newest share of the articles held out of training.
+    """
+    np.savez(path, topics=np.array(topics), centroids=centroids, model=np.array(model_name), test_share=np.array(test_share))
+
+def load_test_share(path):
+    """
+    Return the share of the newest articles held out when the centroids were trained, or None if the file doesn't record it.
+    """
+    data = np.load(path)
+    return float(data['test_share']) if 'test_share' in data.files else None
@@ -0,0 +1,61 @@
+import io
+import os
+import time
+from PIL import Image
+
+# Output of the generated images:
+#   passthrough  the PNG returned by Stability AI is uploaded as is (no decode, no encode)
+#   jpeg         one progressive JPEG encode (default)
+#   webp         one WebP encode
+OUTPUT_FORMATS = ('passthrough', 'jpeg', 'webp')
+IMAGE_OUTPUT_FORMAT = os.environ.get('IMAGE_OUTPUT_FORMAT', 'jpeg')
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 80))
+# Largest encoded size in bytes (0: no cap); the quality is lowered in IMAGE_QUALITY_STEP steps,
+# down to IMAGE_MIN_QUALITY, until the image fits
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 0))
+IMAGE_MIN_QUALITY = int(os.environ.get('IMAGE_MIN_QUALITY', 50))
+IMAGE_QUALITY_STEP = 8
+# Images wider than this are downscaled, keeping their aspect ratio, before encoding (0: keep the generated 1024x650)
+IMAGE_MAX_WIDTH = int(os.environ.get('IMAGE_MAX_WIDTH', 0))
+
+def encode(img, output_format, quality):
+    buffer = io.BytesIO()
+    if output_format == 'webp':
+        img.save(buffer, format='WEBP', quality=quality, method=4)
+    else:
+        img.save(buffer, format='JPEG', quality=quality, progressive=True)  # Progressive scans come with optimized Huffman tables
+    return buffer.getvalue()
+
+def process_image(png_bytes, output_format=IMAGE_OUTPUT_FORMAT, quality=IMAGE_QUALITY,
+                  max_bytes=IMAGE_MAX_BYTES, max_width=IMAGE_MAX_WIDTH):
+    """
+    Turn the PNG bytes of a generated image into the bytes to upload.
+    Returns the bytes and a dict with the format, the quality used, the input and output sizes
+    in bytes and the processing time in milliseconds.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown image output format {output_format!r}, expected one of {', '.join(OUTPUT_FORMATS)}")
+
+    start = time.perf_counter()
+    if output_format == 'passthrough':
+        data = png_bytes
+        quality = None
+    else:
+        img = Image.open(io.BytesIO(png_bytes))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if max_width and img.width > max_width:
+            img = img.resize((max_width, round(img.height * max_width / img.width)), Image.Resampling.LANCZOS)
+        data = encode(img, output_format, quality)
+        while max_bytes and len(data) > max_bytes and quality > IMAGE_MIN_QUALITY:
+            quality = max(quality - IMAGE_QUALITY_STEP, IMAGE_MIN_QUALITY)
+            data = encode(img, output_format, quality)
+
+    stats = {
+        'format': output_format,
+        'quality': quality,
+        'input_bytes': len(png_bytes),
+        'output_bytes': len(data),
+        'encode_ms': (time.perf_counter() - start) * 1000
+    }
+    return data, stats
@@ -1,10 +1,13 @@
 import os
-import pandas as pd
 import boto3
-from datetime import datetime
-from PIL import Image
-import io
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import image_postprocessing
+import near_duplicates
+import result_cache
+import s3_storage
+import stage_format
 import warnings
 from stability_sdk import client
 import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
@@ -18,12 +21,53 @@ logger.setLevel(logging.INFO)
 # AWS S3 client initialization
 s3_client = boto3.client('s3')
 
+# Images generated at the same time (every one is a 30-step SDXL request) and uploaded to Cloudinary at the same time.
+# Generation and upload run in separate pools, so finished images are uploaded while the next ones are generated.
+# The Cloudinary uploader keeps one connection per host alive, which a single upload worker reuses for every upload;
+# an upload takes a fraction of a generation, so that one keeps up. More upload workers open a connection each.
+IMAGE_GENERATION_CONCURRENCY = int(os.environ.get('IMAGE_GENERATION_CONCURRENCY', 4))
+IMAGE_UPLOAD_CONCURRENCY = int(os.environ.get('IMAGE_UPLOAD_CONCURRENCY', 1))
+
+# API endpoints; point them at scripts/mock_image_backends.py ("localhost:50051", "http://localhost:8081") to run offline
+STABILITY_HOST = os.environ.get('STABILITY_HOST', "grpc.stability.ai:443")
+CLOUDINARY_UPLOAD_PREFIX = os.environ.get('CLOUDINARY_UPLOAD_PREFIX')
+
+# Generation settings; together with the prompt they decide the image
+IMAGE_ENGINE = "stable-diffusion-xl-1024-v1-0"
+IMAGE_GENERATION_PARAMS = {
+    'steps': 30,
+    'cfg_scale': 8.0,
+    'width': 1024,
+    'height': 650,
+    'style_preset': "analog-film"
+}
+
+# Cloudinary URLs of generated images are cached by a hash of the prompt and everything else that decides the
+# uploaded image (see result_cache.py), so rerunning or backfilling a file generates nothing that exists already.
+# Every URL is a small object under IMAGE_CACHE_PREFIX in the bucket, so an invocation only reads the entries of
+# its own articles and writes the new ones; the titles used for near-duplicate reuse are kept as one list of the
+# latest entries. An empty IMAGE_CACHE_PREFIX disables the cache. Old entries are expired by a lifecycle rule.
+IMAGE_CACHE_PREFIX = os.environ.get('IMAGE_CACHE_PREFIX', "cache/images/")
+IMAGE_CACHE_VERSION = result_cache.version_of(
+    os.environ.get('IMAGE_CACHE_VERSION', '1'), IMAGE_ENGINE, sorted(IMAGE_GENERATION_PARAMS.items()),
+    image_postprocessing.IMAGE_OUTPUT_FORMAT, image_postprocessing.IMAGE_QUALITY, image_postprocessing.IMAGE_MAX_BYTES,
+    image_postprocessing.IMAGE_MAX_WIDTH, os.environ.get('CLOUDINARY_CLOUD_NAME'), CLOUDINARY_UPLOAD_PREFIX
+)
+# Optionally an article reuses the image of an earlier article whose title is nearly the same (the same story
+# from two feeds): titles are compared by shingle similarity against this batch and the most recent cached titles
+IMAGE_REUSE_NEAR_DUPLICATES = os.environ.get('IMAGE_REUSE_NEAR_DUPLICATES', 'false').lower() == 'true'
+IMAGE_NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('IMAGE_NEAR_DUPLICATE_THRESHOLD', 0.7))
+IMAGE_NEAR_DUPLICATE_CANDIDATES = int(os.environ.get('IMAGE_NEAR_DUPLICATE_CANDIDATES', 2000))
+# The image cache of the current invocation, None while it is disabled
+_image_cache = None
+
 # Stability AI and Cloudinary setup
 def setup_ai_tools():
     stability_api = client.StabilityInference(
+        host=STABILITY_HOST,
         key=os.environ['STABILITY_API_KEY'],
         verbose=True,
-        engine="stable-diffusion-xl-1024-v1-0"
+        engine=IMAGE_ENGINE
     )
     return stability_api
 
@@ -34,26 +78,42 @@ def configure_cloudinary():
         api_key=os.environ['CLOUDINARY_API_KEY'],
         api_secret=os.environ['CLOUDINARY_API_SECRET']
     )
+    if CLOUDINARY_UPLOAD_PREFIX:
+        cloudinary.config(upload_prefix=CLOUDINARY_UPLOAD_PREFIX)
+
+# Open the image cache of the bucket; entries are read from S3 when they are looked up
+def open_image_cache(bucket_name):
+    global _image_cache
+    if not IMAGE_CACHE_PREFIX:
+        return None
+    _image_cache = result_cache.S3ResultCache(
+        s3_client, bucket_name, IMAGE_CACHE_PREFIX, recent_limits={'image_titles': IMAGE_NEAR_DUPLICATE_CANDIDATES}
+    )
+    return _image_cache
 
-# Fetch CSV from S3 and load it into a DataFrame
-def fetch_csv_from_s3(bucket_name, csv_key):
-    local_csv_path = f"/tmp/{os.path.basename(csv_key)}"
-    s3_client.download_file(bucket_name, csv_key, local_csv_path)
-    df = pd.read_csv(local_csv_path)
-    return df
+# Log the hits and misses of the invocation and write back the list of recent titles if it has new entries;
+# the URLs were already written when they were uploaded
+def close_image_cache(bucket_name):
+    global _image_cache
+    if _image_cache is None:
+        return
+    cache, _image_cache = _image_cache, None
+    logger.info(f"Image cache: {cache.summary() or 'not used'}")
+    cache.close()
+
+# Fetch the stage file (Parquet or CSV) from S3 and load it into a DataFrame in memory
+def fetch_frame_from_s3(bucket_name, key):
+    return stage_format.read_stage_frame(s3_client, bucket_name, key)
+
+# Prompt of the image of an article
+def build_prompt(title, summary):
+    return f"Create a single colored realistic image for an environmental news website. The title is: {title}. The content is: {summary}. The image should feature warm, low-contrast, matte, natural colors, very soft lighting and highlights, and a slightly desaturated pastel color palette, capturing an authentic, documentary-like atmosphere."
 
 # Generate an image based on the title and summary using Stability AI
 def generate_image(stability_api, title, summary):
-    prompt = f"Create a single colored realistic image for an environmental news website. The title is: {title}. The content is: {summary}. The image should feature warm, low-contrast, matte, natural colors, very soft lighting and highlights, and a slightly desaturated pastel color palette, capturing an authentic, documentary-like atmosphere."
+    prompt = build_prompt(title, summary)
     try:
-        response = stability_api.generate(
-            prompt=prompt, 
-            steps=30, 
-            cfg_scale=8.0, 
-            width=1024, 
-            height=650, 
-            style_preset="analog-film"
-        )
+        response = stability_api.generate(prompt=prompt, **IMAGE_GENERATION_PARAMS)
         
         for resp in response:
             for artifact in resp.artifacts:
@@ -62,11 +122,13 @@ def generate_image(stability_api, title, summary):
                         "Your request activated the API's safety filters and could not be processed."
                     )
                 if artifact.type == generation.ARTIFACT_IMAGE:
-                    img = Image.open(io.BytesIO(artifact.binary))
-                    jpeg_buffer = io.BytesIO()
-                    img.save(jpeg_buffer, format='JPEG')
-                    jpeg_buffer.seek(0)
-                    return jpeg_buffer.getvalue()  # Return the image as bytes
+                    # Encode the PNG once into the configured output format (or keep it), see image_postprocessing.py
+                    img_data, stats = image_postprocessing.process_image(artifact.binary)
+                    logger.info(
+                        f"Image for title {title}: {stats['input_bytes'] / 1024:.0f} KB PNG -> "
+                        f"{stats['output_bytes'] / 1024:.0f} KB {stats['format']} in {stats['encode_ms']:.0f} ms"
+                    )
+                    return img_data  # Return the image as bytes
 
     except Exception as e:
         logger.error(f"Error generating image for title {title}: {e}")
@@ -87,53 +149,128 @@ def upload_image(img_data, title):
         logger.error(f"Error uploading image: {e}")
         return None
 
-# Save updated DataFrame with new columns to S3
-def save_csv_to_s3(df, bucket_name):
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    csv_filename = f"3_generated_images_{timestamp}.csv"
-    local_csv_path = f"/tmp/{csv_filename}"
-    
-    # Save the DataFrame to a local CSV
-    df.to_csv(local_csv_path, index=False)
-    
-    # Upload the new CSV to the "3_final_with_images" folder in S3
-    s3_key = f"3_generated_images/{csv_filename}"
-    s3_client.upload_file(local_csv_path, bucket_name, s3_key)
-    logger.info(f"Uploaded updated CSV with images to S3: {s3_key}")
+# Decide which articles ((title, summary) pairs) need a new image. Returns the image URLs found in the image cache
+# (None for the others) and a dict mapping each article to generate to the later articles that share its image:
+# the same prompt, or with IMAGE_REUSE_NEAR_DUPLICATES a nearly identical title. A near-duplicate of a cached
+# article gets its URL right away.
+def plan_images(articles):
+    image_urls = [None] * len(articles)
+    keys = [result_cache.content_key(build_prompt(title, summary), IMAGE_CACHE_VERSION) for title, summary in articles]
+    cached = _image_cache.get_many('images', keys) if _image_cache is not None else {}
+
+    near_duplicate_index = None
+    if IMAGE_REUSE_NEAR_DUPLICATES:
+        near_duplicate_index = near_duplicates.NearDuplicateIndex(IMAGE_NEAR_DUPLICATE_THRESHOLD)
+        if _image_cache is not None:
+            for entry in _image_cache.recent('image_titles', IMAGE_NEAR_DUPLICATE_CANDIDATES):
+                near_duplicate_index.add(entry['title'], {'url': entry['url']})
+
+    to_generate = {}
+    first_with_key = {}
+    for index, ((title, _), key) in enumerate(zip(articles, keys)):
+        if key in cached:
+            image_urls[index] = cached[key]
+            continue
+        if key in first_with_key:
+            to_generate[first_with_key[key]].append(index)
+            continue
+        match = near_duplicate_index.find(title) if near_duplicate_index is not None else None
+        if match is not None and 'url' in match:
+            logger.info(f"Reusing the cached image of a near-duplicate title for {title}")
+            image_urls[index] = match['url']
+        elif match is not None:
+            logger.info(f"Sharing the image of {articles[match['row']][0]} with its near-duplicate {title}")
+            to_generate[match['row']].append(index)
+        else:
+            first_with_key[key] = index
+            to_generate[index] = []
+            if near_duplicate_index is not None:
+                near_duplicate_index.add(title, {'row': index})
+    return image_urls, to_generate
+
+# Store the URL of a new image under the prompt of every article that uses it, and the titles for near-duplicate reuse
+def cache_image_url(articles, indices, url):
+    if _image_cache is None or url is None:
+        return
+    prompts = [build_prompt(*articles[index]) for index in indices]
+    _image_cache.put_many('images', {result_cache.content_key(prompt, IMAGE_CACHE_VERSION): url for prompt in prompts})
+    _image_cache.put_many('image_titles', {
+        result_cache.content_key(articles[index][0], IMAGE_CACHE_VERSION): {'title': articles[index][0], 'url': url}
+        for index in indices
+    })
+
+# Generate and upload the images of all articles ((title, summary) pairs) as a pipeline: up to IMAGE_GENERATION_CONCURRENCY
+# generation requests run at once, and every finished image goes straight to the upload pool. Articles with a cached
+# image, or sharing the image of another article, are not generated. Returns the image URLs in the order of the
+# articles; an article whose generation or upload failed gets None without affecting the others.
+def generate_and_upload_images(stability_api, articles):
+    image_urls, to_generate = plan_images(articles)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=IMAGE_GENERATION_CONCURRENCY) as generation_pool, \
+            ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_CONCURRENCY) as upload_pool:
+        generation_futures = {
+            generation_pool.submit(generate_image, stability_api, title, summary): index
+            for index, (title, summary) in enumerate(articles) if index in to_generate
+        }
+        upload_futures = {}
+        for future in as_completed(generation_futures):
+            index = generation_futures[future]
+            try:
+                img_data = future.result()
+            except Exception as e:
+                logger.error(f"Error generating image for row {index}: {e}")
+                continue
+            if img_data:
+                upload_futures[upload_pool.submit(upload_image, img_data, articles[index][0])] = index
+
+        for future in as_completed(upload_futures):
+            index = upload_futures[future]
+            try:
+                url = future.result()
+            except Exception as e:
+                logger.error(f"Error uploading image for row {index}: {e}")
+                continue
+            for sharing_index in [index, *to_generate[index]]:
+                image_urls[sharing_index] = url
+            cache_image_url(articles, [index, *to_generate[index]], url)
+
+    succeeded = sum(url is not None for url in image_urls)
+    logger.info(
+        f"{succeeded} of {len(articles)} articles have an image; generated {len(to_generate)} "
+        f"in {time.perf_counter() - start:.1f} s"
+    )
+    return image_urls
+
+# Save updated DataFrame with new columns to S3 as a new "3_generated_images" stage file
+def save_frame_to_s3(df, bucket_name):
+    s3_key = stage_format.write_stage_frame(s3_client, bucket_name, df, '3_generated_images')
+    logger.info(f"Uploaded updated file with images to S3: {s3_key}")
 
 def process_csv(bucket_name, csv_key):
-    # Step 1: Fetch the uploaded CSV from S3
-    df = fetch_csv_from_s3(bucket_name, csv_key)
+    # Step 1: Fetch the uploaded stage file from S3
+    df = fetch_frame_from_s3(bucket_name, csv_key)
 
     # Step 2: Set up Stability AI and Cloudinary
     stability_api = setup_ai_tools()
     configure_cloudinary()
 
-    # Step 3: Generate images and upload them to Cloudinary
-    image_urls = []
-    
-    for _, row in df.iterrows():
-        title = row['Title']
-        summary = row['Summary']
-        
-        # Generate the image
-        img_data = generate_image(stability_api, title, summary)
-        if img_data:
-            # Upload the image and get the URL
-            img_url = upload_image(img_data, title)
-            image_urls.append(img_url)
-        else:
-            image_urls.append(None)
+    # Step 3: Generate images and upload them to Cloudinary, several at a time
+    image_urls = generate_and_upload_images(stability_api, list(zip(df['Title'], df['Summary'])))
 
     # Step 4: Add the new column 'Image_URL' to the DataFrame
     df['Image_URL'] = image_urls
 
-    # Step 5: Save the updated DataFrame as a new CSV and upload it to S3
-    save_csv_to_s3(df, bucket_name)
+    # Step 5: Save the updated DataFrame as a new stage file in S3
+    save_frame_to_s3(df, bucket_name)
 
 # Lambda function handler
 def lambda_handler(event, context):
     logger.info("Lambda function started")
+
+    # Stage files are no longer written to /tmp; clear any left there by earlier runs of this container
+    removed = s3_storage.remove_stale_tmp_files()
+    if removed:
+        logger.info(f"Removed {removed} stale files from /tmp")
     
     # Get bucket and object information from the S3 event trigger
     bucket_name = event['Records'][0]['s3']['bucket']['name']
@@ -141,7 +278,11 @@ def lambda_handler(event, context):
     
     try:
         # Process the CSV and generate images
-        process_csv(bucket_name, csv_key)
+        open_image_cache(bucket_name)
+        try:
+            process_csv(bucket_name, csv_key)
+        finally:
+            close_image_cache(bucket_name)
         logger.info(f"Successfully processed and updated CSV from {csv_key}.")
         return {"statusCode": 200, "body": "Success"}
     except Exception as e:
@@ -0,0 +1,46 @@
+import re
+
+# Two titles are near-duplicates when the Jaccard similarity of their character shingles reaches the threshold
+SHINGLE_SIZE = 3
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    Return the set of character n-grams of a text, ignoring case, punctuation and spacing.
+    """
+    normalized = _NON_ALNUM.sub(' ', str(text).lower()).strip()
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class NearDuplicateIndex:
+    """
+    Finds the most similar title added so far, such as the same story published by two feeds.
+    A linear scan: a few thousand titles are compared in a few milliseconds.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.entries = []
+
+    def add(self, title, value):
+        self.entries.append((shingles(title), value))
+
+    def find(self, title):
+        """
+        Return the value of the most similar title at or above the threshold, or None.
+        """
+        title_shingles = shingles(title)
+        best_value = None
+        best_similarity = self.threshold
+        for entry_shingles, value in self.entries:
+            similarity = jaccard(title_shingles, entry_shingles)
+            if similarity >= best_similarity:
+                best_value, best_similarity = value, similarity
+        return best_value
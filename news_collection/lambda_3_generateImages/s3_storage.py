@@ -0,0 +1,53 @@
+import glob
+import io
+import os
+from boto3.s3.transfer import TransferConfig
+
+MB = 1024 * 1024
+
+# Objects above the threshold are transferred as concurrent multipart chunks (ranged GETs for downloads)
+MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD_MB', 8)) * MB
+MULTIPART_CHUNKSIZE = int(os.environ.get('S3_MULTIPART_CHUNKSIZE_MB', 8)) * MB
+MAX_TRANSFER_CONCURRENCY = int(os.environ.get('S3_MAX_TRANSFER_CONCURRENCY', 4))
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=MULTIPART_CHUNKSIZE,
+    max_concurrency=MAX_TRANSFER_CONCURRENCY,
+    use_threads=True
+)
+
+# Stage files that earlier versions downloaded to or wrote in /tmp and didn't always remove
+STALE_TMP_PATTERNS = ('/tmp/*.csv', '/tmp/*.parquet')
+
+def read_bytes(s3_client, bucket_name, key):
+    """
+    Download an S3 object straight into memory and return its content as bytes.
+    """
+    buffer = io.BytesIO()
+    s3_client.download_fileobj(bucket_name, key, buffer, Config=TRANSFER_CONFIG)
+    return buffer.getvalue()
+
+def write_bytes(s3_client, bucket_name, key, data, content_type=None):
+    """
+    Upload bytes (or a str, encoded as UTF-8) from memory to S3.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    extra_args = {'ContentType': content_type} if content_type else None
+    s3_client.upload_fileobj(io.BytesIO(data), bucket_name, key, ExtraArgs=extra_args, Config=TRANSFER_CONFIG)
+
+def remove_stale_tmp_files(patterns=STALE_TMP_PATTERNS):
+    """
+    Delete leftover stage files from /tmp so a long-lived warm container doesn't run out of space.
+    Returns the number of deleted files.
+    """
+    removed = 0
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
@@ -0,0 +1,97 @@
+"""
+Compare the image output settings of image_postprocessing.py on a folder of generated PNGs
+(e.g. images saved from Cloudinary or from the Stability API): the average uploaded size and
+processing time per image, next to the former decode + default-quality JPEG re-encode.
+
+Usage (from the Lambda folder):
+    python scripts/compare_image_formats.py PNG_FOLDER [--repeat 3]
+    python scripts/compare_image_formats.py --synthetic 5   # noisy gradients instead of real images
+"""
+import argparse
+import glob
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+import image_postprocessing
+
+SETTINGS = [
+    ('passthrough', {'output_format': 'passthrough'}),
+    ('jpeg q80', {'output_format': 'jpeg', 'quality': 80}),
+    ('jpeg q80 800px', {'output_format': 'jpeg', 'quality': 80, 'max_width': 800}),
+    ('jpeg <=100KB', {'output_format': 'jpeg', 'quality': 80, 'max_bytes': 100 * 1024}),
+    ('webp q80', {'output_format': 'webp', 'quality': 80}),
+    ('webp q80 800px', {'output_format': 'webp', 'quality': 80, 'max_width': 800}),
+]
+
+def legacy_encode(png_bytes):
+    """
+    The former post-processing: decode the PNG and re-encode it as a baseline JPEG with Pillow's defaults.
+    """
+    img = Image.open(io.BytesIO(png_bytes))
+    jpeg_buffer = io.BytesIO()
+    img.save(jpeg_buffer, format='JPEG')
+    return jpeg_buffer.getvalue()
+
+def synthetic_pngs(count, width=1024, height=650):
+    """
+    Noisy color gradients the size of the generated images; noise keeps them from compressing unrealistically well.
+    """
+    pngs = []
+    for i in range(count):
+        gradient = Image.linear_gradient('L').resize((width, height)).rotate(i * 37, expand=False)
+        noise = Image.effect_noise((width, height), 24 + 8 * i)
+        img = Image.merge('RGB', (gradient, noise, Image.blend(gradient, noise, 0.5)))
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG')
+        pngs.append(buffer.getvalue())
+    return pngs
+
+def measure(func, pngs, repeat):
+    sizes = []
+    timings = []
+    for png_bytes in pngs:
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = func(png_bytes)
+            runs.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(data))
+        timings.append(statistics.median(runs))
+    return statistics.mean(sizes), statistics.mean(timings)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('folder', nargs='?', help="folder with generated PNG images")
+    arg_parser.add_argument('--synthetic', type=int, default=0, help="number of synthetic images to use instead")
+    arg_parser.add_argument('--repeat', type=int, default=3, help="timed runs per image")
+    args = arg_parser.parse_args()
+
+    if args.synthetic:
+        pngs = synthetic_pngs(args.synthetic)
+    elif args.folder:
+        pngs = []
+        for path in sorted(glob.glob(os.path.join(args.folder, '*.png'))):
+            with open(path, 'rb') as f:
+                pngs.append(f.read())
+    else:
+        arg_parser.error("pass a PNG folder or --synthetic N")
+    if not pngs:
+        arg_parser.error("no PNG images found")
+
+    png_kb = statistics.mean(len(png_bytes) for png_bytes in pngs) / 1024
+    print(f"{len(pngs)} images, {png_kb:.0f} KB PNG on average\n")
+    print(f"{'setting':<18}{'KB':>8}{'ms':>8}")
+    size, ms = measure(legacy_encode, pngs, args.repeat)
+    print(f"{'former jpeg q75':<18}{size / 1024:>8.0f}{ms:>8.1f}")
+    for name, options in SETTINGS:
+        size, ms = measure(lambda png_bytes: image_postprocessing.process_image(png_bytes, **options)[0], pngs, args.repeat)
+        print(f"{name:<18}{size / 1024:>8.0f}{ms:>8.1f}")
+
+if __name__ == '__main__':
+    main()
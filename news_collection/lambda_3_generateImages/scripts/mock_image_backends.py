@@ -0,0 +1,130 @@
+"""
+Local stand-ins for the Stability AI gRPC generation service and the Cloudinary upload API,
+to exercise lambda_function.py without network access or cost. Every generated image is a
+plain PNG of the requested size, colored by a hash of its prompt.
+
+Usage:
+    python scripts/mock_image_backends.py [--grpc-port 50051] [--http-port 8081] \\
+        [--generation-latency 3] [--upload-latency 0.5] [--fail-every 0]
+    STABILITY_HOST=localhost:50051 CLOUDINARY_UPLOAD_PREFIX=http://localhost:8081 \\
+        STABILITY_API_KEY=mock CLOUDINARY_CLOUD_NAME=mock CLOUDINARY_API_KEY=mock CLOUDINARY_API_SECRET=mock \\
+        python -c "import lambda_function; ..."
+
+--fail-every N aborts every Nth generation request, to check that a failed image only
+leaves its own row without an Image_URL.
+"""
+import argparse
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+from PIL import Image
+import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
+import stability_sdk.interfaces.gooseai.generation.generation_pb2_grpc as generation_grpc
+
+def render_png(prompt, width, height):
+    digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), tuple(digest[:3])).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+class MockGenerationService(generation_grpc.GenerationServiceServicer):
+    latency = 0.0
+    fail_every = 0
+    requests_seen = 0
+    lock = threading.Lock()
+
+    def Generate(self, request, context):
+        with self.lock:
+            MockGenerationService.requests_seen += 1
+            number = MockGenerationService.requests_seen
+        time.sleep(self.latency)
+        if self.fail_every and number % self.fail_every == 0:
+            context.abort(grpc.StatusCode.UNAVAILABLE, "Generation failed (mock)")
+
+        prompt = " ".join(p.text for p in request.prompt)
+        width = request.image.width or 1024
+        height = request.image.height or 1024
+        yield generation.Answer(
+            answer_id=f"mock-{number}",
+            request_id=request.request_id,
+            artifacts=[generation.Artifact(
+                id=1,
+                type=generation.ARTIFACT_IMAGE,
+                mime="image/png",
+                binary=render_png(prompt, width, height),
+                finish_reason=generation.NULL
+            )]
+        )
+
+class MockCloudinaryHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    uploads = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        match = re.match(r'^/v1_1/([^/]+)/image/upload$', self.path)
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if not match:
+            self.send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+            return
+        fields = dict(re.findall(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n', body))
+        public_id = fields.get(b'public_id', b'upload').decode('utf-8')
+        folder = fields.get(b'folder', b'').decode('utf-8').strip('/')
+        full_id = f"{folder}/{public_id}" if folder else public_id
+
+        time.sleep(self.latency)
+        with self.lock:
+            MockCloudinaryHandler.uploads += 1
+        url = f"http://localhost:{self.server.server_port}/{match.group(1)}/image/upload/v1/{full_id}.png"
+        self.send_json(200, {'public_id': full_id, 'bytes': len(body), 'format': 'png', 'url': url, 'secure_url': url})
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_servers(grpc_port, http_port, generation_latency=0.0, upload_latency=0.0, fail_every=0):
+    """
+    Start both mock services in the background. Returns the gRPC server and the HTTP server.
+    """
+    MockGenerationService.latency = generation_latency
+    MockGenerationService.fail_every = fail_every
+    MockCloudinaryHandler.latency = upload_latency
+
+    grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=32))
+    generation_grpc.add_GenerationServiceServicer_to_server(MockGenerationService(), grpc_server)
+    grpc_server.add_insecure_port(f"localhost:{grpc_port}")
+    grpc_server.start()
+
+    http_server = ThreadingHTTPServer(('localhost', http_port), MockCloudinaryHandler)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    return grpc_server, http_server
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--grpc-port', type=int, default=50051)
+    arg_parser.add_argument('--http-port', type=int, default=8081)
+    arg_parser.add_argument('--generation-latency', type=float, default=3.0, help="seconds per generated image")
+    arg_parser.add_argument('--upload-latency', type=float, default=0.5, help="seconds per upload")
+    arg_parser.add_argument('--fail-every', type=int, default=0, help="abort every Nth generation request")
+    args = arg_parser.parse_args()
+
+    grpc_server, _ = start_servers(args.grpc_port, args.http_port, args.generation_latency, args.upload_latency, args.fail_every)
+    print(f"Mock Stability AI on localhost:{args.grpc_port}, mock Cloudinary on http://localhost:{args.http_port}")
+    grpc_server.wait_for_termination()
+
+if __name__ == '__main__':
+    main()
@@ -20,9 +20,29 @@ REDSHIFT_PASSWORD = os.environ['REDSHIFT_PASSWORD']
 # EventBridge client initialization
 eventbridge_client = boto3.client('events')
 
+# Data format options of the COPY command for each stage file format. Parquet carries its own
+# schema and types; text columns of the Parquet files are already cut to the VARCHAR limit by stage 3,
+# and blank strings are already NULL there (what EMPTYASNULL/BLANKSASNULL do for CSV).
+COPY_FORMAT_OPTIONS = {
+    'csv': """CSV
+    IGNOREHEADER 1
+    DELIMITER ','
+    TIMEFORMAT 'auto'
+    TRUNCATECOLUMNS
+    EMPTYASNULL
+    BLANKSASNULL""",
+    'parquet': "FORMAT AS PARQUET"
+}
+
+def copy_file_format(key):
+    """
+    Return the format of a stage file ('parquet' or 'csv') from its extension.
+    """
+    return 'parquet' if key.endswith('.parquet') else 'csv'
+
 def copy_csv_to_redshift(bucket_name, csv_key):
     """
-    Load CSV from S3 into Redshift using COPY command.
+    Load a stage file (Parquet or CSV) from S3 into Redshift using COPY command.
     """
     # Build the S3 file path
     s3_file_path = f"s3://{bucket_name}/{csv_key}"
@@ -32,14 +52,8 @@ def copy_csv_to_redshift(bucket_name, csv_key):
     COPY ingestion.news_articles(source, publish_date, title, link, content, summary, topic1, topic2, image)
     FROM '{s3_file_path}'
     IAM_ROLE '{os.environ['IAM_ROLE']}'
-    CSV
-    IGNOREHEADER 1
     REGION 'eu-north-1'
-    DELIMITER ','
-    TIMEFORMAT 'auto'
-    TRUNCATECOLUMNS
-    EMPTYASNULL
-    BLANKSASNULL;
+    {COPY_FORMAT_OPTIONS[copy_file_format(csv_key)]};
     """
     
     # Connect to Redshift
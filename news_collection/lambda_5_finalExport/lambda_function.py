@@ -5,6 +5,7 @@ import psycopg2
 from io import StringIO
 import csv
 from datetime import datetime
+import s3_storage
 
 # S3 and Redshift configurations
 S3_BUCKET = 'state-of-the-earth'
@@ -80,10 +81,6 @@ def lambda_handler(event, context):
         print("No existing final CSV file to archive.")
     
     # Upload the new CSV as the final CSV file
-    s3_client.put_object(
-        Bucket=S3_BUCKET,
-        Key=f"{FINAL_FOLDER}{FINAL_CSV_NAME}",
-        Body=csv_buffer.getvalue()
-    )
+    s3_storage.write_bytes(s3_client, S3_BUCKET, f"{FINAL_FOLDER}{FINAL_CSV_NAME}", csv_buffer.getvalue(), content_type='text/csv')
     
     print("Exported data and replaced final CSV successfully.")
\ No newline at end of file
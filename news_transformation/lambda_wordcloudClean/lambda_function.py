@@ -4,7 +4,8 @@ import pandas as pd
 import spacy
 import os
 from datetime import datetime
-from io import StringIO
+from io import BytesIO, StringIO
+import s3_storage
 
 # Initialize spaCy model and S3 client
 nlp = spacy.load("en_core_web_sm")
@@ -34,8 +35,7 @@ def clean_data():
     exclusion_words = load_exclusion_list()
     
     # Load data from S3
-    final_data_obj = s3_client.get_object(Bucket=S3_BUCKET, Key=FINAL_DATA_KEY)
-    data = pd.read_csv(final_data_obj["Body"])
+    data = pd.read_csv(BytesIO(s3_storage.read_bytes(s3_client, S3_BUCKET, FINAL_DATA_KEY)))
 
     # Define POS tags to keep
     pos_to_keep = {"NOUN", "ADJ", "PROPN"}
@@ -77,7 +77,7 @@ def clean_data():
     # Save the cleaned data to S3
     csv_buffer = StringIO()
     data.to_csv(csv_buffer, index=False)
-    s3_client.put_object(Bucket=S3_BUCKET, Key=WORDCLOUD_DATA_KEY, Body=csv_buffer.getvalue())
+    s3_storage.write_bytes(s3_client, S3_BUCKET, WORDCLOUD_DATA_KEY, csv_buffer.getvalue(), content_type="text/csv")
     print(f"Cleaned data saved to s3://{S3_BUCKET}/{WORDCLOUD_DATA_KEY}")
 
 def lambda_handler(event, context):
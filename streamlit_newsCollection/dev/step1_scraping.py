@@ -10,6 +10,8 @@ import creds
 import logging
 import os
 import streamlit as st
+import scraped_url_ledger
+import http_session
 
 # Configure logging
 logger = logging.getLogger()
@@ -29,7 +31,6 @@ RSS_FEEDS = [
 
 # AWS S3 Bucket information
 S3_BUCKET_NAME = "state-of-the-earth"
-S3_SCRAPED_URLS_FILE = "scraped_urls.txt"
 # CSV filename will be dynamically generated
 CSV_FILE = None
 
@@ -38,6 +39,9 @@ HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# Shared HTTP session: keep-alive connection pools per host and retries with backoff
+session = http_session.create_session(HEADERS, pool_connections=len(RSS_FEEDS) * 2)
+
 # S3 client initialization
 s3_client = boto3.client(
     's3',
@@ -48,37 +52,25 @@ s3_client = boto3.client(
 def load_scraped_urls():
     """
     Load previously scraped URLs from S3 to avoid re-scraping the same articles.
-    Returns a set of URLs. The file is located in the '1_raw' subfolder.
+    Returns an index supporting `url in scraped_urls`. The ledger is located in the '1_raw' subfolder.
     """
-    try:
-        # Get the object from S3 with the "1_raw" subfolder path
-        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=f"1_raw/{S3_SCRAPED_URLS_FILE}")
-        scraped_urls = response['Body'].read().decode('utf-8').splitlines()
-        return set(scraped_urls)
-    except s3_client.exceptions.NoSuchKey:
-        return set()  # If the file doesn't exist, return an empty set
+    return scraped_url_ledger.load_scraped_urls(s3_client, S3_BUCKET_NAME)
 
-def save_scraped_url(url):
+def save_scraped_urls(urls):
     """
-    Append a newly scraped URL to the S3 file to avoid duplicate scraping in the future.
-    The file is located in the '1_raw' subfolder.
+    Record all URLs scraped in this run with a single write to the ledger.
     """
-    # Load existing scraped URLs from S3
-    scraped_urls = load_scraped_urls()
-    # Add the new URL
-    scraped_urls.add(url)
-
-    # Convert back to string and upload to S3 (in the "1_raw" subfolder)
-    scraped_urls_data = "\n".join(scraped_urls)
-    s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=f"1_raw/{S3_SCRAPED_URLS_FILE}", Body=scraped_urls_data)
+    segment_key = scraped_url_ledger.save_scraped_urls(s3_client, S3_BUCKET_NAME, urls)
+    if segment_key:
+        st.write(f"Saved {len(urls)} scraped URLs to {segment_key}.")
 
 def fetch_content(url):
     """
-    Fetch the HTML content from a given URL using requests.
-    Returns the content if successful, otherwise returns None and prints an error.
+    Fetch the HTML content from a given URL using the shared session.
+    Returns the content if successful (after retries), otherwise returns None and prints an error.
     """
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        response = session.get(url, timeout=10)
         response.raise_for_status()  # Check for HTTP errors
         return response.content  # Return HTML content
     except requests.exceptions.RequestException as e:
@@ -287,7 +279,6 @@ def parse_feed(feed_name, feed_url, scraped_urls, max_articles=10):
         content = parser(link) if parser else "Content parsing not supported."
 
         articles.append({'Source': feed_name, 'Published': published, 'Title': title, 'Link': link, 'Content': content})
-        save_scraped_url(link)  # Save the URL after parsing
         count += 1  # Increment the counter to limit the number of articles
 
     return articles
@@ -319,6 +310,9 @@ def main():
         articles = parse_feed(feed['name'], feed['url'], scraped_urls, max_articles=10)
         all_articles.extend(articles)
 
+    # Save the URLs after parsing, in one write for the whole run
+    save_scraped_urls([article['Link'] for article in all_articles])
+
     # Generate a timestamped filename for the CSV in the format "1_raw_*timestamp*.csv"
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     CSV_FILE = f"/tmp/1_raw_{timestamp}.csv"  # Use /tmp directory
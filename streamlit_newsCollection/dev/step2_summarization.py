@@ -1,3 +1,4 @@
+import os
 import streamlit as st
 import pandas as pd
 import boto3
@@ -7,6 +8,8 @@ import json
 import creds
 from transformers import AutoTokenizer
 from datetime import datetime
+import result_cache
+import summary_batching
 
 # Initialize S3 client
 s3_client = boto3.client('s3', aws_access_key_id=creds.AWS_ACCESS_KEY, aws_secret_access_key=creds.AWS_SECRET_KEY)
@@ -22,56 +25,97 @@ headers = {"Authorization": f"Bearer {HF_API_KEY}"}
 # Load the tokenizer
 tokenizer = AutoTokenizer.from_pretrained("facebook/bart-large-cnn")
 
-# Tokenize and truncate the content to 1024 tokens
-def truncate_text_with_tokenizer(text, max_length=1024):
-    inputs = tokenizer(text, max_length=max_length, truncation=True, return_tensors="pt")
-    truncated_text = tokenizer.decode(inputs['input_ids'][0], skip_special_tokens=True)
-    return truncated_text
+# Batches of articles summarized in one API request: at most SUMMARY_MAX_BATCH_SIZE articles and
+# SUMMARY_MAX_BATCH_TOKENS padded input tokens
+SUMMARY_MAX_BATCH_SIZE = 8
+SUMMARY_MAX_BATCH_TOKENS = 4096
 
-# Summarization using Hugging Face Inference API with tokenized input
-def generate_summary_with_hf_api(text):
+# Group article indices into length-bucketed batches, see summary_batching.make_length_batches
+def make_length_batches(lengths):
+    return summary_batching.make_length_batches(lengths, SUMMARY_MAX_BATCH_SIZE, SUMMARY_MAX_BATCH_TOKENS)
+
+# Summaries and topics are memoized per article content in a local SQLite file (see result_cache.py), so
+# re-uploading a CSV or articles syndicated across feeds aren't summarized and classified again
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'result_cache.sqlite'))
+cache = result_cache.ResultCache(RESULT_CACHE_PATH)
+SUMMARY_CACHE_VERSION = result_cache.version_of(HF_API_URL, 1024, 150, 300)
+
+# Summarization using Hugging Face Inference API with tokenized input, one request per length-bucketed batch.
+# Summaries keep the order of texts; articles of a failed request get None.
+def summarize_with_hf_api(texts, max_length=1024):
     # First, truncate the content using the tokenizer
-    truncated_content = truncate_text_with_tokenizer(text)
-    
-    # Prepare the payload for the API call
-    payload = {
-        "inputs": truncated_content,
-        "parameters": {
-            "min_length": 150,
-            "max_length": 300,
-            "truncation": True
+    inputs = tokenizer(list(texts), max_length=max_length, truncation=True)
+    truncated_contents = tokenizer.batch_decode(inputs['input_ids'], skip_special_tokens=True)
+    lengths = [len(input_ids) for input_ids in inputs['input_ids']]
+
+    summaries = [None] * len(truncated_contents)
+    for batch in make_length_batches(lengths):
+        # Prepare the payload for the API call
+        payload = {
+            "inputs": [truncated_contents[index] for index in batch],
+            "parameters": {
+                "min_length": 150,
+                "max_length": 300,
+                "truncation": True
+            }
         }
-    }
-    
-    # Call the Hugging Face API
-    response = requests.post(HF_API_URL, headers=headers, json=payload)
-    
-    if response.status_code == 200:
-        return response.json()[0]["summary_text"]
-    else:
-        st.error("Error from Hugging Face API: " + response.text)
-        return None
+        
+        # Call the Hugging Face API
+        response = requests.post(HF_API_URL, headers=headers, json=payload)
+        
+        if response.status_code == 200:
+            for index, result in zip(batch, response.json()):
+                summaries[index] = (result[0] if isinstance(result, list) else result)["summary_text"]
+        else:
+            st.error("Error from Hugging Face API: " + response.text)
+    return summaries
 
-# Generate topics using OpenAI
-def generate_topics(article):
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",  
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert on categorizing articles based on provided topics."
-            },
-            {
-                "role": "user",
-                "content": f"""Determine the 2 topics that best fit the news article below from the following list of topics only: 
+# Summarization of many articles, checking the result cache first; failed summaries (None) aren't cached
+def generate_summaries_with_hf_api(texts):
+    return cache.map('summaries', SUMMARY_CACHE_VERSION, texts, summarize_with_hf_api)
+
+# Summarization of a single article using Hugging Face Inference API
+def generate_summary_with_hf_api(text):
+    return generate_summaries_with_hf_api([text])[0]
+
+# Messages asking OpenAI for the topics of an article
+def topic_messages(article):
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert on categorizing articles based on provided topics."
+        },
+        {
+            "role": "user",
+            "content": f"""Determine the 2 topics that best fit the news article below from the following list of topics only: 
                 “Agriculture & Food”, “Business & Innovation”, “Climate Change”, “Crisis & Disasters”, “Energy”, “Fossil Fuels”, “Pollution”, “Politics & Law”, “Public Health & Environment”, “Society & Culture”, “Sustainability”, “Technology & Science”, “Urban & Infrastructure”, “Water & Oceans”, “Wildlife & Conservation”.
                 Topic1 is the best fitting topic, and Topic2 is the second best fitting. Return your answer in the following format: topic1-topic2
                 Article: {article}"""
-            }
-        ]
+        }
+    ]
+
+TOPIC_MODEL = "gpt-4o-mini"
+TOPIC_CACHE_VERSION = result_cache.version_of(TOPIC_MODEL, topic_messages(""))
+
+# Generate topics using OpenAI
+def request_topics(article):
+    response = openai.ChatCompletion.create(
+        model=TOPIC_MODEL,
+        messages=topic_messages(article)
     )
     topics = response['choices'][0]['message']['content']
-    return topics.split('-')
+    topic_1, topic_2 = topics.split('-')
+    return topic_1.strip(), topic_2.strip()
+
+# Generate the (topic_1, topic_2) of many articles, checking the result cache first
+def generate_topics_of_articles(contents):
+    def classify(missing_contents):
+        return [request_topics(article) for article in missing_contents]
+    return [tuple(topics) for topics in cache.map('topics', TOPIC_CACHE_VERSION, contents, classify)]
+
+# Generate the topics of a single article
+def generate_topics(article):
+    return generate_topics_of_articles([article])[0]
 
 # Save updated DataFrame with new columns to S3
 def save_csv_to_s3(df):
@@ -99,22 +143,14 @@ def process_uploaded_csv(uploaded_file):
         st.warning("No valid content found in the CSV.")
         return None
     
-    # Iterate through the DataFrame and summarize articles and generate topics
-    summaries = []
-    topics_1 = []
-    topics_2 = []
-    
-    for _, row in df.iterrows():
-        content = row['Content']
-        
-        # Generate the summary using Hugging Face API
-        summary = generate_summary_with_hf_api(content)
-        summaries.append(summary)
-        
-        # Generate the topics using OpenAI API
-        topic_1, topic_2 = generate_topics(content)
-        topics_1.append(topic_1.strip())
-        topics_2.append(topic_2.strip())
+    # Summarize the articles missing from the result cache in length-bucketed batches using Hugging Face API,
+    # then generate the topics of the articles missing from it
+    cache_stats = cache.snapshot()
+    summaries = generate_summaries_with_hf_api(df['Content'].tolist())
+    topics = generate_topics_of_articles(df['Content'].tolist())
+    topics_1 = [topic_1 for topic_1, _ in topics]
+    topics_2 = [topic_2 for _, topic_2 in topics]
+    st.caption(f"Result cache: {cache.summary(since=cache_stats) or 'not used'}")
 
     # Add the new columns to the DataFrame
     df['Summary'] = summaries
@@ -0,0 +1,41 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import brotli  # noqa: F401 - urllib3 decodes 'br' responses when it is installed
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+def create_session(headers=None, pool_connections=16, pool_maxsize=4, retries=3, backoff_factor=0.5, backoff_max=8):
+    """
+    Create a requests session shared by all fetches of a run (and of a warm Lambda container).
+    Connections are pooled per host and kept alive, so several articles from the same outlet reuse
+    one TLS connection. Failed GETs are retried with bounded exponential backoff
+    (backoff_factor * 2^n seconds, at most backoff_max), honouring Retry-After headers.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        backoff_max=backoff_max,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False  # Hand the last response back so raise_for_status reports it
+    )
+    # pool_connections is the number of hosts kept in the pool, pool_maxsize the connections per host
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(headers or {})
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    return session
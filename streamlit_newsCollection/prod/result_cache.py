@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+# Entries kept in the cache file; beyond that the least recently used ones are evicted
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 50000))
+
+_WHITESPACE = re.compile(r'\s+')
+# SQLite limits the number of parameters of a statement; lookups are chunked below it
+_MAX_QUERY_KEYS = 500
+# Parallel S3 requests of one lookup or store of an S3ResultCache
+S3_CACHE_WORKERS = int(os.environ.get('RESULT_CACHE_S3_WORKERS', 16))
+_MISSING = object()
+
+def normalize_content(text):
+    """
+    Normalize an article text so re-scraped or re-uploaded copies that only differ in
+    Unicode composition or whitespace map to the same cache entry.
+    """
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', str(text))).strip()
+
+def content_key(text, version):
+    """
+    Cache key of a text: hash of the normalized content and the version of whatever produces the result.
+    """
+    digest = hashlib.sha256(version.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalize_content(text).encode('utf-8'))
+    return digest.hexdigest()
+
+def version_of(*parts):
+    """
+    Short, stable version string of everything a result depends on (model, prompt, generation settings).
+    """
+    return hashlib.sha256(json.dumps([str(part) for part in parts]).encode('utf-8')).hexdigest()[:16]
+
+class _Memo:
+    """
+    What both caches share: hit and miss counts per namespace and memoizing a computation with map.
+    Subclasses implement get_many(namespace, keys) and put_many(namespace, values).
+    """
+
+    def _count(self, namespace, hits, misses):
+        with self._lock:
+            counts = self.stats.setdefault(namespace, {'hits': 0, 'misses': 0})
+            counts['hits'] += hits
+            counts['misses'] += misses
+
+    def map(self, namespace, version, texts, compute):
+        """
+        Return compute's result for every text, in order. Only the distinct texts without a cached
+        result are passed to compute (as one list), and their results are stored for the next time;
+        None stands for a failed computation and is never stored.
+        """
+        texts = list(texts)
+        keys = [content_key(text, version) for text in texts]
+        found = self.get_many(namespace, keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            computed = dict(zip(missing, compute(list(missing.values()))))
+            self.put_many(namespace, {key: value for key, value in computed.items() if value is not None})
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def snapshot(self):
+        """
+        Copy of the hit and miss counts so far, to report only what happens after it with summary(since=...).
+        """
+        with self._lock:
+            return {namespace: dict(counts) for namespace, counts in self.stats.items()}
+
+    def summary(self, since=None):
+        since = since or {}
+        parts = []
+        for namespace, counts in self.snapshot().items():
+            previous = since.get(namespace, {'hits': 0, 'misses': 0})
+            hits, misses = counts['hits'] - previous['hits'], counts['misses'] - previous['misses']
+            if hits or misses:
+                parts.append(f"{namespace}: {hits} hits, {misses} misses")
+        return ", ".join(parts)
+
+class ResultCache(_Memo):
+    """
+    Persistent memo of per-article results (summaries, topics, image URLs) in a local SQLite file.
+    Results are stored as JSON per namespace and content key, and the entries used least
+    recently are evicted once the file holds more than max_entries.
+    Safe to use from several threads of one process.
+    """
+
+    def __init__(self, path, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = {}
+        self.changed = False
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, used_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)")
+
+    def get_many(self, namespace, keys):
+        """
+        Return a dict of the cached values of the keys that are present, and mark them as used.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock, self._conn:
+            for i in range(0, len(keys), _MAX_QUERY_KEYS):
+                chunk = keys[i:i + _MAX_QUERY_KEYS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM results WHERE namespace = ? AND key IN ({placeholders})", [namespace, *chunk]
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE results SET used_at = ? WHERE namespace = ? AND key = ?", [(now, namespace, key) for key in found]
+                )
+        self._count(namespace, len(found), len(keys) - len(found))
+        return found
+
+    def put_many(self, namespace, values):
+        """
+        Store a dict of key -> JSON-serializable value, then evict the oldest entries beyond max_entries.
+        """
+        if not values:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (namespace, key, value, used_at) VALUES (?, ?, ?, ?)",
+                [(namespace, key, json.dumps(value), now) for key, value in values.items()]
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY used_at LIMIT ?)", (excess,)
+                )
+            self.changed = True
+
+    def recent(self, namespace, limit):
+        """
+        Return the values of the namespace's most recently used entries, most recent first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT value FROM results WHERE namespace = ? ORDER BY used_at DESC LIMIT ?", (namespace, limit)
+            ).fetchall()
+        return [json.loads(value) for value, in rows]
+
+    def close(self):
+        self._conn.close()
+
+class S3ResultCache(_Memo):
+    """
+    The same memo kept in S3 as one small JSON object per namespace and content key
+    (<prefix><namespace>/<key>.json): an invocation only transfers the entries it looks up or adds,
+    with the requests of a lookup or store running concurrently, and invocations running at the same
+    time never overwrite each other's entries. Nothing is evicted here; expire old entries with a
+    lifecycle rule on the prefix. An entry that can't be read counts as a miss and an entry that can't
+    be written is skipped, which only costs a recomputation later.
+    Namespaces in recent_limits (namespace -> number of entries) are only kept as the list of their
+    latest entries in a single object (<prefix><namespace>.json), read with recent() and written back
+    on close(); invocations running at the same time may drop each other's additions to it.
+    Safe to use from several threads of one process.
+    """
+
+    def __init__(self, s3_client, bucket_name, prefix, recent_limits=None, workers=S3_CACHE_WORKERS):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.recent_limits = dict(recent_limits or {})
+        self.workers = workers
+        self.stats = {}
+        self.changed = False
+        self._lock = threading.Lock()
+        self._recent = {}  # namespace -> [key, value] pairs, latest first; read on first use
+        self._recent_changed = set()
+
+    def _object_key(self, namespace, key):
+        return f"{self.prefix}{namespace}/{key}.json"
+
+    def _run(self, func, items):
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items))) as executor:
+            return list(executor.map(func, items))
+
+    def _read(self, object_key):
+        try:
+            body = self.s3_client.get_object(Bucket=self.bucket_name, Key=object_key)['Body'].read()
+            return json.loads(body)
+        except (self.s3_client.exceptions.ClientError, ValueError):
+            return _MISSING
+
+    def _write(self, object_key, value):
+        try:
+            self.s3_client.put_object(Bucket=self.bucket_name, Key=object_key, Body=json.dumps(value), ContentType='application/json')
+        except self.s3_client.exceptions.ClientError:
+            pass
+
+    def _recent_entries(self, namespace):
+        # Called with the lock held
+        if namespace not in self._recent:
+            entries = self._read(f"{self.prefix}{namespace}.json")
+            self._recent[namespace] = [] if entries is _MISSING else entries
+        return self._recent[namespace]
+
+    def get_many(self, namespace, keys):
+        """
+        Return a dict of the cached values of the keys that are present.
+        """
+        keys = list(dict.fromkeys(keys))
+        values = self._run(lambda key: self._read(self._object_key(namespace, key)), keys)
+        found = {key: value for key, value in zip(keys, values) if value is not _MISSING}
+        self._count(namespace, len(found), len(keys) - len(found))
+        return found
+
+    def put_many(self, namespace, values):
+        """
+        Store a dict of key -> JSON-serializable value, one object per key (or in the namespace's recent list).
+        """
+        if not values:
+            return
+        if namespace in self.recent_limits:
+            with self._lock:
+                entries = [[key, value] for key, value in values.items()]
+                entries += [entry for entry in self._recent_entries(namespace) if entry[0] not in values]
+                self._recent[namespace] = entries[:self.recent_limits[namespace]]
+                self._recent_changed.add(namespace)
+        else:
+            self._run(lambda item: self._write(self._object_key(namespace, item[0]), item[1]), values.items())
+        self.changed = True
+
+    def recent(self, namespace, limit):
+        """
+        Return the values of the namespace's latest entries, latest first.
+        """
+        with self._lock:
+            return [value for _, value in self._recent_entries(namespace)[:limit]]
+
+    def close(self):
+        """
+        Write back the recent lists that changed.
+        """
+        with self._lock:
+            changed, self._recent_changed = self._recent_changed, set()
+            for namespace in changed:
+                self._write(f"{self.prefix}{namespace}.json", self._recent[namespace])
@@ -1,10 +1,16 @@
 import os
+import logging
 import pandas as pd
 import boto3
 import openai
 import requests
+import torch
 from transformers import AutoTokenizer, pipeline
 from datetime import datetime
+import result_cache
+import summary_batching
+
+logger = logging.getLogger(__name__)
 
 # Initialize S3 client
 s3_client = boto3.client('s3', aws_access_key_id=os.getenv('AWS_ACCESS_KEY'), aws_secret_access_key=os.getenv('AWS_SECRET_KEY'))
@@ -20,38 +26,99 @@ def setup_summarizer():
 
 tokenizer = AutoTokenizer.from_pretrained("facebook/bart-large-cnn")
 
-# Tokenize and truncate the content to 1024 tokens
-def tokenize_and_truncate(text, max_length=1024):
-    inputs = tokenizer(text, max_length=max_length, truncation=True, return_tensors="pt")
-    truncated_text = tokenizer.decode(inputs['input_ids'][0], skip_special_tokens=True)
-    return truncated_text
+# Articles longer than the model input are truncated: 'head' keeps the beginning,
+# 'head_tail' also keeps the last TRUNCATION_TAIL_SHARE of the budget
+MAX_INPUT_TOKENS = 1024
+TRUNCATION_STRATEGY = 'head'
+TRUNCATION_TAIL_SHARE = 0.25
+
+# Cut the token ids of an article (without special tokens) to fit max_tokens, see summary_batching.truncate_ids
+def truncate_ids(ids, max_tokens):
+    return summary_batching.truncate_ids(ids, max_tokens, TRUNCATION_STRATEGY, TRUNCATION_TAIL_SHARE)
+
+# Tokenize every article once and truncate at the id level; returns the model input ids of each article
+def encode_articles(contents, max_length=MAX_INPUT_TOKENS):
+    content_ids = tokenizer(list(contents), add_special_tokens=False, verbose=False)['input_ids']
+    budget = max_length - tokenizer.num_special_tokens_to_add()
+    return [tokenizer.build_inputs_with_special_tokens(truncate_ids(ids, budget)) for ids in content_ids]
+
+# Batches of articles summarized in one generate call: at most SUMMARY_MAX_BATCH_SIZE articles and
+# SUMMARY_MAX_BATCH_TOKENS padded input tokens, which bounds the memory of a forward pass
+SUMMARY_MAX_BATCH_SIZE = 8
+SUMMARY_MAX_BATCH_TOKENS = 4096
+
+# Group article indices into length-bucketed batches, see summary_batching.make_length_batches
+def make_length_batches(lengths):
+    return summary_batching.make_length_batches(lengths, SUMMARY_MAX_BATCH_SIZE, SUMMARY_MAX_BATCH_TOKENS)
+
+# Summaries and topics are memoized per article content in a local SQLite file (see result_cache.py), so
+# re-uploading a CSV or articles syndicated across feeds aren't summarized and classified again
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'result_cache.sqlite'))
+cache = result_cache.ResultCache(RESULT_CACHE_PATH)
+SUMMARY_CACHE_VERSION = result_cache.version_of("facebook/bart-large-cnn", MAX_INPUT_TOKENS, TRUNCATION_STRATEGY, TRUNCATION_TAIL_SHARE, 100, 200)
+
+# Summarize many articles with one generate call per length-bucketed batch; summaries keep the order of contents.
+# The token ids go straight to the model, so no article is decoded back to text and tokenized again.
+def summarize_articles(contents, summarizer):
+    input_ids = encode_articles(contents)
+
+    summaries = [None] * len(input_ids)
+    for batch in make_length_batches([len(ids) for ids in input_ids]):
+        features = tokenizer.pad({'input_ids': [input_ids[index] for index in batch]}, return_tensors='pt')
+        with torch.inference_mode():
+            output_ids = summarizer.model.generate(**features, min_length=100, max_length=200)
+        for index, summary in zip(batch, tokenizer.batch_decode(output_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)):
+            summaries[index] = summary.strip()
+    return summaries
+
+# Summarize many articles, checking the result cache first; the summarizer is only set up if some article isn't cached
+def generate_summaries(contents, summarizer=None):
+    def summarize(missing_contents):
+        return summarize_articles(missing_contents, summarizer or setup_summarizer())
+    return cache.map('summaries', SUMMARY_CACHE_VERSION, contents, summarize)
 
 # Generate the summary using the bart-large-cnn model
-def generate_summary(content, summarizer):
-    truncated_content = tokenize_and_truncate(content)
-    summary = summarizer(truncated_content, min_length=100, max_length=200, truncation=True)[0]['summary_text']
-    return summary
+def generate_summary(content, summarizer=None):
+    return generate_summaries([content], summarizer)[0]
 
-# Generate topics using OpenAI
-def generate_topics(article):
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",  
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert on categorizing articles based on provided topics."
-            },
-            {
-                "role": "user",
-                "content": f"""Determine the 2 topics that best fit the news article below from the following list of topics only: 
+# Messages asking OpenAI for the topics of an article
+def topic_messages(article):
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert on categorizing articles based on provided topics."
+        },
+        {
+            "role": "user",
+            "content": f"""Determine the 2 topics that best fit the news article below from the following list of topics only: 
                 “Agriculture & Food”, “Business & Innovation”, “Climate Change”, “Crisis & Disasters”, “Energy”, “Fossil Fuels”, “Pollution”, “Politics & Law”, “Public Health & Environment”, “Society & Culture”, “Sustainability”, “Technology & Science”, “Urban & Infrastructure”, “Water & Oceans”, “Wildlife & Conservation”.
                 Topic1 is the best fitting topic, and Topic2 is the second best fitting. Return your answer in the following format: topic1-topic2
                 Article: {article}"""
-            }
-        ]
+        }
+    ]
+
+TOPIC_MODEL = "gpt-4o-mini"
+TOPIC_CACHE_VERSION = result_cache.version_of(TOPIC_MODEL, topic_messages(""))
+
+# Generate topics using OpenAI
+def request_topics(article):
+    response = openai.ChatCompletion.create(
+        model=TOPIC_MODEL,
+        messages=topic_messages(article)
     )
     topics = response['choices'][0]['message']['content']
-    return topics.split('-')
+    topic_1, topic_2 = topics.split('-')
+    return topic_1.strip(), topic_2.strip()
+
+# Generate the (topic_1, topic_2) of many articles, checking the result cache first
+def generate_topics_of_articles(contents):
+    def classify(missing_contents):
+        return [request_topics(article) for article in missing_contents]
+    return [tuple(topics) for topics in cache.map('topics', TOPIC_CACHE_VERSION, contents, classify)]
+
+# Generate the topics of a single article
+def generate_topics(article):
+    return generate_topics_of_articles([article])[0]
 
 # Save updated DataFrame with new columns to S3
 def save_csv_to_s3(df, s3_bucket_name):
@@ -78,25 +145,14 @@ def process_uploaded_csv(uploaded_file, s3_bucket_name):
     if df.empty:
         return None
     
-    # Set up summarizer
-    summarizer = setup_summarizer()
-
-    # Iterate through the DataFrame and summarize articles and generate topics
-    summaries = []
-    topics_1 = []
-    topics_2 = []
-    
-    for _, row in df.iterrows():
-        content = row['Content']
-        
-        # Generate the summary using BART model
-        summary = generate_summary(content, summarizer)
-        summaries.append(summary)
-        
-        # Generate the topics using OpenAI API
-        topic_1, topic_2 = generate_topics(content)
-        topics_1.append(topic_1.strip())
-        topics_2.append(topic_2.strip())
+    # Summarize the articles missing from the result cache in length-bucketed batches (the summarizer is
+    # only set up if there are any), then generate the topics of the articles missing from it
+    cache_stats = cache.snapshot()
+    summaries = generate_summaries(df['Content'].tolist())
+    topics = generate_topics_of_articles(df['Content'].tolist())
+    topics_1 = [topic_1 for topic_1, _ in topics]
+    topics_2 = [topic_2 for _, topic_2 in topics]
+    logger.info(f"Result cache: {cache.summary(since=cache_stats) or 'not used'}")
 
     # Add the new columns to the DataFrame
     df['Summary'] = summaries
@@ -0,0 +1,34 @@
+# Defaults of the summarization step; callers pass their own (environment) settings
+MAX_BATCH_SIZE = 8
+MAX_BATCH_TOKENS = 4096
+TRUNCATION_STRATEGY = 'head'
+TRUNCATION_TAIL_SHARE = 0.25
+
+def truncate_ids(ids, max_tokens, strategy=TRUNCATION_STRATEGY, tail_share=TRUNCATION_TAIL_SHARE):
+    """
+    Cut the token ids of an article (without special tokens) to fit max_tokens. 'head' keeps the beginning;
+    'head_tail' also keeps the last tail_share of the budget, where articles often conclude.
+    """
+    if len(ids) <= max_tokens:
+        return ids
+    if strategy == 'head_tail':
+        tail_tokens = int(max_tokens * tail_share)
+        return ids[:max_tokens - tail_tokens] + ids[len(ids) - tail_tokens:]
+    return ids[:max_tokens]
+
+def make_length_batches(lengths, max_batch_size=MAX_BATCH_SIZE, max_batch_tokens=MAX_BATCH_TOKENS):
+    """
+    Group article indices into batches of similar length, shortest first. Padding makes every article of a batch
+    as long as its longest one, so a batch is closed before batch size x longest article exceeds max_batch_tokens.
+    """
+    batches = []
+    batch = []
+    for index in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        # Sorted by length, so the current article is the longest of the batch it joins
+        if batch and (len(batch) + 1 > max_batch_size or (len(batch) + 1) * lengths[index] > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches